@@ -0,0 +1,86 @@
+"""
+Асинхронный LRU-кеш с временем жизни записей для ответов backend.
+
+Одновременные промахи по одному ключу объединяются: backend получает один
+запрос, остальные вызовы ждут его результата. Ошибки не кешируются.
+Запись, сброшенная invalidate() во время загрузки, не сохраняется: загрузка
+могла прочитать состояние до изменения.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class AsyncTTLCache:
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # ключ -> (момент истечения, значение)
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._pending[key] = asyncio.create_task(load())
+            task.add_done_callback(lambda done: self._store(key, done))
+        # Отмена одного из ожидающих не отменяет загрузку для остальных
+        return await asyncio.shield(task)
+
+    def _store(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._pending.get(key) is not task:
+            return
+        del self._pending[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.set(key, task.result())
+
+    def get(self, key: Hashable) -> Any:
+        """Значение из кеша без загрузки или None; счетчики не меняются."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._pending.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+        for key in [key for key in self._pending if predicate(key)]:
+            del self._pending[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,82 @@
+"""
+Справочник типов загрязнений в памяти бота.
+
+Загружается в on_startup и обновляется фоновой задачей раз в
+POLLUTION_TYPES_TTL секунд, поэтому клавиатура выбора типа строится без
+запросов к backend. Если обновление не удалось, отдается прежний список
+(stale-while-revalidate), а следующая попытка делается через
+POLLUTION_TYPES_RETRY_INTERVAL секунд. Пока список ни разу не загрузился,
+отдаются типы по умолчанию, а обращение к устаревшему справочнику
+запускает загрузку в фоне.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from services_api_client import ApiClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMES = ("Нефтяное загрязнение", "Мусор")
+
+
+class PollutionTypeCatalog:
+    def __init__(self, api_client: ApiClient, ttl: float, retry_interval: float) -> None:
+        self.api_client = api_client
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._names: Optional[List[str]] = None
+        self._loaded_at = 0.0
+        self._attempted_at = float("-inf")
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def names(self) -> List[str]:
+        """Названия типов из памяти; устаревший список обновляется в фоне."""
+        if self.is_stale() and time.monotonic() - self._attempted_at >= self.retry_interval:
+            self._schedule_refresh()
+        return list(self._names or DEFAULT_NAMES)
+
+    def is_stale(self) -> bool:
+        return self._names is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    async def refresh(self) -> bool:
+        self._attempted_at = time.monotonic()
+        try:
+            types = await self.api_client.get_pollution_types()
+            names = [pollution_type["name"] for pollution_type in types]
+        except Exception as e:
+            logger.warning("Не удалось обновить типы загрязнений: %r", e)
+            return False
+        self._names = names
+        self._loaded_at = time.monotonic()
+        return True
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        # Одновременно идет не больше одного обновления
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self._refresh_task
+
+    async def start(self) -> None:
+        await self._schedule_refresh()
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._loop_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._loop_task = self._refresh_task = None
+
+    async def _run(self) -> None:
+        while True:
+            if self.is_stale():
+                delay = self._attempted_at + self.retry_interval - time.monotonic()
+            else:
+                delay = self._loaded_at + self.ttl - time.monotonic()
+            await asyncio.sleep(max(delay, 0.0))
+            await asyncio.shield(self._schedule_refresh())
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -14,6 +14,10 @@ class WebhookConfig:
     webhook_url: Optional[str] = os.getenv("WEBHOOK_URL")
     webapp_host: str = os.getenv("WEBAPP_HOST", "0.0.0.0")
     webapp_port: int = int(os.getenv("WEBAPP_PORT", "8000"))
+    # Служебная статистика: токен в заголовке Authorization: Bearer <токен>,
+    # без токена она отдается только с адресов STATS_ALLOWED_IPS
+    stats_token: str = os.getenv("STATS_TOKEN", "")
+    stats_allowed_ips: Tuple[str, ...] = tuple(os.getenv("STATS_ALLOWED_IPS", "127.0.0.1,::1").split(","))
 
 
 @dataclass
@@ -22,7 +26,56 @@ class BotConfig:
     api_base_url: str = os.getenv("API_BASE_URL", "http://localhost:8000")
 
 
+@dataclass
+class ApiClientConfig:
+    # Таймауты запросов к backend, секунды
+    total_timeout: float = float(os.getenv("API_TIMEOUT", "30"))
+    connect_timeout: float = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+    read_timeout: float = float(os.getenv("API_READ_TIMEOUT", "20"))
+    # Пул соединений: всего и к одному хосту
+    pool_limit: int = int(os.getenv("API_POOL_LIMIT", "100"))
+    pool_limit_per_host: int = int(os.getenv("API_POOL_LIMIT_PER_HOST", "20"))
+    # Сколько простаивающее соединение держится открытым
+    keepalive_timeout: float = float(os.getenv("API_KEEPALIVE_TIMEOUT", "60"))
+    dns_cache_ttl: int = int(os.getenv("API_DNS_CACHE_TTL", "300"))
+    # Повторы: всего попыток и пауза между ними (растет вдвое до максимума)
+    retry_attempts: int = int(os.getenv("API_RETRY_ATTEMPTS", "3"))
+    retry_backoff_base: float = float(os.getenv("API_RETRY_BACKOFF_BASE", "0.3"))
+    retry_backoff_max: float = float(os.getenv("API_RETRY_BACKOFF_MAX", "3"))
+    # Выключатель: сбоев подряд до размыкания и сколько он остается разомкнутым
+    circuit_failure_threshold: int = int(os.getenv("API_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_reset_timeout: float = float(os.getenv("API_CIRCUIT_RESET_TIMEOUT", "30"))
+
+
+@dataclass
+class CacheConfig:
+    # Справочник типов загрязнений: как часто обновлять и через сколько
+    # повторить неудачное обновление, секунды
+    pollution_types_ttl: float = float(os.getenv("POLLUTION_TYPES_TTL", "600"))
+    pollution_types_retry_interval: float = float(os.getenv("POLLUTION_TYPES_RETRY_INTERVAL", "30"))
+    # Карточки загрязнений и страницы списков: время жизни и размер каждого кеша
+    pollution_detail_ttl: float = float(os.getenv("POLLUTION_DETAIL_TTL", "30"))
+    pollution_list_ttl: float = float(os.getenv("POLLUTION_LIST_TTL", "15"))
+    pollution_max_entries: int = int(os.getenv("POLLUTION_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class NotifyConfig:
+    # Уведомления администраторам и волонтерам (notifier.py)
+    concurrency: int = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
+    # Лимиты Telegram: около 30 сообщений в секунду на бота и 1 в секунду в чат
+    global_rate: float = float(os.getenv("NOTIFY_GLOBAL_RATE", "25"))
+    chat_interval: float = float(os.getenv("NOTIFY_CHAT_INTERVAL", "1"))
+    max_attempts: int = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+    retry_base_delay: float = float(os.getenv("NOTIFY_RETRY_BASE_DELAY", "1"))
+    # Сколько при остановке бота ждать доставки поставленных в очередь сообщений
+    shutdown_timeout: float = float(os.getenv("NOTIFY_SHUTDOWN_TIMEOUT", "10"))
+
+
 webhook_config = WebhookConfig()
 bot_config = BotConfig()
+api_client_config = ApiClientConfig()
+cache_config = CacheConfig()
+notify_config = NotifyConfig()
 
 
@@ -1,5 +1,4 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
-from services_api_client import ApiClient
 
 def main_menu_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
@@ -20,14 +19,7 @@ def main_menu_kb() -> ReplyKeyboardMarkup:
     )
 
 
-async def pollution_type() -> ReplyKeyboardMarkup:
-    api_client = ApiClient()
-    try:
-        types = await api_client.get_pollution_types()
-        problem_types = [pt['name'] for pt in types]
-    except Exception:
-        problem_types = ["Нефтяное загрязнение", "Мусор"]  # Fallback
-    
+def pollution_type(problem_types: list[str]) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=type)] for type in problem_types],
         resize_keyboard=True,
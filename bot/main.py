@@ -1,4 +1,6 @@
 import asyncio
+import functools
+import hmac
 import logging
 
 from aiogram import Bot, Dispatcher, F
@@ -16,9 +18,11 @@ from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_applicati
 from aiohttp import web
 import aiohttp
 
-from config import bot_config, webhook_config
+from catalog import PollutionTypeCatalog
+from config import bot_config, cache_config, notify_config, webhook_config
 from keyboards import *
 from aiogram.fsm.state import State, StatesGroup
+from notifier import Notifier
 from services_api_client import ApiClient
 from states import ReportProblemState, AdminChatState, LinkTelegramState
 
@@ -35,6 +39,17 @@ bot = Bot(
 )
 dp = Dispatcher()
 api_client = ApiClient()
+pollution_types = PollutionTypeCatalog(
+    api_client, cache_config.pollution_types_ttl, cache_config.pollution_types_retry_interval,
+)
+notifier = Notifier(
+    bot,
+    concurrency=notify_config.concurrency,
+    global_rate=notify_config.global_rate,
+    chat_interval=notify_config.chat_interval,
+    max_attempts=notify_config.max_attempts,
+    retry_base_delay=notify_config.retry_base_delay,
+)
 
 
 
@@ -116,7 +131,7 @@ async def report_photo(message: Message, state: FSMContext) -> None:
     photo = message.photo[-1]
     await state.update_data(photo_file_id=photo.file_id)
     await state.set_state(ReportProblemState.waiting_for_type)
-    await message.answer("🔎 Укажите тип проблемы", reply_markup=await pollution_type())
+    await message.answer("🔎 Укажите тип проблемы", reply_markup=pollution_type(pollution_types.names()))
 
 
 @dp.message(ReportProblemState.waiting_for_photo)
@@ -275,7 +290,8 @@ async def cb_ann_view(callback: CallbackQuery) -> None:
         )
         
         # Отправляем фото если есть
-        image_url = problem.get('image_url')
+        # Уменьшенная копия, если сервер уже ее построил
+        image_url = (problem.get('image_variants') or {}).get('medium') or problem.get('image_url')
         if image_url:
             try:
                 await callback.message.answer_photo(
@@ -387,15 +403,11 @@ async def admin_chat_message(message: Message, state: FSMContext) -> None:
         message_id = result.get('message_id')
         user_info = result.get('user_info', {})
         
-        for admin_telegram_id in admin_ids:
-            try:
-                await bot.send_message(
-                    admin_telegram_id,
-                    f"📨 <b>Новое сообщение от пользователя</b>\n\n👤 <b>Пользователь:</b> {user_info.get('full_name')} (@{user_info.get('username')})\n\n💬 <b>Сообщение:</b>\n{message.text}",
-                    reply_markup=admin_reply_kb(message_id)
-                )
-            except Exception as send_error:
-                logger.error(f"Ошибка отправки админу {admin_telegram_id}: {send_error}")
+        notifier.send_message(
+            admin_ids,
+            f"📨 <b>Новое сообщение от пользователя</b>\n\n👤 <b>Пользователь:</b> {user_info.get('full_name')} (@{user_info.get('username')})\n\n💬 <b>Сообщение:</b>\n{message.text}",
+            reply_markup=admin_reply_kb(message_id)
+        )
         
         await state.clear()
         await message.answer(
@@ -567,26 +579,20 @@ async def handle_completion_photo(message: Message, state: FSMContext) -> None:
             pollution_id = admin_data.get('pollution_id')
             user_id = admin_data.get('user_id')
             
-            for admin_telegram_id in admin_ids:
-                try:
-                    logger.info(f"Отправляем сообщение админу {admin_telegram_id}")
-                    if photo_url:
-                        full_url = f"https://web-production-190af.up.railway.app{photo_url}"
-                        await bot.send_photo(
-                            admin_telegram_id, 
-                            photo=full_url, 
-                            caption=message_text,
-                            reply_markup=admin_review_kb(pollution_id, user_id)
-                        )
-                    else:
-                        await bot.send_message(
-                            admin_telegram_id, 
-                            message_text,
-                            reply_markup=admin_review_kb(pollution_id, user_id)
-                        )
-                    logger.info(f"Сообщение успешно отправлено админу {admin_telegram_id}")
-                except Exception as send_error:
-                    logger.error(f"Ошибка отправки админу {admin_telegram_id}: {send_error}")
+            if photo_url:
+                full_url = f"https://web-production-190af.up.railway.app{photo_url}"
+                notifier.send_photo(
+                    admin_ids,
+                    full_url,
+                    caption=message_text,
+                    reply_markup=admin_review_kb(pollution_id, user_id)
+                )
+            else:
+                notifier.send_message(
+                    admin_ids,
+                    message_text,
+                    reply_markup=admin_review_kb(pollution_id, user_id)
+                )
         except Exception as notify_error:
             logger.error(f"Ошибка уведомления админов: {notify_error}")
         
@@ -613,19 +619,20 @@ async def cb_approve_work(callback: CallbackQuery) -> None:
         result = await api_client.approve_completion(pollution_id, user_id)
         
         await callback.message.edit_reply_markup(reply_markup=None)
+        if not result.get('changed', True):
+            # Заявку уже проверил другой администратор
+            await callback.message.reply("ℹ️ Эта заявка уже проверена.")
+            return
         await callback.message.reply("✅ Работа одобрена! Пользователь получил +1 балл.")
         
         # Уведомляем волонтера
         user_telegram_id = result.get('user_telegram_id')
         pollution_type = result.get('pollution_type')
         if user_telegram_id:
-            try:
-                await bot.send_message(
-                    user_telegram_id,
-                    f"✅ Ваша работа по проблеме #{pollution_id} ({pollution_type}) одобрена!\n\nВам начислен +1 балл. Спасибо за помощь!"
-                )
-            except Exception as notify_error:
-                logger.error(f"Ошибка уведомления волонтера: {notify_error}")
+            notifier.send_message(
+                [user_telegram_id],
+                f"✅ Ваша работа по проблеме #{pollution_id} ({pollution_type}) одобрена!\n\nВам начислен +1 балл. Спасибо за помощь!"
+            )
         
     except Exception as e:
         logger.exception("Ошибка при одобрении работы: %s", e)
@@ -644,19 +651,20 @@ async def cb_reject_work(callback: CallbackQuery) -> None:
         result = await api_client.reject_completion(pollution_id, user_id)
         
         await callback.message.edit_reply_markup(reply_markup=None)
+        if not result.get('changed', True):
+            # Заявку уже проверил другой администратор
+            await callback.message.reply("ℹ️ Эта заявка уже проверена.")
+            return
         await callback.message.reply("❌ Работа отклонена. Балл не начислен.")
         
         # Уведомляем волонтера
         user_telegram_id = result.get('user_telegram_id')
         pollution_type = result.get('pollution_type')
         if user_telegram_id:
-            try:
-                await bot.send_message(
-                    user_telegram_id,
-                    f"❌ Ваша работа по проблеме #{pollution_id} ({pollution_type}) отклонена.\n\nПожалуйста, проверьте качество выполненной работы."
-                )
-            except Exception as notify_error:
-                logger.error(f"Ошибка уведомления волонтера: {notify_error}")
+            notifier.send_message(
+                [user_telegram_id],
+                f"❌ Ваша работа по проблеме #{pollution_id} ({pollution_type}) отклонена.\n\nПожалуйста, проверьте качество выполненной работы."
+            )
         
     except Exception as e:
         logger.exception("Ошибка при отклонении работы: %s", e)
@@ -669,6 +677,11 @@ async def cb_reject_work(callback: CallbackQuery) -> None:
 async def on_startup() -> None:
     from aiogram.types import BotCommand, MenuButtonWebApp, WebAppInfo
     
+    # Общая сессия с пулом соединений к backend на все время работы бота
+    await api_client.start()
+    await pollution_types.start()
+    notifier.start()
+
     # Устанавливаем команды бота
     await bot.set_my_commands([
         BotCommand(command="start", description="Главное меню"),
@@ -690,12 +703,49 @@ async def on_startup() -> None:
 
 
 async def on_shutdown() -> None:
+    await notifier.stop(notify_config.shutdown_timeout)
+    logger.info("Рассылка уведомлений: %s", notifier.stats())
+    await pollution_types.stop()
+    logger.info("Соединения с backend: %s", api_client.stats())
+    await api_client.close()
     await bot.session.close()
 
 
 async def run_polling() -> None:
     await on_startup()
-    await dp.start_polling(bot)
+    try:
+        # Сессию бота закрывает on_shutdown, после доставки очереди уведомлений
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        await on_shutdown()
+
+
+def stats_endpoint(handler):
+    """Пускает к статистике по токену STATS_TOKEN или с адресов STATS_ALLOWED_IPS"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        token = webhook_config.stats_token
+        if token:
+            expected = f'Bearer {token}'.encode()
+            allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected)
+        else:
+            allowed = request.remote in webhook_config.stats_allowed_ips
+        if not allowed:
+            return web.json_response({'error': 'Доступ запрещен'}, status=403)
+        return await handler(request)
+    return wrapper
+
+
+@stats_endpoint
+async def handle_api_client_stats(request):
+    """Статистика запросов к backend и переиспользования соединений"""
+    return web.json_response(api_client.stats())
+
+
+@stats_endpoint
+async def handle_notifier_stats(request):
+    """Статистика рассылки уведомлений"""
+    return web.json_response(notifier.stats())
 
 
 async def handle_registration_notification(request):
@@ -728,6 +778,8 @@ async def run_webhook() -> None:
     app = web.Application()
     SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path="/webhook")
     app.router.add_post('/registration-notification', handle_registration_notification)
+    app.router.add_get('/api-client-stats', handle_api_client_stats)
+    app.router.add_get('/notifier-stats', handle_notifier_stats)
     setup_application(app, dp, bot=bot)
     app.on_startup.append(lambda _: on_startup())
     app.on_shutdown.append(lambda _: on_shutdown())
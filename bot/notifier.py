@@ -0,0 +1,177 @@
+"""
+Фоновая рассылка уведомлений администраторам и волонтерам.
+
+Сообщения ставятся в очередь, и обработчик сразу отвечает пользователю, а
+доставкой занимаются NOTIFY_CONCURRENCY воркеров. Соблюдаются лимиты
+Telegram: не больше NOTIFY_GLOBAL_RATE сообщений в секунду на бота и не чаще
+одного сообщения в NOTIFY_CHAT_INTERVAL секунд в один чат.
+
+TelegramRetryAfter приостанавливает всю рассылку на указанное время, после
+чего сообщение отправляется снова; воркеры, уже занявшие слот до паузы,
+перед отправкой занимают новый. Сетевые ошибки и ошибки сервера Telegram
+повторяются с экспоненциальной паузой, всего до NOTIFY_MAX_ATTEMPTS попыток;
+остальные ошибки (бот заблокирован, чат не найден) только логируются.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+# Сколько отметок о последней отправке в чат хранить до очистки устаревших
+MAX_TRACKED_CHATS = 10000
+
+
+@dataclass
+class Delivery:
+    chat_id: int
+    method: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    attempt: int = 0
+
+
+class Notifier:
+    def __init__(
+        self,
+        bot: Bot,
+        concurrency: int,
+        global_rate: float,
+        chat_interval: float,
+        max_attempts: int,
+        retry_base_delay: float,
+    ) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: asyncio.Queue[Delivery] = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._retry_handles: Set[asyncio.TimerHandle] = set()
+        # Ближайший момент, когда можно отправить следующее сообщение: всем и в чат
+        self._global_next = 0.0
+        self._chat_next: Dict[int, float] = {}
+        # До какого момента рассылка приостановлена после TelegramRetryAfter
+        self._paused_until = 0.0
+        self._stats = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+
+    def send_message(self, chat_ids: Iterable[int], text: str, **kwargs: Any) -> int:
+        return self._enqueue(chat_ids, "send_message", text=text, **kwargs)
+
+    def send_photo(self, chat_ids: Iterable[int], photo: Any, **kwargs: Any) -> int:
+        return self._enqueue(chat_ids, "send_photo", photo=photo, **kwargs)
+
+    def _enqueue(self, chat_ids: Iterable[int], method: str, **kwargs: Any) -> int:
+        count = 0
+        for chat_id in dict.fromkeys(chat_ids):
+            self._queue.put_nowait(Delivery(chat_id, method, kwargs))
+            count += 1
+        return count
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float) -> None:
+        """Ждет доставки уже поставленных сообщений не дольше timeout секунд."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        undelivered = self._queue.qsize() + len(self._retry_handles)
+        if undelivered:
+            logger.warning("Рассылка остановлена, не доставлено сообщений: %s", undelivered)
+        for handle in self._retry_handles:
+            handle.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._retry_handles.clear()
+
+    async def _drain(self) -> None:
+        # Отложенные повторы возвращаются в очередь позже, их тоже дожидаемся
+        while True:
+            await self._queue.join()
+            if not self._retry_handles:
+                return
+            await asyncio.sleep(0.1)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "queued": self._queue.qsize(), "retry_scheduled": len(self._retry_handles)}
+
+    async def _work(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            try:
+                await self._deliver(delivery)
+            except Exception:
+                logger.exception("Ошибка рассылки в чат %s", delivery.chat_id)
+            finally:
+                self._queue.task_done()
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        # Слот резервируется до ожидания, поэтому воркеры не занимают один и тот же
+        now = time.monotonic()
+        chat_slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = chat_slot + self.chat_interval
+        if len(self._chat_next) > MAX_TRACKED_CHATS:
+            self._chat_next = {chat: slot for chat, slot in self._chat_next.items() if slot > now}
+        await asyncio.sleep(chat_slot - now)
+
+        while True:
+            now = time.monotonic()
+            global_slot = max(now, self._global_next)
+            self._global_next = global_slot + self.global_interval
+            await asyncio.sleep(global_slot - now)
+            # Пауза, начатая во время ожидания, отменяет занятый слот
+            if time.monotonic() >= self._paused_until:
+                return
+
+    async def _deliver(self, delivery: Delivery) -> None:
+        await self._wait_turn(delivery.chat_id)
+        try:
+            await getattr(self.bot, delivery.method)(delivery.chat_id, **delivery.kwargs)
+        except TelegramRetryAfter as e:
+            # Лимит общий для бота: пауза для всех чатов, попытка не засчитывается
+            self._stats["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._global_next = max(self._global_next, self._paused_until)
+            logger.warning("Лимит Telegram, пауза рассылки на %s с", e.retry_after)
+            self._queue.put_nowait(delivery)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            delivery.attempt += 1
+            if delivery.attempt >= self.max_attempts:
+                self._stats["failed"] += 1
+                logger.error("Не удалось отправить сообщение в чат %s: %s", delivery.chat_id, e)
+                return
+            self._stats["retried"] += 1
+            self._retry_later(delivery)
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error("Ошибка отправки в чат %s: %s", delivery.chat_id, e)
+        else:
+            self._stats["sent"] += 1
+
+    def _retry_later(self, delivery: Delivery) -> None:
+        # Разброс, чтобы сообщения, упавшие одновременно, не повторялись пачкой
+        delay = self.retry_base_delay * 2 ** (delivery.attempt - 1) * random.uniform(0.75, 1.25)
+
+        def requeue() -> None:
+            self._retry_handles.discard(handle)
+            self._queue.put_nowait(delivery)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retry_handles.add(handle)
@@ -0,0 +1,116 @@
+"""
+Повторы и автоматический выключатель (circuit breaker) для запросов к backend.
+
+Повторяются сетевые сбои, таймауты и ответы 429/502/503/504: GET всегда,
+POST только с заголовком Idempotency-Key (backend отдает на повтор первый
+ответ, см. main/idempotency.py). Такой POST повторяется и после 409: первая
+попытка с тем же ключом еще выполняется. Пауза между попытками растет
+экспоненциально, со случайным разбросом, чтобы запросы, упавшие одновременно,
+не повторялись пачкой. Если backend просит подождать (Retry-After) дольше
+максимальной паузы, запрос сразу завершается ошибкой, а не повторяется раньше
+срока.
+
+Выключатель ведется на каждый эндпоинт (метод и путь без id). После
+failure_threshold сбоев подряд он размыкается, и запросы к эндпоинту сразу
+завершаются CircuitOpenError, не нагружая backend. Через reset_timeout
+секунд пропускается один пробный запрос: успех замыкает выключатель, сбой
+снова размыкает его.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import time
+from typing import Optional
+
+import aiohttp
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Запрос с тем же Idempotency-Key еще выполняется (main/idempotency.py)
+IN_PROGRESS_STATUS = 409
+# Ответы, после которых backend считается неисправным
+FAILURE_STATUSES = frozenset({500, 502, 503, 504})
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint(method: str, path: str) -> str:
+    """Имя эндпоинта для выключателя и статистики: "POST /pollutions/{id}/assign/"."""
+    return f"{method} {_ID_SEGMENT.sub('/{id}', '/' + path.lstrip('/'))}"
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Пауза перед повтором номер attempt (с 1)."""
+    delay = min(base * 2 ** (attempt - 1), cap)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def retry_after(error: aiohttp.ClientResponseError) -> Optional[float]:
+    """Значение Retry-After в секундах, если backend его прислал."""
+    value = (error.headers or {}).get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_failure(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in FAILURE_STATUSES
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def is_retryable(error: BaseException, idempotent: bool = False) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES or (idempotent and error.status == IN_PROGRESS_STATUS)
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    def __init__(self, endpoint: str, retry_in: float) -> None:
+        super().__init__(f"{endpoint}: backend недоступен, повтор через {retry_in:.0f} с")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def before_request(self) -> None:
+        """Пропускает запрос или бросает CircuitOpenError."""
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        retry_in = self.opened_at + self.reset_timeout - now
+        if retry_in > 0:
+            raise CircuitOpenError(self.name, retry_in)
+        # Пробный запрос; остальные ждут его результата. Если он не завершился
+        # за reset_timeout (например, был отменен), пропускается следующий
+        self.state = self.HALF_OPEN
+        self.opened_at = now
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> bool:
+        """Учитывает сбой; True, если выключатель при этом разомкнулся."""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            opened = self.state != self.OPEN
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return opened
+        return False
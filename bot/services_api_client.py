@@ -1,21 +1,41 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
 from urllib.parse import urlparse, urlunparse
 
 import aiohttp
 import uuid
 
-from config import bot_config
+import resilience
+from cache import AsyncTTLCache
+from config import api_client_config, bot_config, cache_config
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
 
 
 class ApiClient:
     """
-    Простой клиент для обращения к внешнему API.
-    Здесь только заглушки под реальные вызовы.
+    Клиент backend API.
+
+    Все запросы идут через одну долгоживущую aiohttp-сессию с пулом
+    keep-alive соединений и кешем DNS. Сессия открывается в start() (бот
+    вызывает его в on_startup) или при первом запросе и закрывается в
+    close(); разовые клиенты используются как async with ApiClient().
+
+    Сбои backend повторяются и отсекаются выключателем (resilience.py).
+    Изменяющие POST-запросы передают idempotent=True и получают
+    Idempotency-Key, общий для всех попыток.
+
+    Карточки загрязнений и страницы списков кешируются (cache.py); взятие,
+    отмена, завершение, одобрение и отклонение через этот клиент сразу
+    сбрасывают записи затронутого загрязнения и списков.
     """
 
-    def __init__(self, base_url: str | None = None) -> None:
+    def __init__(self, base_url: str | None = None, config=None) -> None:
         # Ожидаем, что base_url / API_BASE_URL указывает на корень backend,
         # например: http://localhost:8000
         # Добавляем /api в конец, как в frontend
@@ -34,45 +54,220 @@ class ApiClient:
             raw_base = urlunparse(parsed)
         
         self.base_url = f"{raw_base}/api"
+        self.config = config or api_client_config
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, int] = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "retries": 0,
+            "circuit_opened": 0,
+            "circuit_rejections": 0,
+        }
+        self._breakers: Dict[str, resilience.CircuitBreaker] = {}
+        # id загрязнения -> карточка
+        self._details = AsyncTTLCache(cache_config.pollution_max_entries, cache_config.pollution_detail_ttl)
+        # ("problems", параметры) или ("assigned", telegram_id, страница) -> страница списка,
+        # ("problems_cursor", page_size, страница) -> курсор keyset-пагинации этой страницы
+        self._lists = AsyncTTLCache(cache_config.pollution_max_entries, cache_config.pollution_list_ttl)
+
+    async def start(self) -> None:
+        self._get_session()
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "ApiClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.pool_limit,
+                limit_per_host=self.config.pool_limit_per_host,
+                keepalive_timeout=self.config.keepalive_timeout,
+                ttl_dns_cache=self.config.dns_cache_ttl,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.config.total_timeout,
+                connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout, trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(name: str):
+            async def increment(session, context, params) -> None:
+                self._stats[name] += 1
+            return increment
+
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace_config
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики запросов и переиспользования соединений с момента запуска."""
+        stats: Dict[str, Any] = dict(self._stats)
+        connections = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_ratio"] = round(stats["connections_reused"] / connections, 4) if connections else 0.0
+        stats["circuits"] = {
+            name: {"state": breaker.state, "failures": breaker.failures}
+            for name, breaker in self._breakers.items()
+            if breaker.state != breaker.CLOSED
+        }
+        stats["cache"] = {"details": self._details.stats(), "lists": self._lists.stats()}
+        return stats
+
+    def invalidate_pollution(self, pollution_id: Optional[int] = None, telegram_id: Optional[int] = None) -> None:
+        """
+        Сбрасывает карточку загрязнения, страницы общего списка и списки взятых
+        работ пользователя telegram_id (всех пользователей, если он не указан).
+        """
+        if pollution_id is not None:
+            self._details.invalidate(pollution_id)
+        self._lists.invalidate_where(
+            lambda key: key[0] == "problems" or telegram_id is None or key[1] == telegram_id
+        )
+
+    async def _write(self, request: Awaitable[Any], pollution_id: Optional[int], telegram_id: Optional[int] = None) -> Any:
+        # Сбрасываем и после ошибки: запрос мог изменить данные до сбоя
+        try:
+            return await request
+        finally:
+            self.invalidate_pollution(pollution_id, telegram_id)
+
+    def _breaker(self, endpoint: str) -> resilience.CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = resilience.CircuitBreaker(
+                endpoint, self.config.circuit_failure_threshold, self.config.circuit_reset_timeout,
+            )
+        return breaker
+
+    @staticmethod
+    def _form_data(form: Dict[str, Any]) -> aiohttp.FormData:
+        # FormData нельзя отправить дважды, поэтому она собирается на каждую попытку.
+        # Файлы передаются кортежем (содержимое, имя файла, content type)
+        data = aiohttp.FormData()
+        for name, value in form.items():
+            if isinstance(value, tuple):
+                content, filename, content_type = value
+                data.add_field(name, content, filename=filename, content_type=content_type)
+            else:
+                data.add_field(name, value)
+        return data
 
     async def get_pollution_types(self) -> list[Dict[str, Any]]:
         """Получить список всех типов загрязнений"""
         return await self._request("GET", "/pollution-types/")
 
     async def _request(
-        self, 
-        method: str, 
-        path: str, 
+        self,
+        method: str,
+        path: str,
         json: Optional[Dict[str, Any]] = None,
-        params: Optional[Dict[str, Any]] = None
+        params: Optional[Dict[str, Any]] = None,
+        form: Optional[Dict[str, Any]] = None,
+        idempotent: bool = False,
+    ) -> Any:
+        endpoint = resilience.endpoint(method, path)
+        breaker = self._breaker(endpoint)
+        headers = {IDEMPOTENCY_HEADER: uuid.uuid4().hex} if idempotent else {}
+        # POST без ключа мог быть выполнен backend'ом до сбоя, его не повторяем
+        retryable = method in ("GET", "HEAD") or idempotent
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                breaker.before_request()
+            except resilience.CircuitOpenError:
+                self._stats["circuit_rejections"] += 1
+                raise
+            try:
+                result = await self._send(method, path, json, params, form, headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if resilience.is_failure(e):
+                    if breaker.record_failure():
+                        self._stats["circuit_opened"] += 1
+                        logger.warning("Выключатель %s разомкнут после %s сбоев", endpoint, breaker.failures)
+                elif isinstance(e, aiohttp.ClientResponseError):
+                    # 4xx: backend отвечает, сбоя нет
+                    breaker.record_success()
+                if (
+                    not retryable
+                    or attempt >= self.config.retry_attempts
+                    or not resilience.is_retryable(e, idempotent)
+                ):
+                    raise
+                delay = resilience.backoff(attempt, self.config.retry_backoff_base, self.config.retry_backoff_max)
+                if isinstance(e, aiohttp.ClientResponseError):
+                    requested = resilience.retry_after(e)
+                    if requested is not None:
+                        # Повтор раньше срока только нагрузит backend
+                        if requested > self.config.retry_backoff_max:
+                            raise
+                        delay = max(delay, requested)
+                self._stats["retries"] += 1
+                logger.info("Повтор %s через %.2f с (попытка %s): %r", endpoint, delay, attempt + 1, e)
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]],
+        params: Optional[Dict[str, Any]],
+        form: Optional[Dict[str, Any]],
+        headers: Dict[str, str],
     ) -> Any:
         url = f"{self.base_url}/{path.lstrip('/')}"
-        async with aiohttp.ClientSession() as session:
-            async with session.request(method, url, json=json, params=params) as resp:
-                if resp.status >= 400:
-                    # Получаем детали ошибки перед raise_for_status
-                    error_data = {}
-                    try:
-                        if resp.content_type and "application/json" in resp.content_type:
-                            error_data = await resp.json()
-                        else:
-                            error_text = await resp.text()
-                            error_data = {"error": error_text}
-                    except Exception as parse_error:
-                        error_data = {"error": f"HTTP {resp.status}", "parse_error": str(parse_error)}
-                    
-                    # Вызываем raise_for_status, но сначала сохраняем детали ошибки
-                    try:
-                        resp.raise_for_status()
-                    except aiohttp.ClientResponseError as e:
-                        # Добавляем детали ошибки к исключению
-                        e.error_data = error_data
-                        raise
+        session = self._get_session()
+        data = self._form_data(form) if form is not None else None
+        async with session.request(method, url, json=json, params=params, data=data, headers=headers) as resp:
+            if resp.status >= 400:
+                # Получаем детали ошибки перед raise_for_status
+                error_data = {}
+                try:
+                    if resp.content_type and "application/json" in resp.content_type:
+                        error_data = await resp.json()
+                    else:
+                        error_text = await resp.text()
+                        error_data = {"error": error_text}
+                except Exception as parse_error:
+                    error_data = {"error": f"HTTP {resp.status}", "parse_error": str(parse_error)}
                 
-                # Если статус OK, возвращаем данные
-                if resp.content_type and "application/json" in resp.content_type:
-                    return await resp.json()
-                return await resp.text()
+                # Вызываем raise_for_status, но сначала сохраняем детали ошибки
+                try:
+                    resp.raise_for_status()
+                except aiohttp.ClientResponseError as e:
+                    # Добавляем детали ошибки к исключению
+                    e.error_data = error_data
+                    raise
+            
+            # Если статус OK, возвращаем данные
+            if resp.content_type and "application/json" in resp.content_type:
+                return await resp.json()
+            return await resp.text()
 
     async def register_user(self, username: str, password: str | None = None, telegram_id: int | None = None) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
@@ -81,7 +276,7 @@ class ApiClient:
             "telegram_id": telegram_id
         }
 
-        req = await self._request("POST", "/auth/link-telegram/", json=payload)
+        req = await self._request("POST", "/auth/link-telegram/", json=payload, idempotent=True)
 
         return req
 
@@ -104,25 +299,20 @@ class ApiClient:
         description: str,
         phone: str | None,
     ) -> Dict[str, Any]:
-        url = f"{self.base_url}/pollutions/"
         fake_uuid = uuid.uuid4()
         
-        data = aiohttp.FormData()
-        data.add_field('telegram_id', str(telegram_id))
-        data.add_field('latitude', str(latitude))
-        data.add_field('longitude', str(longitude))
-        data.add_field('description', description)
-        data.add_field('pollution_type', pollution_type)
+        form: Dict[str, Any] = {
+            'telegram_id': str(telegram_id),
+            'latitude': str(latitude),
+            'longitude': str(longitude),
+            'description': description,
+            'pollution_type': pollution_type,
+        }
         if phone:
-            data.add_field('phone_number', phone)
-        data.add_field('image', photo_bytes, filename=f'photo_{str(fake_uuid)}.jpg', content_type='image/jpeg')
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data) as resp:
-                resp.raise_for_status()
-                print(resp.status)
-                print(resp.json())
-                return await resp.json()
+            form['phone_number'] = phone
+        form['image'] = (photo_bytes, f'photo_{str(fake_uuid)}.jpg', 'image/jpeg')
+
+        return await self._write(self._request("POST", "/pollutions/", form=form, idempotent=True), None)
 
     async def get_marker_comments(self, marker_id: int) -> Any:
         return await self._request("GET", f"/markers/{marker_id}/comments/")
@@ -132,24 +322,58 @@ class ApiClient:
             "POST",
             f"/markers/{marker_id}/comments/",
             json={"message": message},
+            idempotent=True,
         )
 
     async def status_stats(self) -> Any:
         return await self._request("GET", "/markers/status-stats/")
 
     async def take_problem(self, telegram_id: int, problem_id: int) -> Dict[str, Any]:
-        return await self._request(
+        request = self._request(
             "POST",
             f"/pollutions/{problem_id}/assign/",
             json={"telegram_id": telegram_id},
+            idempotent=True,
         )
+        return await self._write(request, problem_id, telegram_id)
 
     async def list_problems(self, page: int = 1, page_size: int = 5) -> Dict[str, Any]:
-        return await self.list_markers(page=page, page_size=page_size)
+        """
+        Страница списка объявлений через курсорную пагинацию.
+        Номера страниц из кнопок бота переводятся в курсоры: если курсор
+        страницы еще неизвестен, идем по next_cursor от ближайшей известной.
+        Курсоры хранятся в кеше списков и живут столько же, сколько страницы.
+        """
+        current, cursor = 1, None
+        for known in range(page, 1, -1):
+            cursor = self._lists.get(("problems_cursor", page_size, known))
+            if cursor is not None:
+                current = known
+                break
+
+        while True:
+            params: Dict[str, Any] = {"pagination": "cursor", "page_size": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self._lists.get_or_load(
+                ("problems", tuple(sorted(params.items()))),
+                lambda: self._request("GET", "/pollutions/", params=params),
+            )
+
+            cursor = response.get("next_cursor")
+            if cursor:
+                self._lists.set(("problems_cursor", page_size, current + 1), cursor)
+            if current == page:
+                return response
+            if not cursor:
+                return {"results": [], "next": None, "previous": None}
+            current += 1
 
     async def get_pollution_detail(self, pollution_id: int) -> Dict[str, Any]:
         """Получить детальную информацию об одном загрязнении"""
-        return await self._request("GET", f"/pollutions/{pollution_id}/")
+        return await self._details.get_or_load(
+            pollution_id, lambda: self._request("GET", f"/pollutions/{pollution_id}/"),
+        )
 
     async def get_user_profile(self, telegram_id: int) -> Dict[str, Any]:
         """Получить профиль пользователя"""
@@ -157,27 +381,31 @@ class ApiClient:
 
     async def get_user_assigned_pollutions(self, telegram_id: int, page: int = 1) -> Dict[str, Any]:
         """Получить список взятых работ"""
-        return await self._request("GET", "/user/assigned-pollutions/", params={"telegram_id": telegram_id, "page": page})
+        return await self._lists.get_or_load(
+            ("assigned", telegram_id, page),
+            lambda: self._request("GET", "/user/assigned-pollutions/", params={"telegram_id": telegram_id, "page": page}),
+        )
 
     async def unassign_pollution(self, telegram_id: int, pollution_id: int) -> Dict[str, Any]:
         """Отменить взятие проблемы"""
-        return await self._request("POST", f"/pollutions/{pollution_id}/unassign/", json={"telegram_id": telegram_id})
+        request = self._request(
+            "POST", f"/pollutions/{pollution_id}/unassign/", json={"telegram_id": telegram_id}, idempotent=True,
+        )
+        return await self._write(request, pollution_id, telegram_id)
 
     async def complete_pollution(self, telegram_id: int, pollution_id: int, photo_bytes: bytes | None = None) -> Dict[str, Any]:
         """Завершить работу"""
-        url = f"{self.base_url}/pollutions/{pollution_id}/complete/"
-        
         if photo_bytes:
-            data = aiohttp.FormData()
-            data.add_field('telegram_id', str(telegram_id))
-            data.add_field('completion_photo', photo_bytes, filename='completion.jpg', content_type='image/jpeg')
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, data=data) as resp:
-                    resp.raise_for_status()
-                    return await resp.json()
+            form = {
+                'telegram_id': str(telegram_id),
+                'completion_photo': (photo_bytes, 'completion.jpg', 'image/jpeg'),
+            }
+            request = self._request("POST", f"/pollutions/{pollution_id}/complete/", form=form, idempotent=True)
         else:
-            return await self._request("POST", f"/pollutions/{pollution_id}/complete/", json={"telegram_id": telegram_id})
+            request = self._request(
+                "POST", f"/pollutions/{pollution_id}/complete/", json={"telegram_id": telegram_id}, idempotent=True,
+            )
+        return await self._write(request, pollution_id, telegram_id)
 
     async def notify_admins(self, pollution_id: int, user_id: int, username: str, has_photo: bool) -> Dict[str, Any]:
         """Уведомить админов о завершении работы"""
@@ -186,7 +414,7 @@ class ApiClient:
             "user_id": user_id,
             "username": username,
             "has_photo": has_photo
-        })
+        }, idempotent=True)
 
     async def approve_completion(self, pollution_id: int, user_id: int) -> Dict[str, Any]:
         """Одобрить завершение работы"""
@@ -197,7 +425,7 @@ class ApiClient:
             "user_id": user_id
         }
         logger.info(f"Отправляем запрос на одобрение: {payload}")
-        return await self._request("POST", "/approve-completion/", json=payload)
+        return await self._write(self._request("POST", "/approve-completion/", json=payload, idempotent=True), pollution_id)
 
     async def reject_completion(self, pollution_id: int, user_id: int) -> Dict[str, Any]:
         """Отклонить завершение работы"""
@@ -208,7 +436,7 @@ class ApiClient:
             "user_id": user_id
         }
         logger.info(f"Отправляем запрос на отклонение: {payload}")
-        return await self._request("POST", "/reject-completion/", json=payload)
+        return await self._write(self._request("POST", "/reject-completion/", json=payload, idempotent=True), pollution_id)
 
 
     async def send_admin_message(self, telegram_id: int, message: str) -> Dict[str, Any]:
@@ -216,17 +444,17 @@ class ApiClient:
         return await self._request("POST", "/send-admin-message/", json={
             "telegram_id": telegram_id,
             "message": message
-        })
+        }, idempotent=True)
 
     async def reply_to_user(self, message_id: int, reply_message: str) -> Dict[str, Any]:
         """Ответить пользователю"""
         return await self._request("POST", "/reply-to-user/", json={
             "message_id": message_id,
             "reply_message": reply_message
-        })
+        }, idempotent=True)
 
     async def get_registration_notification(self, telegram_id: int) -> Dict[str, Any]:
         """Получить уведомление о регистрации"""
         return await self._request("POST", "/send-registration-notification/", json={
             "telegram_id": telegram_id
-        })
\ No newline at end of file
+        }, idempotent=True)
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Тесты бота без Telegram и backend: python -m unittest tests (из каталога bot).
+Их же находит python manage.py test из корня репозитория.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+import aiohttp
+from aiogram.exceptions import TelegramRetryAfter
+
+# Модули бота импортируют друг друга как модули верхнего уровня
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import resilience
+from cache import AsyncTTLCache
+from config import ApiClientConfig
+from notifier import Notifier
+from services_api_client import IDEMPOTENCY_HEADER, ApiClient
+
+
+def response_error(status, retry_after=None):
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+    return aiohttp.ClientResponseError(mock.Mock(), (), status=status, headers=headers)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch.object(resilience.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = resilience.CircuitBreaker("GET /pollutions/", failure_threshold=2, reset_timeout=30)
+
+    def open_breaker(self):
+        self.breaker.before_request()
+        self.assertFalse(self.breaker.record_failure())
+        self.breaker.before_request()
+        self.assertTrue(self.breaker.record_failure())
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+
+    def test_opens_after_threshold_and_rejects(self):
+        self.open_breaker()
+        self.now += 10
+        with self.assertRaises(resilience.CircuitOpenError) as raised:
+            self.breaker.before_request()
+        self.assertAlmostEqual(raised.exception.retry_in, 20)
+
+    def test_half_open_probe_success_closes(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.before_request()
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+        # Пока идет пробный запрос, остальные отклоняются
+        with self.assertRaises(resilience.CircuitOpenError):
+            self.breaker.before_request()
+
+        self.breaker.record_success()
+        self.assertEqual((self.breaker.state, self.breaker.failures), (self.breaker.CLOSED, 0))
+        self.breaker.before_request()
+
+    def test_half_open_probe_failure_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.before_request()
+
+        self.assertTrue(self.breaker.record_failure())
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+        with self.assertRaises(resilience.CircuitOpenError):
+            self.breaker.before_request()
+
+
+class ApiClientRetryTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        config = ApiClientConfig(
+            retry_attempts=3, retry_backoff_base=0.0, retry_backoff_max=3.0,
+            circuit_failure_threshold=5, circuit_reset_timeout=30.0,
+        )
+        self.client = ApiClient(base_url="http://backend", config=config)
+        self.send = self.client._send = mock.AsyncMock()
+
+    async def test_in_progress_conflict_is_retried_for_idempotent_post(self):
+        self.send.side_effect = [response_error(409), {"success": True}]
+
+        result = await self.client._request("POST", "/pollutions/1/assign/", idempotent=True)
+
+        self.assertEqual(result, {"success": True})
+        self.assertEqual(self.send.await_count, 2)
+        # Повтор идет с тем же ключом
+        keys = {call.args[-1][IDEMPOTENCY_HEADER] for call in self.send.await_args_list}
+        self.assertEqual(len(keys), 1)
+
+    async def test_conflict_without_key_is_not_retried(self):
+        self.send.side_effect = [response_error(409)]
+
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await self.client._request("GET", "/pollutions/1/")
+        self.assertEqual(self.send.await_count, 1)
+
+    async def test_retry_after_beyond_backoff_max_fails_fast(self):
+        self.send.side_effect = [response_error(503, retry_after=30), {"success": True}]
+
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await self.client._request("GET", "/pollutions/")
+        self.assertEqual(self.send.await_count, 1)
+
+
+class ListProblemsTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = ApiClient(base_url="http://backend")
+        self.client._request = mock.AsyncMock(side_effect=self.page)
+
+    async def page(self, method, path, params):
+        # Курсор страницы N+1 — "cN"
+        number = int(params.get("cursor", "c0")[1:]) + 1
+        return {"results": [number], "next_cursor": f"c{number}" if number < 4 else None}
+
+    def cursors(self):
+        return [call.kwargs["params"].get("cursor") for call in self.client._request.await_args_list]
+
+    async def test_walks_cursors_and_reuses_known_ones(self):
+        self.assertEqual((await self.client.list_problems(page=3))["results"], [3])
+        self.assertEqual(self.cursors(), [None, "c1", "c2"])
+
+        self.client._lists.invalidate_where(lambda key: key[0] == "problems")
+        self.assertEqual((await self.client.list_problems(page=4))["results"], [4])
+        # Курсор четвертой страницы известен из ответа третьей
+        self.assertEqual(self.cursors()[3:], ["c3"])
+
+    async def test_page_past_the_end_is_empty(self):
+        self.assertEqual((await self.client.list_problems(page=6))["results"], [])
+        self.assertEqual(len(self.cursors()), 4)
+
+
+class AsyncTTLCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = AsyncTTLCache(max_entries=10, ttl=60)
+        self.loads = 0
+        self.release = asyncio.Event()
+
+    async def load(self):
+        self.loads += 1
+        await self.release.wait()
+        return self.loads
+
+    async def test_concurrent_misses_share_one_load(self):
+        first = asyncio.create_task(self.cache.get_or_load("key", self.load))
+        second = asyncio.create_task(self.cache.get_or_load("key", self.load))
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(first, second), [1, 1])
+        self.assertEqual(await self.cache.get_or_load("key", self.load), 1)
+        self.assertEqual(self.cache.stats()["coalesced"], 1)
+
+    async def test_invalidated_in_flight_load_is_not_stored(self):
+        waiting = asyncio.create_task(self.cache.get_or_load("key", self.load))
+        await asyncio.sleep(0)
+        # Загрузка могла прочитать состояние до изменения
+        self.cache.invalidate("key")
+        self.release.set()
+
+        self.assertEqual(await waiting, 1)
+        self.assertEqual(await self.cache.get_or_load("key", self.load), 2)
+        self.assertEqual(self.loads, 2)
+
+
+class NotifierTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = mock.Mock()
+        self.sent = []
+        self.limited = set()
+
+        async def send_message(chat_id, text):
+            self.sent.append((chat_id, time.monotonic()))
+            if chat_id in self.limited:
+                self.limited.discard(chat_id)
+                raise TelegramRetryAfter(mock.Mock(), "Too Many Requests", retry_after=0.3)
+
+        self.bot.send_message = send_message
+        self.notifier = Notifier(
+            self.bot, concurrency=2, global_rate=10, chat_interval=0, max_attempts=3, retry_base_delay=0.01,
+        )
+        self.notifier.start()
+
+    async def asyncTearDown(self):
+        await self.notifier.stop(timeout=0)
+
+    async def test_retry_after_requeues_and_pauses_everyone(self):
+        self.limited.add(1)
+        self.notifier.send_message([1, 2], "Новое сообщение")
+        await asyncio.wait_for(self.notifier._drain(), 2)
+
+        self.assertEqual(sorted(chat_id for chat_id, _ in self.sent), [1, 1, 2])
+        # Второй чат занял слот до паузы, но отправил только после нее
+        started = self.sent[0][1]
+        self.assertTrue(all(sent_at - started >= 0.3 for _, sent_at in self.sent[1:]))
+        stats = self.notifier.stats()
+        self.assertEqual((stats["sent"], stats["rate_limited"], stats["failed"]), (2, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
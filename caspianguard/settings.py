@@ -45,9 +45,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -57,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.idempotency.IdempotencyMiddleware',
 ]
 
 CSRF_TRUSTED_ORIGINS = config('CSRF_TRUSTED_ORIGINS', default='https://*.railway.app').split(',')
@@ -106,6 +109,36 @@ else:
         }
     }
 
+# Порог нечеткого поиска по описанию (main/filters.py). Оператор <% из pg_trgm
+# берет его из настройки сессии, поэтому она задается при подключении
+SEARCH_TRIGRAM_THRESHOLD = config('SEARCH_TRIGRAM_THRESHOLD', default=0.3, cast=float)
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Дописываем к options из DATABASE_URL, не затирая их
+    db_options = DATABASES['default'].setdefault('OPTIONS', {})
+    db_options['options'] = ' '.join(filter(None, [
+        db_options.get('options'),
+        f"-c pg_trgm.word_similarity_threshold={SEARCH_TRIGRAM_THRESHOLD}",
+    ]))
+
+
+# Cache
+# Без REDIS_URL кеш локальный для каждого процесса
+REDIS_URL = config('REDIS_URL', default=None)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -172,3 +205,74 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
+
+# Максимум маркеров в ответе /api/pollutions/?bbox=...
+POLLUTION_BBOX_LIMIT = config('POLLUTION_BBOX_LIMIT', default=2000, cast=int)
+
+# Максимум сообщений в POST /api/pollutions/bulk/ (не больше DATA_UPLOAD_MAX_NUMBER_FILES)
+POLLUTION_BULK_MAX_ITEMS = config('POLLUTION_BULK_MAX_ITEMS', default=100, cast=int)
+
+# Сколько строк за раз читает серверный курсор выгрузки /api/pollutions/export/
+POLLUTION_EXPORT_CHUNK_SIZE = config('POLLUTION_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+
+# Поиск ближайших загрязнений /api/pollutions/nearby/
+POLLUTION_NEARBY_DEFAULT_K = 10
+POLLUTION_NEARBY_MAX_K = config('POLLUTION_NEARBY_MAX_K', default=200, cast=int)
+POLLUTION_NEARBY_START_RADIUS_KM = 2.0
+POLLUTION_NEARBY_MAX_RADIUS_KM = config('POLLUTION_NEARBY_MAX_RADIUS_KM', default=1500.0, cast=float)
+# Только radius без k: все загрязнения в круге, но не больше этого числа ближайших
+POLLUTION_NEARBY_RADIUS_MAX_RESULTS = config('POLLUTION_NEARBY_RADIUS_MAX_RESULTS', default=1000, cast=int)
+
+# Кластеры /api/pollutions/clusters/: как часто уровень пересчитывается целиком
+POLLUTION_CLUSTERS_CACHE_TIMEOUT = config('POLLUTION_CLUSTERS_CACHE_TIMEOUT', default=600, cast=int)
+
+# Кеш ответов для типов загрязнений, карточки и первых страниц списка
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', default=1000, cast=int)
+RESPONSE_CACHE_MAX_PAGE = config('RESPONSE_CACHE_MAX_PAGE', default=3, cast=int)
+
+# Асинхронные версии списка, карточки, типов и статистики (main/async_views.py).
+# Включать только при запуске под ASGI (uvicorn), под WSGI они медленнее синхронных
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Фоновые задачи (main/jobs.py, python manage.py run_jobs)
+# JOBS_EAGER выполняет задачи сразу после коммита в том же процессе, без воркера
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+# Очередь -> сколько ее задач могут выполняться одновременно во всех воркерах
+JOB_QUEUES = {
+    'default': config('JOBS_DEFAULT_CONCURRENCY', default=4, cast=int),
+    'images': config('JOBS_IMAGES_CONCURRENCY', default=2, cast=int),
+}
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 3600
+# Задача без отметки воркера дольше JOBS_LOCK_TIMEOUT считается брошенной;
+# выполняющаяся задача отмечается раз в JOBS_HEARTBEAT_INTERVAL секунд
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=600, cast=int)
+JOBS_HEARTBEAT_INTERVAL = config('JOBS_HEARTBEAT_INTERVAL', default=60, cast=int)
+JOBS_POLL_INTERVAL = 1.0
+JOBS_RETENTION_DAYS = 7
+
+# Сколько живут списки получателей уведомлений по ролям (main/roster.py)
+NOTIFICATION_ROSTER_CACHE_TIMEOUT = config('NOTIFICATION_ROSTER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Кеш telegram_id -> пользователь в TelegramAuthentication. Изменения видны другим
+# процессам через CHECK_INTERVAL секунд при общем кеше (REDIS_URL), иначе — через TIMEOUT
+TELEGRAM_AUTH_CACHE_TIMEOUT = config('TELEGRAM_AUTH_CACHE_TIMEOUT', default=10, cast=int)
+TELEGRAM_AUTH_CACHE_CHECK_INTERVAL = config('TELEGRAM_AUTH_CACHE_CHECK_INTERVAL', default=1.0, cast=float)
+TELEGRAM_AUTH_CACHE_MAX_ENTRIES = config('TELEGRAM_AUTH_CACHE_MAX_ENTRIES', default=5000, cast=int)
+
+# Повтор POST с заголовком Idempotency-Key (main/idempotency.py): сколько хранится
+# первый ответ и сколько считается, что первый запрос еще выполняется
+IDEMPOTENCY_TIMEOUT = config('IDEMPOTENCY_TIMEOUT', default=86400, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=120, cast=int)
+
+# Метрики Prometheus /metrics (main/metrics.py). Без METRICS_TOKEN эндпоинт
+# доступен только с адресов METRICS_ALLOWED_IPS
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1').split(',')
+# Как часто процесс сохраняет свои метрики в кеш, чтобы /metrics видел все воркеры
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=15, cast=int)
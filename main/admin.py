@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Position, Pollutions, PollutionType, PollutionImage
+from .models import User, Position, Pollutions, PollutionType, PollutionImage, Job
 
 
 class UserAdmin(BaseUserAdmin):
@@ -12,8 +12,14 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'queue', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'queue')
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Position)
 admin.site.register(Pollutions)
 admin.site.register(PollutionType)
 admin.site.register(PollutionImage)
+admin.site.register(Job, JobAdmin)
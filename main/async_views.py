@@ -0,0 +1,179 @@
+"""
+Асинхронные версии горячих GET-эндпоинтов: список и карточка загрязнений,
+типы загрязнений и статистика по статусам. Включаются настройкой
+ASYNC_READ_VIEWS и имеют смысл только под ASGI-сервером (см. README).
+
+Ответы совпадают с ответами синхронных вьюх из views.py: те же
+сериализаторы, формат пагинации, ETag и общие записи response_cache.
+Быстрый путь покрывает анонимные JSON-запросы с обычной постраничной
+пагинацией; все остальное (POST, поиск, курсор, bbox, аутентификация,
+браузерный API) передается синхронной вьюхе через sync_to_async.
+"""
+
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import counters, versions
+from .filters import filter_pollutions
+from .models import Pollutions, PollutionType
+from .response_cache import build_key, response_cache
+from .serializers import PollutionSerializer, PollutionTypeSerializer
+from .views import PollutionDetailView, PollutionListCreateView, PollutionPagination, PollutionTypeListView, StatusStatsView
+
+# Параметры, которые обрабатывает только синхронная вьюха
+SYNC_ONLY_PARAMS = ('search', 'cursor', 'bbox', 'format', 'telegram_id')
+
+_renderer = JSONRenderer()
+
+
+@lru_cache(maxsize=None)
+def _allowed_methods(view_class):
+    view = view_class()
+    # View.setup() делает то же для каждого запроса
+    view.head = view.get
+    return ', '.join(view.allowed_methods)
+
+
+def _render(data, status=200, view_class=None):
+    response = HttpResponse(_renderer.render(data), status=status, content_type=_renderer.media_type)
+    # Заголовки, которые APIView добавляет к каждому ответу
+    response['Vary'] = 'Accept'
+    if view_class is not None:
+        response['Allow'] = _allowed_methods(view_class)
+    return response
+
+
+def _fast_path(request, accepts):
+    if accepts is not None and not accepts(request):
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if 'Authorization' in request.headers or 'text/html' in request.headers.get('Accept', ''):
+        return False
+    return not any(name in request.GET for name in SYNC_ONLY_PARAMS)
+
+
+def with_sync_fallback(view_class, accepts=None):
+    """
+    Отдает запрос синхронной view_class, если быстрый путь его не покрывает;
+    accepts(request) дополнительно сужает быстрый путь.
+    """
+    sync_view = sync_to_async(view_class.as_view())
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if _fast_path(request, accepts):
+                return await view(request, *args, **kwargs)
+            return await sync_view(request, *args, **kwargs)
+
+        # csrf_exempt из Django 4.2 делает из вьюхи синхронную обертку
+        inner.csrf_exempt = True
+        return inner
+
+    return decorator
+
+
+async def _cached(view_class, request, kwargs, collections, build):
+    """build() -> (data, status); успешные ответы кладутся в response_cache."""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return await build()
+
+    collection_versions = [(name, await versions.aget_state(request, name)) for name in collections]
+    key = build_key(view_class.__name__, request, kwargs, request.GET, None, collection_versions, _renderer.format)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return entry['data'], entry['status']
+
+    data, status = await build()
+    if status == 200:
+        response_cache.set(key, data, status, collections)
+    return data, status
+
+
+def _page_params(request):
+    """
+    (номер страницы, размер) по правилам PollutionPagination или None, если
+    значение нестандартное (page=last, мусор) и его разберет синхронная вьюха.
+    """
+    page = request.GET.get(PollutionPagination.page_query_param, '1')
+    if not page.isdigit() or int(page) < 1:
+        return None
+    page_size = PollutionPagination.page_size
+    requested = request.GET.get(PollutionPagination.page_size_query_param)
+    if requested and requested.isdigit() and int(requested) > 0:
+        page_size = min(int(requested), PollutionPagination.max_page_size)
+    return int(page), page_size
+
+
+def _page_link(request, page):
+    url = request.build_absolute_uri()
+    if page == 1:
+        return remove_query_param(url, PollutionPagination.page_query_param)
+    return replace_query_param(url, PollutionPagination.page_query_param, page)
+
+
+@with_sync_fallback(PollutionListCreateView, accepts=lambda request: _page_params(request) is not None)
+@versions.aconditional()
+async def pollution_list(request):
+    page, page_size = _page_params(request)
+
+    try:
+        queryset = filter_pollutions(PollutionListCreateView.queryset.all(), request.GET)
+    except ParseError as e:
+        return _render({'detail': e.detail}, status=e.status_code, view_class=PollutionListCreateView)
+
+    async def build():
+        count = await queryset.acount()
+        pages = max(1, -(-count // page_size))
+        if page > pages:
+            return {'detail': PollutionPagination.invalid_page_message}, NotFound.status_code
+        offset = (page - 1) * page_size
+        rows = [pollution async for pollution in queryset[offset:offset + page_size]]
+        return {
+            'count': count,
+            'next': _page_link(request, page + 1) if page < pages else None,
+            'previous': _page_link(request, page - 1) if page > 1 else None,
+            'results': PollutionSerializer(rows, many=True, context={'request': request}).data,
+        }, 200
+
+    if page > settings.RESPONSE_CACHE_MAX_PAGE:
+        data, status = await build()
+    else:
+        data, status = await _cached(PollutionListCreateView, request, {}, (versions.POLLUTIONS,), build)
+    return _render(data, status, PollutionListCreateView)
+
+
+@with_sync_fallback(PollutionDetailView)
+@versions.aconditional(model=Pollutions)
+async def pollution_detail(request, pk):
+    async def build():
+        try:
+            pollution = await PollutionDetailView.queryset.aget(pk=pk)
+        except Pollutions.DoesNotExist:
+            return {'detail': NotFound.default_detail}, NotFound.status_code
+        return PollutionSerializer(pollution, context={'request': request}).data, 200
+
+    data, status = await _cached(PollutionDetailView, request, {'pk': pk}, (versions.POLLUTIONS,), build)
+    return _render(data, status, PollutionDetailView)
+
+
+@with_sync_fallback(PollutionTypeListView)
+async def pollution_type_list(request):
+    async def build():
+        types = [pollution_type async for pollution_type in PollutionType.objects.order_by('name')]
+        return PollutionTypeSerializer(types, many=True).data, 200
+
+    data, status = await _cached(PollutionTypeListView, request, {}, PollutionTypeListView.response_cache_collections, build)
+    return _render(data, status, PollutionTypeListView)
+
+
+@with_sync_fallback(StatusStatsView)
+async def status_stats(request):
+    return _render(await counters.aget_stats(), view_class=StatusStatsView)
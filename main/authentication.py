@@ -1,19 +1,73 @@
+import copy
+import time
+
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from . import generations
+from .lru import LRUCache
+
 User = get_user_model()
 
 
+def _generation_key(telegram_id):
+    return f'telegram_users:{telegram_id}:generation'
+
+
+class TelegramUserCache(LRUCache):
+    """
+    telegram_id -> пользователь с загруженной должностью. Запись хранится
+    вместе с поколением своего telegram_id (generations.py), при котором она
+    загружена. После коммита изменений пользователя или должности
+    (signals.py) поколения затронутых telegram_id увеличиваются, а их записи в
+    этом процессе удаляются. Остальные записи не трогаются.
+
+    Поколение записи сверяется с кешем Django не чаще раза в
+    TELEGRAM_AUTH_CACHE_CHECK_INTERVAL секунд, а не на каждый запрос: с общим
+    кешем (Redis) другие процессы видят изменение через эти секунды, с
+    LocMemCache — не позже чем через TELEGRAM_AUTH_CACHE_TIMEOUT.
+    """
+
+    def __init__(self):
+        super().__init__('TELEGRAM_AUTH_CACHE_MAX_ENTRIES', 'TELEGRAM_AUTH_CACHE_TIMEOUT')
+
+    def resolve(self, telegram_id):
+        now = time.monotonic()
+        entry = self.get(telegram_id)
+        if entry is None or now - entry['checked_at'] >= settings.TELEGRAM_AUTH_CACHE_CHECK_INTERVAL:
+            # Поколение читается до загрузки: запись, прочитанная до изменения,
+            # окажется устаревшей
+            generation = generations.get(_generation_key(telegram_id))
+            if entry is not None and entry['generation'] == generation:
+                entry['checked_at'] = now
+            else:
+                user = User.objects.select_related('position').get(telegram_id=telegram_id)
+                entry = {'generation': generation, 'user': user, 'checked_at': now}
+                self.set(telegram_id, entry)
+        # Вьюхи могут менять request.user, общий объект в кеше трогать нельзя
+        return copy.deepcopy(entry['user'])
+
+    def invalidate(self, telegram_ids):
+        telegram_ids = {telegram_id for telegram_id in telegram_ids if telegram_id is not None}
+        generations.bump(*(_generation_key(telegram_id) for telegram_id in telegram_ids))
+        for telegram_id in telegram_ids:
+            self.delete(telegram_id)
+
+
+telegram_user_cache = TelegramUserCache()
+
+
 class TelegramAuthentication(BaseAuthentication):
     def authenticate(self, request):
         telegram_id = request.data.get('telegram_id') or request.query_params.get('telegram_id')
-        
+
         if not telegram_id:
             return None
-        
+
         try:
-            user = User.objects.get(telegram_id=telegram_id)
+            user = telegram_user_cache.resolve(int(telegram_id))
             return (user, None)
-        except User.DoesNotExist:
+        except (User.DoesNotExist, TypeError, ValueError):
             raise AuthenticationFailed('Необходимо авторизоваться. Используйте "🔗 Привязать аккаунт" для привязки аккаунта.')
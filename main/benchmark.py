@@ -0,0 +1,67 @@
+"""
+Нагрузочный клиент для сравнения способов запуска backend (bench_http) и
+замеров эндпоинтов на разных объемах данных (bench_api).
+
+Каждое из concurrency соединений в цикле отправляет GET-запросы по
+keep-alive, пока не истечет duration секунд; до замера выполняется прогрев.
+Для результата считаются число запросов в секунду, перцентили задержки и
+ошибки (сетевые сбои и ответы не 2xx/304).
+"""
+
+import asyncio
+import math
+import time
+
+import aiohttp
+
+WARMUP_SECONDS = 1.0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+async def _connection(session, url, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                ok = response.status < 300 or response.status == 304
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+async def _load(url, concurrency, duration, headers):
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+        warmup = time.perf_counter() + WARMUP_SECONDS
+        await asyncio.gather(*(_connection(session, url, warmup, [], []) for _ in range(concurrency)))
+
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(_connection(session, url, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def run_load(url, concurrency, duration, headers=None):
+    """Замер одного URL при заданном числе одновременных соединений."""
+    return asyncio.run(_load(url, concurrency, duration, headers))
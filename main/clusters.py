@@ -0,0 +1,182 @@
+"""
+Кластеры загрязнений по ячейкам сетки для каждого уровня зума карты.
+
+Агрегаты уровня хранятся в кеше целиком. Изменение загрязнения после
+коммита помечает его ячейки на всех уровнях как устаревшие (mark_cells), и
+следующий запрос уровня пересчитывает только эти ячейки запросом по
+диапазонам grid_cell. Пересчет из базы не зависит от порядка изменений,
+поэтому ячейка, пересчитанная до изменения, просто остается помеченной.
+Пометки и запись уровней идут под advisory-блокировкой PostgreSQL.
+
+Уровень целиком пересчитывается, если его нет в кеше, если помеченных ячеек
+больше MAX_DIRTY_CELLS и не реже раза в POLLUTION_CLUSTERS_CACHE_TIMEOUT
+секунд: с LocMemCache пометки видит только процесс, в котором произошло
+изменение.
+"""
+
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from . import geo
+from .models import Pollutions
+
+CACHE_PREFIX = 'pollution_clusters'
+# Счетчик пометок: уровень, построенный после пометки, снимает ее
+COUNTER_KEY = f'{CACHE_PREFIX}:counter'
+
+# Больше помеченных ячеек выгоднее пересчитать уровень целиком
+MAX_DIRTY_CELLS = 64
+
+
+def level_for_zoom(zoom):
+    # Ячейка примерно в четверть тайла карты на этом зуме
+    return min(max(int(zoom), 0) + 2, geo.GRID_BITS)
+
+
+LEVELS = range(level_for_zoom(0), geo.GRID_BITS + 1)
+
+
+def _cache_key(level):
+    return f'{CACHE_PREFIX}:{level}'
+
+
+def _dirty_key(level):
+    return f'{CACHE_PREFIX}:{level}:dirty'
+
+
+def _empty_cell():
+    return {'count': 0, 'lat_sum': 0.0, 'lon_sum': 0.0, 'by_type': {}, 'by_status': {}}
+
+
+def _build(level, cell_ids=None):
+    shift = geo.level_shift(level)
+    queryset = Pollutions.objects.filter(grid_cell__isnull=False)
+    if cell_ids is not None:
+        ranges = Q()
+        for cell_id in cell_ids:
+            ranges |= Q(grid_cell__gte=cell_id << shift, grid_cell__lt=(cell_id + 1) << shift)
+        queryset = queryset.filter(ranges)
+    rows = (
+        queryset
+        .with_status()
+        .annotate(cell=F('grid_cell') / (1 << shift))
+        .values('cell', 'pollution_type_id', 'status')
+        .annotate(count=Count('id'), lat_sum=Sum('latitude'), lon_sum=Sum('longitude'))
+        .order_by()
+    )
+
+    cells = {}
+    for row in rows:
+        cell = cells.setdefault(row['cell'], _empty_cell())
+        cell['count'] += row['count']
+        cell['lat_sum'] += row['lat_sum']
+        cell['lon_sum'] += row['lon_sum']
+        by_type = cell['by_type']
+        by_type[row['pollution_type_id']] = by_type.get(row['pollution_type_id'], 0) + row['count']
+        by_status = cell['by_status']
+        by_status[row['status']] = by_status.get(row['status'], 0) + row['count']
+    return cells
+
+
+def _lock():
+    # Держится до конца транзакции
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(CACHE_PREFIX.encode())])
+
+
+def get_clusters(zoom):
+    level = level_for_zoom(zoom)
+    timeout = settings.POLLUTION_CLUSTERS_CACHE_TIMEOUT
+    found = cache.get_many([_cache_key(level), _dirty_key(level), COUNTER_KEY])
+    entry = found.get(_cache_key(level))
+    dirty = found.get(_dirty_key(level)) or {}
+
+    if entry is None or time.time() - entry['built_at'] > timeout or len(dirty) > MAX_DIRTY_CELLS:
+        # Пометки, сделанные до чтения счетчика, новое построение учтет
+        counter = found.get(COUNTER_KEY)
+        entry = {'built_at': time.time(), 'cells': _build(level)}
+        with transaction.atomic():
+            _lock()
+            dirty = cache.get(_dirty_key(level)) or {}
+            cache.set(_cache_key(level), entry, timeout)
+            cache.set(_dirty_key(level), {
+                cell_id: mark for cell_id, mark in dirty.items() if counter is None or mark > counter
+            }, timeout)
+        return entry['cells']
+
+    if dirty:
+        fresh = _build(level, dirty)
+        with transaction.atomic():
+            _lock()
+            current = cache.get_many([_cache_key(level), _dirty_key(level)])
+            entry = current.get(_cache_key(level), entry)
+            for cell_id in dirty:
+                if cell_id in fresh:
+                    entry['cells'][cell_id] = fresh[cell_id]
+                else:
+                    entry['cells'].pop(cell_id, None)
+            # Ячейка, помеченная заново во время пересчета, остается помеченной
+            remaining = {
+                cell_id: mark for cell_id, mark in (current.get(_dirty_key(level)) or {}).items()
+                if dirty.get(cell_id) != mark
+            }
+            cache.set_many({_cache_key(level): entry, _dirty_key(level): remaining}, timeout)
+    return entry['cells']
+
+
+def mark_cells(grid_cells):
+    """Помечает ячейки всех уровней, в которые попадают grid_cells, для пересчета."""
+    grid_cells = {grid_cell for grid_cell in grid_cells if grid_cell is not None}
+    if not grid_cells:
+        return
+    keys = {_dirty_key(level): level for level in LEVELS}
+    with transaction.atomic():
+        _lock()
+        found = cache.get_many([*keys, COUNTER_KEY])
+        # Ключ вытеснен: новое значение больше любого записанного ранее
+        counter = found.pop(COUNTER_KEY, None) or time.time_ns()
+        counter += 1
+        for key, level in keys.items():
+            dirty = found.setdefault(key, {})
+            shift = geo.level_shift(level)
+            for grid_cell in grid_cells:
+                dirty[grid_cell >> shift] = counter
+        cache.set_many(found, settings.POLLUTION_CLUSTERS_CACHE_TIMEOUT)
+        cache.set(COUNTER_KEY, counter, None)
+
+
+def mark_pollutions(pks):
+    """То же по id загрязнений, для изменений через update() и m2m."""
+    mark_cells(Pollutions.objects.filter(pk__in=pks).values_list('grid_cell', flat=True))
+
+
+def invalidate():
+    """Сбрасывает все уровни, например после массовой загрузки в обход сигналов."""
+    with transaction.atomic():
+        _lock()
+        cache.delete_many([key for level in LEVELS for key in (_cache_key(level), _dirty_key(level))])
+
+
+def serialize(cells, bbox=None):
+    result = []
+    for cell_id, cell in cells.items():
+        latitude = cell['lat_sum'] / cell['count']
+        longitude = cell['lon_sum'] / cell['count']
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            if not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+                continue
+        result.append({
+            'cell': cell_id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'count': cell['count'],
+            'by_type': cell['by_type'],
+            'by_status': cell['by_status'],
+        })
+    return result
@@ -0,0 +1,112 @@
+"""
+Счетчики загрязнений по статусам и типам для /markers/status-stats/.
+
+Вьюхи меняют счетчики в той же транзакции, что и само загрязнение, поэтому
+статистика читается из нескольких строк без COUNT(*) по всей таблице.
+Команда rebuild_pollution_counters пересчитывает их с нуля.
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import PollutionCounter, Pollutions, PollutionStatus, PollutionType
+
+
+def _bump(kind, key, delta):
+    key = str(key)
+    if PollutionCounter.objects.filter(kind=kind, key=key).update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            PollutionCounter.objects.create(kind=kind, key=key, value=delta)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        PollutionCounter.objects.filter(kind=kind, key=key).update(value=F('value') + delta)
+
+
+def _bump_many(deltas):
+    """
+    Меняет несколько счетчиков {(kind, key): delta}. Строки блокируются в
+    порядке (kind, key), чтобы встречные переходы не взаимоблокировались.
+    """
+    for (kind, key), delta in sorted(deltas.items()):
+        if delta:
+            _bump(kind, key, delta)
+
+
+def record_created(pollution):
+    _bump_many({
+        (PollutionCounter.KIND_STATUS, str(pollution.get_status())): 1,
+        (PollutionCounter.KIND_TYPE, str(pollution.pollution_type_id)): 1,
+    })
+
+
+def record_created_many(pollutions):
+    """Для bulk_create: по одному обновлению на статус и каждый тип."""
+    # У только что созданных сообщений нет исполнителей и отметок о завершении
+    deltas = {(PollutionCounter.KIND_STATUS, str(PollutionStatus.NEW)): len(pollutions)}
+    for type_id, delta in Counter(pollution.pollution_type_id for pollution in pollutions).items():
+        deltas[(PollutionCounter.KIND_TYPE, str(type_id))] = delta
+    _bump_many(deltas)
+
+
+def move_status(old_status, new_status):
+    if old_status == new_status:
+        return
+    _bump_many({
+        (PollutionCounter.KIND_STATUS, str(old_status)): -1,
+        (PollutionCounter.KIND_STATUS, str(new_status)): 1,
+    })
+
+
+@transaction.atomic
+def rebuild():
+    by_status = Pollutions.objects.with_status().values('status').annotate(count=Count('id')).order_by()
+    by_type = Pollutions.objects.values('pollution_type_id').annotate(count=Count('id')).order_by()
+
+    PollutionCounter.objects.all().delete()
+    PollutionCounter.objects.bulk_create(
+        [PollutionCounter(kind=PollutionCounter.KIND_STATUS, key=row['status'], value=row['count']) for row in by_status]
+        + [PollutionCounter(kind=PollutionCounter.KIND_TYPE, key=str(row['pollution_type_id']), value=row['count']) for row in by_type]
+    )
+
+
+def _split_counters(rows):
+    by_status = {status.value: 0 for status in PollutionStatus}
+    by_type_id = {}
+    for kind, key, value in rows:
+        if kind == PollutionCounter.KIND_STATUS:
+            by_status[key] = value
+        elif value:
+            by_type_id[int(key)] = value
+    return by_status, by_type_id
+
+
+def _format_stats(by_status, by_type_id, type_names):
+    return {
+        'total': sum(by_status.values()),
+        'by_status': by_status,
+        'by_type': {type_names.get(type_id, str(type_id)): value for type_id, value in by_type_id.items()},
+        # Поля, которые ожидают фронтенд и бот
+        'in_progress': by_status[PollutionStatus.IN_PROGRESS],
+        'cleared': by_status[PollutionStatus.PENDING_REVIEW] + by_status[PollutionStatus.APPROVED],
+    }
+
+
+def get_stats():
+    by_status, by_type_id = _split_counters(PollutionCounter.objects.values_list('kind', 'key', 'value'))
+    type_names = dict(PollutionType.objects.filter(id__in=by_type_id).values_list('id', 'name'))
+    return _format_stats(by_status, by_type_id, type_names)
+
+
+async def aget_stats():
+    """То же для асинхронных вьюх (async_views.py)."""
+    rows = [row async for row in PollutionCounter.objects.values_list('kind', 'key', 'value')]
+    by_status, by_type_id = _split_counters(rows)
+    type_names = {
+        type_id: name
+        async for type_id, name in PollutionType.objects.filter(id__in=by_type_id).values_list('id', 'name')
+    }
+    return _format_stats(by_status, by_type_id, type_names)
@@ -0,0 +1,227 @@
+"""
+Синтетические сообщения о загрязнениях для нагрузочных тестов.
+
+Точки раскладываются вдоль береговой линии Каспия (COASTLINE): участок
+выбирается пропорционально длине, точка на нем — равномерно, затем
+смещается по нормальному закону на spread_km. Типы и статусы выбираются по
+весам, исполнители — из небольшого набора пользователей, а все сообщения
+ссылаются на несколько общих фото, так что миллион строк не требует
+миллиона файлов (копии этих фото строит обычная задача из signals.py).
+
+Строки пишутся bulk_create пачками. bulk_create не вызывает save() и
+сигналы, поэтому сетка заполняется здесь, даты создания записываются
+отдельным UPDATE после вставки, а счетчики, версия коллекции и
+кластеры пересчитываются в finish().
+"""
+
+import bisect
+import math
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import clusters, counters, geo, versions
+from .models import PollutionImage, Pollutions, PollutionStatus, PollutionType
+
+User = get_user_model()
+
+# (широта, долгота, регион) по часовой стрелке от дельты Волги
+COASTLINE = [
+    (45.80, 47.95, 'Астраханская область'),
+    (45.39, 47.37, 'Калмыкия'),
+    (44.55, 46.95, 'Дагестан'),
+    (43.60, 47.50, 'Дагестан'),
+    (42.98, 47.50, 'Дагестан'),
+    (42.56, 47.87, 'Дагестан'),
+    (42.06, 48.30, 'Дагестан'),
+    (41.30, 48.95, 'Азербайджан'),
+    (40.37, 49.85, 'Азербайджан'),
+    (38.75, 48.85, 'Азербайджан'),
+    (37.47, 49.46, 'Иран'),
+    (36.70, 52.65, 'Иран'),
+    (37.30, 53.90, 'Туркменистан'),
+    (40.02, 52.97, 'Туркменистан'),
+    (41.80, 52.45, 'Казахстан'),
+    (43.65, 51.17, 'Казахстан'),
+    (45.20, 51.60, 'Казахстан'),
+    (47.10, 51.90, 'Казахстан'),
+    (46.30, 49.50, 'Астраханская область'),
+    (45.80, 47.95, 'Астраханская область'),
+]
+
+DESCRIPTIONS = [
+    'Обнаружено {}',
+    '{} на пляже',
+    'Загрязнение: {}',
+    'Требуется уборка: {}',
+    '{} у кромки воды',
+]
+OBJECTS = [
+    'бытовой мусор',
+    'мертвая рыба',
+    'скопление мусора',
+    'нефтяное пятно',
+    'пластиковые бутылки',
+    'пластиковые пакеты',
+    'строительный мусор',
+    'рыболовные сети',
+]
+
+DEFAULT_STATUS_WEIGHTS = {
+    PollutionStatus.NEW: 50,
+    PollutionStatus.IN_PROGRESS: 20,
+    PollutionStatus.PENDING_REVIEW: 10,
+    PollutionStatus.APPROVED: 20,
+}
+
+ASSIGNEE_PREFIX = 'synthetic_volunteer_'
+KM_PER_DEGREE = 111.0
+
+
+def parse_weights(value):
+    """'Мусор=5,Нефть=1' -> {'Мусор': 5.0, 'Нефть': 1.0}"""
+    weights = {}
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        name, sep, weight = part.rpartition('=')
+        if not sep or not name:
+            raise ValueError(f'Ожидается имя=вес: {part}')
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class Coastline:
+    def __init__(self, points=COASTLINE):
+        self.segments = list(zip(points, points[1:]))
+        lengths = [math.dist(a[:2], b[:2]) for a, b in self.segments]
+        total = sum(lengths)
+        self.cumulative = []
+        acc = 0.0
+        for length in lengths:
+            acc += length / total
+            self.cumulative.append(acc)
+
+    def sample(self, rng, spread_km):
+        index = min(bisect.bisect_left(self.cumulative, rng.random()), len(self.segments) - 1)
+        (lat1, lon1, region), (lat2, lon2, _) = self.segments[index]
+        t = rng.random()
+        latitude = lat1 + (lat2 - lat1) * t + rng.gauss(0, spread_km / KM_PER_DEGREE)
+        longitude = lon1 + (lon2 - lon1) * t + rng.gauss(0, spread_km / (KM_PER_DEGREE * math.cos(math.radians(latitude))))
+        return round(latitude, 6), round(longitude, 6), region
+
+
+def _image_bytes(index, rng):
+    image = Image.new('RGB', (800, 600), color=(rng.randint(40, 120), rng.randint(90, 160), rng.randint(140, 210)))
+    ImageDraw.Draw(image).text((40, 280), f'synthetic #{index}', fill=(255, 255, 255))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def create_image_pool(size, rng):
+    pool = []
+    for index in range(size):
+        pollution_image = PollutionImage()
+        pollution_image.image.save(f'synthetic_{index}.jpg', ContentFile(_image_bytes(index, rng)), save=True)
+        pool.append(pollution_image)
+    return pool
+
+
+def get_assignees(count):
+    users = list(User.objects.filter(username__startswith=ASSIGNEE_PREFIX).order_by('id')[:count])
+    missing = [User(username=f'{ASSIGNEE_PREFIX}{index}') for index in range(len(users), count)]
+    for user in missing:
+        user.set_unusable_password()
+    return users + User.objects.bulk_create(missing)
+
+
+def restore_created_at(pollutions, dates):
+    # bulk_create проставляет auto_now_add всем строкам, поэтому
+    # сгенерированные даты возвращаем одним UPDATE по массивам id и дат
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Pollutions._meta.db_table} AS p SET created_at = v.created_at '
+            'FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(id, created_at) WHERE p.id = v.id',
+            [[pollution.pk for pollution in pollutions], dates],
+        )
+    for pollution, created_at in zip(pollutions, dates):
+        pollution.created_at = created_at
+
+
+class Generator:
+    def __init__(self, *, seed=None, spread_km=1.5, days=365, type_weights=None, status_weights=None,
+                 assignees=20, images=16):
+        self.rng = random.Random(seed)
+        self.coastline = Coastline()
+        self.spread_km = spread_km
+        self.days = days
+
+        pollution_types = {pollution_type.name: pollution_type for pollution_type in PollutionType.objects.all()}
+        if not pollution_types:
+            raise ValueError('Нет типов загрязнений: python manage.py types_faking')
+        type_weights = type_weights or {name: 1 for name in pollution_types}
+        unknown = set(type_weights) - set(pollution_types)
+        if unknown:
+            raise ValueError(f'Неизвестные типы загрязнений: {", ".join(sorted(unknown))}')
+        self.types = [pollution_types[name] for name in type_weights]
+        self.type_weights = list(type_weights.values())
+
+        status_weights = status_weights or DEFAULT_STATUS_WEIGHTS
+        unknown = set(status_weights) - set(PollutionStatus.values)
+        if unknown:
+            raise ValueError(f'Неизвестные статусы: {", ".join(sorted(unknown))}')
+        self.statuses = list(status_weights)
+        self.status_weights = list(status_weights.values())
+
+        self.assignees = get_assignees(assignees) if assignees else []
+        if not self.assignees and set(self.statuses) - {PollutionStatus.NEW}:
+            raise ValueError('Для статусов кроме new нужны исполнители')
+        self.images = create_image_pool(images, self.rng)
+
+    def _build(self, now):
+        rng = self.rng
+        latitude, longitude, region = self.coastline.sample(rng, self.spread_km)
+        status = rng.choices(self.statuses, self.status_weights)[0]
+        assignee = rng.choice(self.assignees) if status != PollutionStatus.NEW else None
+        is_completed = status in (PollutionStatus.PENDING_REVIEW, PollutionStatus.APPROVED)
+        image = rng.choice(self.images)
+        pollution = Pollutions(
+            latitude=latitude,
+            longitude=longitude,
+            grid_cell=geo.grid_cell(latitude, longitude),
+            description=rng.choice(DESCRIPTIONS).format(rng.choice(OBJECTS)).capitalize(),
+            pollution_type=rng.choices(self.types, self.type_weights)[0],
+            created_at=now - timedelta(seconds=rng.randrange(self.days * 86400)),
+            images=image,
+            phone_number=f'+79{rng.randrange(10 ** 9):09d}' if rng.random() < 0.5 else None,
+            region_type=region,
+            is_completed=is_completed,
+            is_approved=status == PollutionStatus.APPROVED,
+            completed_by=assignee if is_completed else None,
+            completion_photo=image.image.name if is_completed else None,
+        )
+        return pollution, assignee
+
+    def create_batch(self, size):
+        now = timezone.now()
+        rows = [self._build(now) for _ in range(size)]
+        dates = [pollution.created_at for pollution, _ in rows]
+        with transaction.atomic():
+            pollutions = Pollutions.objects.bulk_create([pollution for pollution, _ in rows])
+            restore_created_at(pollutions, dates)
+            Through = Pollutions.assigned_to.through
+            Through.objects.bulk_create([
+                Through(pollutions_id=pollution.pk, user_id=assignee.pk)
+                for pollution, (_, assignee) in zip(pollutions, rows) if assignee
+            ])
+        return len(pollutions)
+
+    def finish(self):
+        versions.bump()
+        counters.rebuild()
+        clusters.invalidate()
@@ -0,0 +1,118 @@
+"""
+Потоковая выгрузка сообщений о загрязнениях в CSV, GeoJSON и NDJSON.
+
+Строки читаются серверным курсором (iterator(chunk_size=...)) и сразу
+уходят клиенту, поэтому память не зависит от размера таблицы, а заголовок
+файла отправляется еще до выполнения запроса.
+"""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ParseError
+
+from .filters import filter_pollutions
+from .models import Pollutions, PollutionImage
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'geojson': 'application/geo+json',
+    'ndjson': 'application/x-ndjson',
+}
+
+FIELDS = ['id', 'created_at', 'latitude', 'longitude', 'pollution_type', 'status', 'description', 'region_type', 'image']
+COLUMNS = [
+    'id', 'created_at', 'latitude', 'longitude', 'pollution_type__name', 'status', 'description', 'region_type', 'images__image',
+]
+
+# Сколько строк склеивать в один кусок ответа
+ROWS_PER_CHUNK = 500
+
+
+def _parse_day(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ParseError(f'{name}: ожидается дата в формате ГГГГ-ММ-ДД')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(params):
+    """
+    Выборка для выгрузки: фильтры списка (filters.py) и даты date_from /
+    date_to включительно, по возрастанию id.
+    """
+    queryset = Pollutions.objects.with_status()
+    if params.get('date_from'):
+        queryset = queryset.filter(created_at__gte=_parse_day(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        queryset = queryset.filter(created_at__lt=_parse_day(params['date_to'], 'date_to') + timedelta(days=1))
+    queryset = filter_pollutions(queryset, params)
+    return queryset.order_by('id').values_list(*COLUMNS)
+
+
+def _rows(queryset):
+    storage = PollutionImage._meta.get_field('image').storage
+    for row in queryset.iterator(chunk_size=settings.POLLUTION_EXPORT_CHUNK_SIZE):
+        item = dict(zip(FIELDS, row))
+        item['created_at'] = item['created_at'].isoformat()
+        item['image'] = storage.url(item['image']) if item['image'] else None
+        yield item
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for item in rows:
+        yield writer.writerow([item[field] for field in FIELDS])
+
+
+def _ndjson_lines(rows):
+    for item in rows:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def _geojson_lines(rows):
+    yield '{"type": "FeatureCollection", "features": [\n'
+    separator = ''
+    for item in rows:
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [item['longitude'], item['latitude']]},
+            'properties': {field: item[field] for field in FIELDS if field not in ('latitude', 'longitude')},
+        }
+        yield separator + json.dumps(feature, ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+WRITERS = {
+    'csv': _csv_lines,
+    'geojson': _geojson_lines,
+    'ndjson': _ndjson_lines,
+}
+
+
+def stream(queryset, export_format):
+    """Генератор кусков текста выгрузки в формате export_format."""
+    lines = WRITERS[export_format](_rows(queryset))
+    # Первая строка (заголовок CSV или начало GeoJSON) уходит до запроса к базе
+    if export_format != 'ndjson':
+        yield next(lines)
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
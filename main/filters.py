@@ -0,0 +1,106 @@
+import html
+import re
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, Exists, F, Q, When
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import PollutionStatus
+
+# Статусы фронтенда -> статусы бекенда
+FRONTEND_STATUSES = {
+    'REPORTED': PollutionStatus.NEW,
+    'IN_PROGRESS': PollutionStatus.IN_PROGRESS,
+    'CLEANED': PollutionStatus.PENDING_REVIEW,
+    'VERIFIED': PollutionStatus.APPROVED,
+}
+
+SEARCH_CONFIG = 'russian'
+# Границы найденных слов в search_headline. Описание вводят пользователи,
+# поэтому в SQL оно размечается символами из области частного использования,
+# а в <b> они превращаются уже после экранирования (render_headline)
+HEADLINE_START = '\ue000'
+HEADLINE_STOP = '\ue001'
+
+
+@lru_cache(maxsize=None)
+def trigram_available():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search_pollutions(queryset, text):
+    """
+    Полнотекстовый поиск по search_vector с ранжированием и подсветкой.
+    Каждое слово ищется как префикс основы, так что «нефть» находит
+    «нефтяные». Если совпадений нет (например, опечатка в названии места),
+    ищем по триграммам: оператор <% (lookup trigram_word_similar) использует
+    индекс pollution_description_trgm_idx, а порог берет из настройки сессии
+    pg_trgm.word_similarity_threshold (SEARCH_TRIGRAM_THRESHOLD в settings).
+    Запасной поиск входит в тот же запрос: условие NOT EXISTS не зависит от
+    строки, и PostgreSQL вычисляет его один раз.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return queryset
+    query = SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+    headline = SearchHeadline('description', query, config=SEARCH_CONFIG, start_sel=HEADLINE_START, stop_sel=HEADLINE_STOP)
+    matches = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+
+    if trigram_available():
+        matches |= Q(~Exists(queryset.filter(matches)), description__trigram_word_similar=text)
+        rank = Case(When(search_vector=query, then=rank), default=TrigramWordSimilarity(text, 'description'))
+
+    return queryset.filter(matches).annotate(
+        search_rank=rank,
+        search_headline=headline,
+    ).order_by('-search_rank', '-created_at')
+
+
+def render_headline(raw):
+    """Экранированный фрагмент описания с найденными словами в <b>."""
+    if raw is None:
+        return None
+    return html.escape(raw).replace(HEADLINE_START, '<b>').replace(HEADLINE_STOP, '</b>')
+
+
+def filter_pollutions(queryset, params):
+    """
+    Фильтры списка загрязнений по query-параметрам: pollution_type (id или
+    название), type, status, region_type и search. Каждая комбинация покрыта
+    составным индексом из Pollutions.Meta.indexes.
+    """
+    pollution_type = params.get('pollution_type') or params.get('type')
+    if pollution_type:
+        # isdigit() пропускает и не-ASCII цифры вроде '²', которые int() не примет
+        if pollution_type.isascii() and pollution_type.isdigit():
+            queryset = queryset.filter(pollution_type_id=int(pollution_type))
+        else:
+            queryset = queryset.filter(pollution_type__name=pollution_type)
+
+    status = params.get('status')
+    if status:
+        status = FRONTEND_STATUSES.get(status, status)
+        if status not in PollutionStatus.values:
+            raise ParseError(f'Неизвестный статус: {status}')
+        queryset = queryset.filter_status(status)
+
+    region_type = params.get('region_type')
+    if region_type:
+        queryset = queryset.filter(region_type=region_type)
+
+    search = params.get('search', '').strip()
+    if search:
+        queryset = search_pollutions(queryset, search)
+
+    return queryset
+
+
+class PollutionFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return filter_pollutions(queryset, request.query_params)
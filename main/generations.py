@@ -0,0 +1,30 @@
+"""
+Поколения в кеше Django: счетчики, по которым процессы узнают, что
+закешированные производные данные устарели (списки получателей в roster.py,
+пользователи TelegramAuthentication в authentication.py).
+
+Запись хранится вместе с поколением, прочитанным до ее построения, и
+перестраивается, если поколение с тех пор изменилось. Поэтому запись,
+построенная до изменения и сохраненная после него, тоже окажется устаревшей.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+def get(key):
+    generation = cache.get(key)
+    if generation is None:
+        # Ключ вытеснен: новое значение не совпадет ни с одним записанным ранее
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
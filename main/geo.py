@@ -0,0 +1,118 @@
+"""
+Пространственная сетка для поиска загрязнений без PostGIS.
+
+Координаты квантуются в сетку 2^GRID_BITS x 2^GRID_BITS, а номер ячейки
+считается как код Мортона (чередование битов долготы и широты). У такого кода
+ячейка уровня L — это непрерывный диапазон мелких ячеек, поэтому любой
+прямоугольник покрывается несколькими диапазонами по индексу grid_cell.
+"""
+
+import math
+
+GRID_BITS = 16
+GRID_SIZE = 1 << GRID_BITS
+
+# Сколько ячеек максимум перебираем при покрытии прямоугольника
+MAX_COVER_CELLS = 64
+
+
+def _quantize(value, lower, upper):
+    index = int((value - lower) / (upper - lower) * GRID_SIZE)
+    return min(max(index, 0), GRID_SIZE - 1)
+
+
+def _spread(value):
+    value &= 0xFFFF
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    value = (value | (value << 1)) & 0x55555555
+    return value
+
+
+def _morton(x, y):
+    return _spread(x) | (_spread(y) << 1)
+
+
+def grid_cell(latitude, longitude):
+    """Номер ячейки самого мелкого уровня для точки."""
+    x = _quantize(float(longitude), -180.0, 180.0)
+    y = _quantize(float(latitude), -90.0, 90.0)
+    return _morton(x, y)
+
+
+def level_shift(level):
+    """На сколько бит сдвинуть grid_cell, чтобы получить ячейку уровня level."""
+    return 2 * (GRID_BITS - level)
+
+
+def parse_bbox(raw):
+    """Разбирает строку minLon,minLat,maxLon,maxLat. Бросает ValueError."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in raw.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('bbox должен иметь вид minLon,minLat,maxLon,maxLat')
+
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError('Некорректные границы bbox')
+
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def cover_level(bbox, zoom=None):
+    """
+    Подбирает уровень сетки для покрытия bbox: не мельче zoom (если задан)
+    и не больше MAX_COVER_CELLS ячеек.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    x0, x1 = _quantize(min_lon, -180.0, 180.0), _quantize(max_lon, -180.0, 180.0)
+    y0, y1 = _quantize(min_lat, -90.0, 90.0), _quantize(max_lat, -90.0, 90.0)
+
+    level = GRID_BITS if zoom is None else min(max(int(zoom), 0), GRID_BITS)
+    while level > 0:
+        shift = GRID_BITS - level
+        cells = ((x1 >> shift) - (x0 >> shift) + 1) * ((y1 >> shift) - (y0 >> shift) + 1)
+        if cells <= MAX_COVER_CELLS:
+            break
+        level -= 1
+    return level
+
+
+def cell_ranges(bbox, level):
+    """
+    Диапазоны [start, end) значений grid_cell, покрывающие bbox на уровне level.
+    Соседние диапазоны склеиваются.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    shift = GRID_BITS - level
+    x0, x1 = _quantize(min_lon, -180.0, 180.0) >> shift, _quantize(max_lon, -180.0, 180.0) >> shift
+    y0, y1 = _quantize(min_lat, -90.0, 90.0) >> shift, _quantize(max_lat, -90.0, 90.0) >> shift
+
+    codes = sorted(_morton(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    cell_shift = level_shift(level)
+
+    ranges = []
+    for code in codes:
+        start, end = code << cell_shift, (code + 1) << cell_shift
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """Прямоугольник, гарантированно содержащий круг радиуса radius_km."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(latitude) + dlat, 89.9)))
+    dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(longitude - dlon, -180.0),
+        max(latitude - dlat, -90.0),
+        min(longitude + dlon, 180.0),
+        min(latitude + dlat, 90.0),
+    )
@@ -0,0 +1,113 @@
+"""
+Безопасный повтор POST-запросов с заголовком Idempotency-Key.
+
+Бот повторяет запрос после сетевого сбоя или таймаута с тем же ключом.
+Первый ответ с кодом ниже 500 сохраняется в кеше Django на
+IDEMPOTENCY_TIMEOUT секунд и отдается на повторы без повторного выполнения
+вьюхи, с заголовком Idempotent-Replayed: true. Пока первый запрос еще
+выполняется, повтор получает 409 с Retry-After: бот повторяет его с паузой.
+Ответы 5xx не сохраняются: такой запрос можно выполнить заново.
+
+Запись привязана к пути и заголовку Authorization, поэтому одинаковые ключи
+разных клиентов не пересекаются. С LocMemCache повтор распознается только
+процессом, который принял первый запрос.
+"""
+
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+IN_PROGRESS = 'in-progress'
+
+
+def cache_key(request):
+    key = request.headers.get(HEADER)
+    if request.method != 'POST' or not key:
+        return None
+    scope = '\n'.join((request.path, request.headers.get('Authorization', ''), key))
+    return 'idempotency:' + hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _invalid_key(request):
+    if len(request.headers[HEADER]) > MAX_KEY_LENGTH:
+        return JsonResponse({'error': f'{HEADER} длиннее {MAX_KEY_LENGTH} символов'}, status=400)
+    return None
+
+
+def _replay(entry):
+    if entry == IN_PROGRESS:
+        response = JsonResponse({'error': f'Запрос с этим {HEADER} еще выполняется'}, status=409)
+        response['Retry-After'] = '1'
+        return response
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _entry(response):
+    if response.streaming or response.status_code >= 500:
+        return None
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'content_type': response.get('Content-Type'),
+    }
+
+
+class IdempotencyMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        invalid = _invalid_key(request)
+        if invalid is not None:
+            return invalid
+        if not cache.add(key, IN_PROGRESS, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            entry = cache.get(key)
+            if entry is not None:
+                return _replay(entry)
+
+        response = self.get_response(request)
+        entry = _entry(response)
+        if entry is None:
+            cache.delete(key)
+        else:
+            cache.set(key, entry, settings.IDEMPOTENCY_TIMEOUT)
+        return response
+
+    async def __acall__(self, request):
+        key = cache_key(request)
+        if key is None:
+            return await self.get_response(request)
+        invalid = _invalid_key(request)
+        if invalid is not None:
+            return invalid
+        if not await cache.aadd(key, IN_PROGRESS, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            entry = await cache.aget(key)
+            if entry is not None:
+                return _replay(entry)
+
+        response = await self.get_response(request)
+        entry = _entry(response)
+        if entry is None:
+            await cache.adelete(key)
+        else:
+            await cache.aset(key, entry, settings.IDEMPOTENCY_TIMEOUT)
+        return response
@@ -0,0 +1,89 @@
+"""
+Уменьшенные копии фотографий загрязнений и фото завершения.
+
+Для каждого исходника сохраняются thumbnail (JPEG), medium (JPEG) и webp
+(WebP размера medium). Имена файлов копий лежат в JSON-поле рядом с
+исходником вместе с именем исходника (ключ source): если фото заменили,
+старые копии перестают считаться действительными.
+
+Копии строятся фоновыми задачами (tasks.py) после коммита транзакции, а для
+уже загруженных фото — командой generate_image_variants.
+"""
+
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Pollutions, PollutionImage
+
+# Имя копии -> (наибольшая сторона в пикселях, формат Pillow, расширение)
+VARIANTS = {
+    'thumbnail': (320, 'JPEG', 'jpg'),
+    'medium': (1280, 'JPEG', 'jpg'),
+    'webp': (1280, 'WEBP', 'webp'),
+}
+QUALITY = 82
+
+
+def variants_are_current(variants, field_file):
+    return bool(field_file) and bool(variants) and variants.get('source') == field_file.name
+
+
+def variant_urls(variants, field_file):
+    """Пути копий для сериализатора; None, если копии еще не готовы."""
+    if not variants_are_current(variants, field_file):
+        return None
+    storage = field_file.storage
+    return {name: storage.url(variants[name]) for name in VARIANTS if name in variants}
+
+
+def build_variants(field_file):
+    """Сохраняет копии field_file в его хранилище и возвращает словарь для JSON-поля."""
+    storage = field_file.storage
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    with field_file.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    variants = {'source': field_file.name}
+    for name, (size, image_format, extension) in VARIANTS.items():
+        copy = image.copy()
+        copy.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        copy.save(buffer, image_format, quality=QUALITY, optimize=True)
+        path = f'{directory}/variants/{stem}_{name}.{extension}'
+        if storage.exists(path):
+            storage.delete(path)
+        variants[name] = storage.save(path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def process_pollution_image(pk, force=False):
+    pollution_image = PollutionImage.objects.filter(pk=pk).first()
+    if pollution_image is None or not pollution_image.image:
+        return False
+    if not force and variants_are_current(pollution_image.variants, pollution_image.image):
+        return False
+    pollution_image.variants = build_variants(pollution_image.image)
+    # Через save(), чтобы сигналы сбросили версию коллекции и кеш ответов
+    pollution_image.save(update_fields=['variants'])
+    return True
+
+
+def process_completion_photo(pk, force=False):
+    pollution = Pollutions.objects.filter(pk=pk).first()
+    if pollution is None or not pollution.completion_photo:
+        return False
+    if not force and variants_are_current(pollution.completion_photo_variants, pollution.completion_photo):
+        return False
+    pollution.completion_photo_variants = build_variants(pollution.completion_photo)
+    pollution.save(update_fields=['completion_photo_variants'])
+    return True
+
@@ -0,0 +1,238 @@
+"""
+Очередь фоновых задач в таблице Job, без внешнего брокера.
+
+Задача — функция, помеченная @task; enqueue() создает строку Job в текущей
+транзакции, так что воркер увидит задачу только после коммита. Воркеры
+(команда run_jobs) берут задачи через SELECT ... FOR UPDATE SKIP LOCKED.
+Число одновременно выполняемых задач каждой очереди ограничено JOB_QUEUES:
+занятые слоты считаются под advisory-блокировкой очереди. Упавшая задача
+перезапускается с экспоненциальной задержкой, пока не кончатся попытки.
+Пока задача выполняется, воркер раз в JOBS_HEARTBEAT_INTERVAL секунд обновляет
+locked_at; задача, от которой отметок нет дольше JOBS_LOCK_TIMEOUT (воркер
+упал), возвращается в очередь, а если попытки кончились — помечается ошибкой.
+"""
+
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(queue='default', max_attempts=None, name=None):
+    def decorator(func):
+        func.job_name = name or f'{func.__module__}.{func.__name__}'
+        func.job_queue = queue
+        func.job_max_attempts = max_attempts
+        _registry[func.job_name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, delay=0, **payload):
+    """Ставит задачу в очередь. Аргументы должны сериализоваться в JSON."""
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: func(**payload))
+        return None
+    return Job.objects.create(
+        queue=func.job_queue,
+        name=func.job_name,
+        payload=payload,
+        max_attempts=func.job_max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(func, payloads):
+    """Ставит пачку задач одним INSERT."""
+    payloads = list(payloads)
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: [func(**payload) for payload in payloads])
+        return []
+    run_at = timezone.now()
+    return Job.objects.bulk_create([
+        Job(
+            queue=func.job_queue,
+            name=func.job_name,
+            payload=payload,
+            max_attempts=func.job_max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            run_at=run_at,
+        )
+        for payload in payloads
+    ])
+
+
+def retry_delay(attempts):
+    delay = min(settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOBS_RETRY_MAX_DELAY)
+    # Разброс, чтобы задачи, упавшие одновременно, не перезапускались пачкой
+    return delay * random.uniform(0.75, 1.25)
+
+
+def _lock_queue(queue):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(f'jobs:{queue}'.encode())])
+
+
+def requeue_stale():
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT),
+    )
+    error = 'Воркер не завершил задачу вовремя'
+    # Задача, которая роняет воркер, не должна перезапускаться бесконечно
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, finished_at=now, locked_at=None, locked_by='', last_error=error,
+    )
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.STATUS_QUEUED, locked_at=None, locked_by='', last_error=error,
+    )
+
+
+def heartbeat(job):
+    """Продлевает блокировку задачи, пока ее выполняет этот воркер."""
+    return Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by).update(
+        locked_at=timezone.now(),
+    )
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, job):
+        super().__init__(name=f'job-heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self.finished.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+                try:
+                    heartbeat(self.job)
+                except Exception:
+                    logger.exception('Не удалось продлить блокировку задачи #%s', self.job.pk)
+        finally:
+            # У потока свое соединение с БД
+            connection.close()
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def claim(queues, worker):
+    """Берет следующую готовую задачу из первой очереди, где есть свободный слот."""
+    now = timezone.now()
+    for queue in queues:
+        with transaction.atomic():
+            limit = settings.JOB_QUEUES.get(queue)
+            if limit:
+                _lock_queue(queue)
+                running = Job.objects.filter(status=Job.STATUS_RUNNING, queue=queue).count()
+                if running >= limit:
+                    continue
+
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.STATUS_QUEUED, queue=queue, run_at__lte=now)
+                .order_by('run_at', 'id')
+                .first()
+            )
+            if job is None:
+                continue
+            job.status = Job.STATUS_RUNNING
+            job.attempts += 1
+            job.locked_at = now
+            job.locked_by = worker
+            job.save(update_fields=['status', 'attempts', 'locked_at', 'locked_by'])
+            return job
+    return None
+
+
+def _finish(job, **update):
+    # Пока задача выполнялась, ее могли счесть брошенной и отдать другому
+    # воркеру: тогда строка уже не наша, и результат этой попытки не пишем
+    if Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by).update(**update):
+        return True
+    logger.warning('Задача %s #%s потеряла блокировку воркера %s, результат отброшен', job.name, job.pk, job.locked_by)
+    return False
+
+
+def execute(job):
+    func = _registry.get(job.name)
+    beat = _Heartbeat(job)
+    beat.start()
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная задача: {job.name}')
+        func(**job.payload)
+    except Exception:
+        beat.stop()
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s упала (попытка %s из %s)', job.name, job.pk, job.attempts, job.max_attempts)
+        if job.attempts >= job.max_attempts:
+            update = {'status': Job.STATUS_FAILED, 'finished_at': timezone.now()}
+        else:
+            update = {'status': Job.STATUS_QUEUED, 'run_at': timezone.now() + timedelta(seconds=retry_delay(job.attempts))}
+        _finish(job, locked_at=None, locked_by='', last_error=error, **update)
+        return False
+
+    beat.stop()
+    return _finish(job, status=Job.STATUS_DONE, finished_at=timezone.now(), locked_at=None, last_error='')
+
+
+def purge(days=None):
+    """Удаляет выполненные задачи старше JOBS_RETENTION_DAYS дней."""
+    days = settings.JOBS_RETENTION_DAYS if days is None else days
+    deleted, _ = Job.objects.filter(
+        status=Job.STATUS_DONE, finished_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+class Worker:
+    def __init__(self, queues, poll_interval=None):
+        self.queues = queues
+        self.poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self.next_requeue = 0.0
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, burst=False):
+        """Выполняет задачи до сигнала остановки; с burst=True — пока очередь не опустеет."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            # Брошенные задачи ищем раз в интервал отметок, а не на каждом опросе:
+            # чаще они и не появляются
+            if time.monotonic() >= self.next_requeue:
+                requeue_stale()
+                self.next_requeue = time.monotonic() + settings.JOBS_HEARTBEAT_INTERVAL
+            job = claim(self.queues, self.name)
+            if job is None:
+                if burst:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            execute(job)
+            processed += 1
+        close_old_connections()
+        return processed
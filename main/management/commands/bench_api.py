@@ -0,0 +1,125 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from main import dataset
+from main.benchmark import run_load
+from main.models import Pollutions, Position, User
+
+# (имя URL из main/urls.py, путь, от чьего имени). POST-эндпоинты меняют
+# данные между прогонами и не замеряются
+SCENARIOS = [
+    ('pollution_list_create', '/api/pollutions/', None),
+    ('pollution_list_create', '/api/pollutions/?page=50', None),
+    ('pollution_list_create', '/api/pollutions/?status=IN_PROGRESS&region_type=Дагестан', None),
+    ('pollution_list_create', '/api/pollutions/?search=нефтяное', None),
+    ('pollution_list_create', '/api/pollutions/?pagination=cursor', None),
+    ('pollution_list_create', '/api/pollutions/?bbox={bbox}&zoom=11', None),
+    ('pollution_detail', '/api/pollutions/{pk}/', None),
+    ('pollution_nearby', '/api/pollutions/nearby/?lat=42.98&lon=47.5&k=20', None),
+    ('pollution_map_feed', '/api/pollutions/map-feed/?bbox={bbox}', None),
+    ('pollution_clusters', '/api/pollutions/clusters/?zoom=5', None),
+    ('pollution_clusters', '/api/pollutions/clusters/?zoom=12&bbox={bbox}', None),
+    ('pollution_export', '/api/pollutions/export/ndjson/?date_from={date_from}', 'manager'),
+    ('status_stats', '/api/markers/status-stats/', None),
+    ('pollution_type_list', '/api/pollution-types/', None),
+    ('user_profile', '/api/user/profile/', 'volunteer'),
+    ('user_assigned_pollutions', '/api/user/assigned-pollutions/', 'volunteer'),
+]
+
+# Побережье Махачкалы
+BBOX = '47.35,42.85,47.70,43.10'
+MANAGER_USERNAME = 'synthetic_manager'
+
+
+def _access_token(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def _auth_headers():
+    manager, _ = User.objects.get_or_create(username=MANAGER_USERNAME)
+    position, _ = Position.objects.get_or_create(name='Менеджер')
+    if manager.position_id != position.pk:
+        manager.position = position
+        manager.save(update_fields=['position'])
+    volunteer = dataset.get_assignees(1)[0]
+    return {
+        'manager': {'Authorization': f'Bearer {_access_token(manager)}'},
+        'volunteer': {'Authorization': f'Bearer {_access_token(volunteer)}'},
+    }
+
+
+def _path_params():
+    # Загрязнение из середины диапазона id: не самое новое и не самое старое
+    bounds = Pollutions.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        raise CommandError('В базе нет сообщений: задайте ненулевой размер в --sizes')
+    pk = Pollutions.objects.filter(id__gte=(bounds['low'] + bounds['high']) // 2).order_by('id').values_list('id', flat=True).first()
+    return {
+        'pk': pk,
+        'bbox': BBOX,
+        'date_from': (timezone.localdate() - timedelta(days=7)).isoformat(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p99 и пропускную способность GET-эндпоинтов запущенного сервера на наборах '
+        'разного размера, при необходимости догенерируя данные. Запускайте на отдельной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True, help='Базовый URL сервера, работающего с той же базой')
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='Размеры набора через запятую')
+        parser.add_argument('--generate', action='store_true', help='Догенерировать сообщения до каждого размера (generate_pollutions)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0, help='Секунд на один эндпоинт')
+        parser.add_argument('--only', action='append', help='Только эндпоинты с этим именем URL; можно указать несколько раз')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes: ожидаются числа через запятую')
+        scenarios = [scenario for scenario in SCENARIOS if not options['only'] or scenario[0] in options['only']]
+        base_url = options['url'].rstrip('/')
+        generator = None
+        report = []
+
+        for size in sizes:
+            current = Pollutions.objects.count()
+            if current > size:
+                raise CommandError(f'В базе уже {current} сообщений, больше чем {size}')
+            if current < size:
+                if not options['generate']:
+                    raise CommandError(f'В базе {current} сообщений из {size}; добавьте --generate')
+                if generator is None:
+                    generator = dataset.Generator(seed=options['seed'])
+                self.stdout.write(f'Генерация {size - current} сообщений...')
+                while current < size:
+                    current += generator.create_batch(min(options['batch_size'], size - current))
+                generator.finish()
+
+            params = _path_params()
+            headers = _auth_headers()
+            self.stdout.write(f'\n{size} сообщений, {options["concurrency"]} соединений')
+            self.stdout.write(f'{"путь":<60} {"запр/с":>9} {"p50, мс":>9} {"p99, мс":>9} {"ошибки":>7}')
+            for url_name, path, auth in scenarios:
+                path = path.format(**params)
+                result = run_load(base_url + path, options['concurrency'], options['duration'], headers.get(auth))
+                report.append({'size': size, 'url_name': url_name, 'path': path, **result})
+                self.stdout.write(
+                    f'{path:<60} {result["rps"]:>9} {result["p50_ms"]!s:>9} {result["p99_ms"]!s:>9} {result["errors"]:>7}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {options["output"]}'))
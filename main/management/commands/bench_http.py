@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmark import run_load
+from main.models import Pollutions
+
+DEFAULT_PATHS = (
+    '/api/pollutions/',
+    '/api/pollutions/?page=2',
+    '/api/pollutions/{pk}/',
+    '/api/pollution-types/',
+    '/api/markers/status-stats/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность запущенных серверов (например, WSGI и ASGI) на горячих GET-эндпоинтах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='имя=базовый URL, например wsgi=http://127.0.0.1:8000; можно указать несколько раз',
+        )
+        parser.add_argument('--path', action='append', help='Путь для замера; по умолчанию список, карточка, типы и статистика')
+        parser.add_argument('--concurrency', action='append', type=int, help='Одновременных соединений (по умолчанию 1, 16 и 64)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Секунд на один замер')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep or not base_url.startswith(('http://', 'https://')):
+                raise CommandError(f'Ожидается имя=URL: {target}')
+            targets.append((name, base_url.rstrip('/')))
+
+        paths = options['path'] or DEFAULT_PATHS
+        if any('{pk}' in path for path in paths):
+            pk = Pollutions.objects.order_by('-created_at').values_list('pk', flat=True).first()
+            if pk is None:
+                raise CommandError('В базе нет загрязнений для замера карточки')
+            paths = [path.format(pk=pk) for path in paths]
+
+        self.stdout.write(f'{"сервер":<8} {"путь":<34} {"соед.":>6} {"запр/с":>9} {"p50, мс":>9} {"p99, мс":>9} {"ошибки":>7}')
+        for path in paths:
+            for concurrency in options['concurrency'] or (1, 16, 64):
+                for name, base_url in targets:
+                    result = run_load(base_url + path, concurrency, options['duration'])
+                    self.stdout.write(
+                        f'{name:<8} {path:<34} {concurrency:>6} {result["rps"]:>9} '
+                        f'{result["p50_ms"]!s:>9} {result["p99_ms"]!s:>9} {result["errors"]:>7}'
+                    )
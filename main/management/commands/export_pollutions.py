@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ParseError
+
+from main import exports
+
+
+class Command(BaseCommand):
+    help = 'Выгружает сообщения о загрязнениях в CSV, GeoJSON или NDJSON (потоково, без загрузки всей таблицы в память)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=sorted(exports.CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', '-o', help='Файл для записи (по умолчанию stdout)')
+        parser.add_argument('--date-from', help='Начальная дата, ГГГГ-ММ-ДД')
+        parser.add_argument('--date-to', help='Конечная дата включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--type', help='Тип загрязнения: id или название')
+        parser.add_argument('--status', help='Статус: new, in_progress, pending_review, approved')
+        parser.add_argument('--region-type', help='Регион')
+
+    def handle(self, *args, **options):
+        params = {
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'type': options['type'],
+            'status': options['status'],
+            'region_type': options['region_type'],
+        }
+        params = {key: value for key, value in params.items() if value}
+
+        try:
+            queryset = exports.export_queryset(params)
+        except ParseError as e:
+            raise CommandError(e.detail)
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in exports.stream(queryset, options['export_format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+                self.stderr.write(self.style.SUCCESS(f'Выгрузка сохранена в {options["output"]}'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+from main.models import Pollutions, PollutionImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии для уже загруженных фото загрязнений и фото завершения. '
+        'Фото с готовыми копиями пропускаются, поэтому прерванный запуск можно просто повторить '
+        'или продолжить с --after-id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Сколько id читать за один запрос')
+        parser.add_argument('--after-id', type=int, default=0, help='Продолжить с записей, у которых id больше указанного')
+        parser.add_argument('--force', action='store_true', help='Пересоздать копии, даже если они уже есть')
+        parser.add_argument(
+            '--only', choices=['images', 'completion-photos'],
+            help='Обработать только фото загрязнений или только фото завершения',
+        )
+
+    def handle(self, *args, **options):
+        jobs = [
+            ('images', PollutionImage.objects.exclude(image=''), images.process_pollution_image),
+            (
+                'completion-photos',
+                Pollutions.objects.exclude(completion_photo='').exclude(completion_photo__isnull=True),
+                images.process_completion_photo,
+            ),
+        ]
+        for name, queryset, process in jobs:
+            if options['only'] and options['only'] != name:
+                continue
+            self.backfill(name, queryset, process, options)
+
+    def backfill(self, name, queryset, process, options):
+        last_id = options['after_id']
+        built = skipped = failed = 0
+
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            for pk in ids:
+                try:
+                    if process(pk, force=options['force']):
+                        built += 1
+                    else:
+                        skipped += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{name}: id={pk}: {e}')
+                last_id = pk
+            self.stdout.write(f'{name}: обработано до id={last_id} (построено {built}, пропущено {skipped}, ошибок {failed})')
+
+        self.stdout.write(self.style.SUCCESS(f'{name}: готово, построено {built}, пропущено {skipped}, ошибок {failed}'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import dataset
+
+
+class Command(BaseCommand):
+    help = 'Массово создает синтетические сообщения о загрязнениях вдоль побережья Каспия (для нагрузочных тестов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, required=True, help='Сколько сообщений создать')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='Зерно генератора для повторяемых наборов')
+        parser.add_argument('--spread-km', type=float, default=1.5, help='Разброс точек от береговой линии')
+        parser.add_argument('--days', type=int, default=365, help='Даты создания за последние N дней')
+        parser.add_argument('--types', help='Доли типов: "Мусор=5,Нефтяные отходы=1" (по умолчанию поровну)')
+        parser.add_argument('--statuses', help='Доли статусов: "new=50,in_progress=20,pending_review=10,approved=20"')
+        parser.add_argument('--assignees', type=int, default=20, help='Сколько синтетических исполнителей использовать')
+        parser.add_argument('--images', type=int, default=16, help='Размер общего набора фото')
+
+    def handle(self, *args, **options):
+        try:
+            generator = dataset.Generator(
+                seed=options['seed'],
+                spread_km=options['spread_km'],
+                days=options['days'],
+                type_weights=dataset.parse_weights(options['types']) if options['types'] else None,
+                status_weights=dataset.parse_weights(options['statuses']) if options['statuses'] else None,
+                assignees=options['assignees'],
+                images=options['images'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        started = time.monotonic()
+        created = 0
+        while created < options['count']:
+            created += generator.create_batch(min(options['batch_size'], options['count'] - created))
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Создано {created} из {options["count"]} ({created / elapsed:.0f} строк/с)')
+
+        generator.finish()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {created} сообщений за {time.monotonic() - started:.1f} с'))
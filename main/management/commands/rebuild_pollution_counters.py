@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики загрязнений по статусам и типам с нуля'
+
+    def handle(self, *args, **kwargs):
+        counters.rebuild()
+        stats = counters.get_stats()
+        self.stdout.write(self.style.SUCCESS(f'Счетчики пересчитаны, всего загрязнений: {stats["total"]}'))
@@ -0,0 +1,62 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from main import jobs
+
+
+def _work(queues, burst):
+    jobs.Worker(queues).run(burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры фоновых задач (см. main/jobs.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Очередь для обработки, можно указать несколько раз (по умолчанию все из JOB_QUEUES)',
+        )
+        parser.add_argument('--processes', type=int, default=1, help='Сколько процессов-воркеров запустить')
+        parser.add_argument('--burst', action='store_true', help='Выйти, когда готовых задач не останется')
+        parser.add_argument('--purge', action='store_true', help='Удалить старые выполненные задачи и выйти')
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            deleted = jobs.purge()
+            self.stdout.write(self.style.SUCCESS(f'Удалено выполненных задач: {deleted}'))
+            return
+
+        queues = options['queues'] or list(settings.JOB_QUEUES)
+        unknown = set(queues) - set(settings.JOB_QUEUES)
+        if unknown:
+            raise CommandError(f'Неизвестные очереди: {", ".join(sorted(unknown))}')
+
+        self.stdout.write(f'Воркеры: {options["processes"]}, очереди: {", ".join(queues)}')
+        if options['processes'] <= 1:
+            processed = jobs.Worker(queues).run(burst=options['burst'])
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
+            return
+
+        # Дочерние процессы не должны наследовать соединения с базой
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_work, args=(queues, options['burst']), daemon=False)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        def stop(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for worker in workers:
+            worker.join()
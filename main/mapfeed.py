@@ -0,0 +1,48 @@
+"""
+Компактная лента маркеров для карты: id, широта, долгота, тип и статус
+параллельными массивами.
+
+Строки читаются через values_list без создания моделей и сериализаторов.
+В режиме base64 каждый столбец — упакованный little-endian буфер:
+id — uint32, lat / lon — float32, type — uint32, status — uint8 (индекс в
+STATUSES).
+"""
+
+import base64
+import sys
+from array import array
+
+from .models import PollutionStatus
+
+STATUSES = list(PollutionStatus.values)
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+COLUMNS = ('id', 'lat', 'lon', 'type', 'status')
+# Столбец -> код типа array; 'I' и 'f' четырехбайтовые на всех поддерживаемых платформах
+TYPECODES = {'id': 'I', 'lat': 'f', 'lon': 'f', 'type': 'I', 'status': 'B'}
+# Знаков после запятой в JSON: 6 знаков — около 10 см
+COORDINATE_DIGITS = 6
+
+
+def build_columns(queryset):
+    rows = queryset.with_status().order_by('id').values_list('id', 'latitude', 'longitude', 'pollution_type_id', 'status')
+    columns = {name: [] for name in COLUMNS}
+    ids, lats, lons, types, statuses = (columns[name] for name in COLUMNS)
+    for pk, latitude, longitude, type_id, status in rows:
+        ids.append(pk)
+        lats.append(round(latitude, COORDINATE_DIGITS))
+        lons.append(round(longitude, COORDINATE_DIGITS))
+        types.append(type_id)
+        statuses.append(_STATUS_CODES[status])
+    return columns
+
+
+def pack(columns):
+    """Столбцы в base64 от little-endian буферов (см. TYPECODES)."""
+    packed = {}
+    for name, values in columns.items():
+        buffer = array(TYPECODES[name], values)
+        if sys.byteorder == 'big':
+            buffer.byteswap()
+        packed[name] = base64.b64encode(buffer.tobytes()).decode('ascii')
+    return packed
@@ -0,0 +1,263 @@
+"""
+Метрики HTTP-запросов в текстовом формате Prometheus (/metrics).
+
+Для каждого имени URL (resolver_match.view_name) собираются:
+- caspianguard_http_requests_total — запросы по методу и коду ответа;
+- caspianguard_http_request_duration_seconds — гистограмма времени ответа;
+- caspianguard_http_request_sql_queries и ..._sql_duration_seconds —
+  число SQL-запросов и их суммарное время на один запрос;
+- caspianguard_http_response_size_bytes — размер тела ответа.
+
+SQL считается обработчиком execute_wrapper, который ставится на каждое
+соединение при подключении (signals.py), а текущий запрос он находит через
+contextvar, поэтому учитываются и запросы, выполненные через sync_to_async в
+другом потоке. Запросы, которые выполняет StreamingHttpResponse уже после
+возврата из вьюхи (выгрузки), в счетчик не попадают; размер такого ответа
+учитывается, когда тело отдано целиком.
+
+Каждый процесс копит метрики в памяти и раз в METRICS_FLUSH_INTERVAL секунд
+сохраняет снимок в кеш Django. /metrics складывает снимки всех живых
+процессов, так что с Redis видны все воркеры gunicorn / uvicorn, а с
+LocMemCache — только процесс, который ответил.
+"""
+
+import os
+import socket
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIX = 'caspianguard_'
+UNRESOLVED = '<unresolved>'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Имя -> (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP-запросы по имени URL, методу и коду ответа', None),
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса', LATENCY_BUCKETS),
+    'http_request_sql_queries': ('histogram', 'SQL-запросов на один HTTP-запрос', QUERY_BUCKETS),
+    'http_request_sql_duration_seconds': ('histogram', 'Суммарное время SQL на один HTTP-запрос', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Размер тела ответа', SIZE_BUCKETS),
+}
+
+PROCESSES_KEY = 'metrics:processes'
+PROCESS_KEY = f'metrics:process:{socket.gethostname()}:{os.getpid()}'
+
+# Статистика SQL текущего HTTP-запроса: [число запросов, секунды]
+_sql_stats = ContextVar('metrics_sql_stats', default=None)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        # (имя, метки) -> [счетчики корзин..., +Inf, сумма]
+        self._histograms = {}
+        self._flushed_at = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 2)
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {key: list(series) for key, series in self._histograms.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._flushed_at = 0.0
+
+    def flush(self, force=False):
+        """Сохраняет снимок процесса в кеш не чаще раза в METRICS_FLUSH_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+                return
+            self._flushed_at = now
+        timeout = settings.METRICS_FLUSH_INTERVAL * 4
+        cache.set(PROCESS_KEY, self.snapshot(), timeout)
+        processes = cache.get(PROCESSES_KEY) or []
+        if PROCESS_KEY not in processes:
+            cache.set(PROCESSES_KEY, processes + [PROCESS_KEY], None)
+
+
+registry = Registry()
+
+
+def collect():
+    """Сумма снимков всех процессов; свой процесс берется из памяти."""
+    registry.flush()
+    processes = cache.get(PROCESSES_KEY) or []
+    snapshots = cache.get_many([key for key in processes if key != PROCESS_KEY])
+    alive = [key for key in processes if key in snapshots or key == PROCESS_KEY]
+    if len(alive) != len(processes):
+        cache.set(PROCESSES_KEY, alive, None)
+
+    merged = registry.snapshot()
+    for snapshot in snapshots.values():
+        for key, value in snapshot['counters'].items():
+            merged['counters'][key] = merged['counters'].get(key, 0) + value
+        for key, series in snapshot['histograms'].items():
+            current = merged['histograms'].get(key)
+            merged['histograms'][key] = series if current is None else [a + b for a, b in zip(current, series)]
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        full_name = PREFIX + name
+        lines.append(f'# HELP {full_name} {description}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(snapshot['counters'].items()):
+                if metric == name:
+                    lines.append(f'{full_name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), series in sorted(snapshot['histograms'].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{full_name}_sum{_labels(labels)} {_number(series[-1])}')
+            lines.append(f'{full_name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    stats = _sql_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+def install_sql_wrapper(connection):
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else UNRESOLVED
+
+
+def _observe_size(view, size):
+    registry.observe('http_response_size_bytes', (('view', view),), size)
+
+
+def _count_streaming(response, view):
+    def count(chunks):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        _observe_size(view, size)
+
+    async def acount(chunks):
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        _observe_size(view, size)
+
+    if getattr(response, 'is_async', False):
+        response.streaming_content = acount(response.streaming_content)
+    else:
+        response.streaming_content = count(response.streaming_content)
+
+
+def record(request, response, started, sql):
+    view = _view_name(request)
+    labels = (('view', view),)
+    registry.inc('http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+    registry.observe('http_request_duration_seconds', labels + (('method', request.method),), time.perf_counter() - started)
+    registry.observe('http_request_sql_queries', labels, sql[0])
+    registry.observe('http_request_sql_duration_seconds', labels, sql[1])
+    if response.streaming:
+        _count_streaming(response, view)
+    else:
+        _observe_size(view, len(response.content))
+    registry.flush()
+
+
+class MetricsMiddleware:
+    """Первый в MIDDLEWARE, чтобы время включало остальные middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        started, sql = time.perf_counter(), [0, 0.0]
+        token = _sql_stats.set(sql)
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql_stats.reset(token)
+        record(request, response, started, sql)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        started, sql = time.perf_counter(), [0, 0.0]
+        token = _sql_stats.set(sql)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql_stats.reset(token)
+        record(request, response, started, sql)
+        return response
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+# Копия main/geo.grid_cell на момент миграции: последующие правки geo.py
+# не должны менять то, что записывает историческая миграция
+GRID_BITS = 16
+GRID_SIZE = 1 << GRID_BITS
+
+
+def _quantize(value, lower, upper):
+    index = int((value - lower) / (upper - lower) * GRID_SIZE)
+    return min(max(index, 0), GRID_SIZE - 1)
+
+
+def _spread(value):
+    value &= 0xFFFF
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    value = (value | (value << 1)) & 0x55555555
+    return value
+
+
+def grid_cell(latitude, longitude):
+    x = _quantize(float(longitude), -180.0, 180.0)
+    y = _quantize(float(latitude), -90.0, 90.0)
+    return _spread(x) | (_spread(y) << 1)
+
+
+def fill_grid_cell(apps, schema_editor):
+    Pollutions = apps.get_model('main', 'Pollutions')
+    batch = []
+    for pollution in Pollutions.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        pollution.grid_cell = grid_cell(pollution.latitude, pollution.longitude)
+        batch.append(pollution)
+        if len(batch) >= 2000:
+            Pollutions.objects.bulk_update(batch, ['grid_cell'])
+            batch = []
+    if batch:
+        Pollutions.objects.bulk_update(batch, ['grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_adminmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollutions',
+            name='grid_cell',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True, verbose_name='Ячейка сетки'),
+        ),
+        migrations.RunPython(fill_grid_cell, migrations.RunPython.noop),
+    ]
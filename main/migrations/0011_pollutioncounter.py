@@ -0,0 +1,52 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Pollutions = apps.get_model('main', 'Pollutions')
+    PollutionCounter = apps.get_model('main', 'PollutionCounter')
+
+    open_pollutions = Pollutions.objects.filter(is_approved=False, is_completed=False)
+    in_progress = open_pollutions.filter(assigned_to__isnull=False).distinct().count()
+    by_status = {
+        'new': open_pollutions.count() - in_progress,
+        'in_progress': in_progress,
+        'pending_review': Pollutions.objects.filter(is_approved=False, is_completed=True).count(),
+        'approved': Pollutions.objects.filter(is_approved=True).count(),
+    }
+    by_type = Pollutions.objects.values('pollution_type_id').annotate(count=Count('id')).order_by()
+
+    PollutionCounter.objects.bulk_create(
+        [PollutionCounter(kind='status', key=key, value=value) for key, value in by_status.items()]
+        + [PollutionCounter(kind='type', key=str(row['pollution_type_id']), value=row['count']) for row in by_type]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_pollutions_grid_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollutionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', 'Статус'), ('type', 'Тип загрязнения')], max_length=20, verbose_name='Вид счетчика')),
+                ('key', models.CharField(max_length=60, verbose_name='Ключ')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счетчик загрязнений',
+                'verbose_name_plural': 'Счетчики загрязнений',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pollutioncounter',
+            constraint=models.UniqueConstraint(fields=('kind', 'key'), name='unique_pollution_counter'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
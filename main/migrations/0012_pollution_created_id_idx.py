@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_pollutioncounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=models.Index(fields=['created_at', 'id'], name='pollution_created_id_idx'),
+        ),
+    ]
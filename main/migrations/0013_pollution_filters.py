@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_pollution_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollutions',
+            name='region_type',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Регион'),
+        ),
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=models.Index(fields=['pollution_type', 'created_at'], name='pollution_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=models.Index(fields=['is_approved', 'is_completed', 'created_at'], name='pollution_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=models.Index(fields=['pollution_type', 'is_approved', 'is_completed', 'created_at'], name='pollution_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=models.Index(fields=['region_type', 'created_at'], name='pollution_region_created_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_TRIGGER_SQL = '''
+CREATE TRIGGER pollution_search_vector_update
+BEFORE INSERT OR UPDATE OF description ON main_pollutions
+FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.russian', description);
+
+UPDATE main_pollutions SET search_vector = to_tsvector('pg_catalog.russian', description);
+'''
+
+DROP_SEARCH_TRIGGER_SQL = 'DROP TRIGGER IF EXISTS pollution_search_vector_update ON main_pollutions;'
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm есть не во всех сборках PostgreSQL; без него поиск обходится без нечеткого fallback
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS pollution_description_trgm_idx '
+        'ON main_pollutions USING gin (description gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS pollution_description_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_pollution_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollutions',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pollutions',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pollution_search_vector_idx'),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER_SQL, DROP_SEARCH_TRIGGER_SQL),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+def create_pollutions_version(apps, schema_editor):
+    CollectionVersion = apps.get_model('main', 'CollectionVersion')
+    CollectionVersion.objects.get_or_create(name='pollutions', defaults={'version': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_pollutions_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=60, unique=True, verbose_name='Коллекция')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия коллекции',
+                'verbose_name_plural': 'Версии коллекций',
+            },
+        ),
+        migrations.RunPython(create_pollutions_version, migrations.RunPython.noop),
+    ]
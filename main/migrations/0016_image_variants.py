@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_collectionversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollutionimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Копии изображения'),
+        ),
+        migrations.AddField(
+            model_name='pollutions',
+            name='completion_photo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Копии фото завершения'),
+        ),
+    ]
@@ -1,5 +1,12 @@
+import math
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+from . import geo
 
 
 class Position(models.Model):
@@ -25,6 +32,14 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # telegram_id из базы: после его смены кеш авторизации сбрасывается
+        # и по прежнему значению (signals.py)
+        instance._loaded_telegram_id = instance.__dict__.get('telegram_id')
+        return instance
+
 
 class PollutionType(models.Model):
     name = models.CharField(max_length=60, unique=True)
@@ -39,6 +54,8 @@ class PollutionType(models.Model):
 
 class PollutionImage(models.Model):
     image = models.ImageField(upload_to='pollution_images/', verbose_name='Изображение')
+    # Уменьшенные копии, см. images.py
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Копии изображения')
 
     class Meta:
         verbose_name = 'Изображение загрязнения'
@@ -48,6 +65,66 @@ class PollutionImage(models.Model):
         return self.image.name
 
 
+class PollutionStatus(models.TextChoices):
+    NEW = 'new', 'Новая'
+    IN_PROGRESS = 'in_progress', 'В работе'
+    PENDING_REVIEW = 'pending_review', 'На проверке'
+    APPROVED = 'approved', 'Одобрена'
+
+
+class PollutionsQuerySet(models.QuerySet):
+    def _assigned(self):
+        return models.Exists(self.model.assigned_to.through.objects.filter(pollutions_id=models.OuterRef('pk')))
+
+    def with_status(self):
+        return self.annotate(status=models.Case(
+            models.When(is_approved=True, then=models.Value(PollutionStatus.APPROVED)),
+            models.When(is_completed=True, then=models.Value(PollutionStatus.PENDING_REVIEW)),
+            models.When(self._assigned(), then=models.Value(PollutionStatus.IN_PROGRESS)),
+            default=models.Value(PollutionStatus.NEW),
+            output_field=models.CharField(),
+        ))
+
+    def filter_status(self, status):
+        # Условия по флагам, а не по аннотации, чтобы работали индексы
+        if status == PollutionStatus.APPROVED:
+            return self.filter(is_approved=True)
+        if status == PollutionStatus.PENDING_REVIEW:
+            return self.filter(is_approved=False, is_completed=True)
+        if status == PollutionStatus.IN_PROGRESS:
+            return self.filter(self._assigned(), is_approved=False, is_completed=False)
+        return self.filter(~self._assigned(), is_approved=False, is_completed=False)
+
+    def in_bbox(self, bbox, zoom=None):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        cells = models.Q()
+        for start, end in geo.cell_ranges(bbox, geo.cover_level(bbox, zoom)):
+            cells |= models.Q(grid_cell__gte=start, grid_cell__lt=end)
+        return self.filter(
+            cells,
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        )
+
+    def with_distance(self, latitude, longitude):
+        # Формула гаверсинусов, считается базой сразу для всех строк выборки
+        lat1 = math.radians(latitude)
+        lat2 = Radians('latitude')
+        half_dlat = (lat2 - lat1) / 2
+        half_dlon = (Radians('longitude') - math.radians(longitude)) / 2
+        a = Power(Sin(half_dlat), 2) + math.cos(lat1) * Cos(lat2) * Power(Sin(half_dlon), 2)
+        distance = 2 * geo.EARTH_RADIUS_KM * ASin(Sqrt(Least(a, models.Value(1.0))))
+        return self.annotate(distance_km=models.ExpressionWrapper(distance, output_field=models.FloatField()))
+
+    def nearby(self, latitude, longitude, radius_km):
+        return (
+            self.in_bbox(geo.bbox_around(latitude, longitude, radius_km))
+            .with_distance(latitude, longitude)
+            .filter(distance_km__lte=radius_km)
+            .order_by('distance_km', 'id')
+        )
+
+
 class Pollutions(models.Model):
     latitude = models.FloatField(verbose_name='Широта')
     longitude = models.FloatField(verbose_name='Долгота')
@@ -61,15 +138,123 @@ class Pollutions(models.Model):
     assigned_to = models.ManyToManyField(User, related_name='assigned_pollutions', verbose_name='Взято в работу', blank=True)
     is_completed = models.BooleanField(default=False, verbose_name='Завершено')
     completion_photo = models.ImageField(upload_to='completion_photos/', null=True, blank=True, verbose_name='Фото завершения')
+    completion_photo_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Копии фото завершения')
     completed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='completed_pollutions', verbose_name='Завершил')
+    region_type = models.CharField(max_length=100, null=True, blank=True, verbose_name='Регион')
+    grid_cell = models.BigIntegerField(null=True, editable=False, db_index=True, verbose_name='Ячейка сетки')
+    # Заполняется триггером в базе из description (конфигурация russian)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PollutionsQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Сообщение о загрязнении'
         verbose_name_plural = 'Сообщения о загрязнении'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='pollution_created_id_idx'),
+            models.Index(fields=['pollution_type', 'created_at'], name='pollution_type_created_idx'),
+            models.Index(fields=['is_approved', 'is_completed', 'created_at'], name='pollution_status_created_idx'),
+            models.Index(fields=['pollution_type', 'is_approved', 'is_completed', 'created_at'], name='pollution_type_status_idx'),
+            models.Index(fields=['region_type', 'created_at'], name='pollution_region_created_idx'),
+            GinIndex(fields=['search_vector'], name='pollution_search_vector_idx'),
+        ]
 
     def __str__(self):
         return f'Загрязнение {self.pollution_type.name} на ({self.latitude}, {self.longitude})'
 
+    def save(self, *args, **kwargs):
+        # Ячейка сетки всегда пересчитывается из координат; прежняя нужна,
+        # чтобы пометить для пересчета кластеры, откуда ушло загрязнение
+        self._previous_grid_cell = self.grid_cell
+        self.grid_cell = geo.grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'grid_cell'}
+        super().save(*args, **kwargs)
+
+    def get_status(self):
+        if self.is_approved:
+            return PollutionStatus.APPROVED
+        if self.is_completed:
+            return PollutionStatus.PENDING_REVIEW
+        if self.pk and self.assigned_to.exists():
+            return PollutionStatus.IN_PROGRESS
+        return PollutionStatus.NEW
+
+
+class PollutionCounter(models.Model):
+    KIND_STATUS = 'status'
+    KIND_TYPE = 'type'
+    KIND_CHOICES = [
+        (KIND_STATUS, 'Статус'),
+        (KIND_TYPE, 'Тип загрязнения'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Вид счетчика')
+    key = models.CharField(max_length=60, verbose_name='Ключ')
+    value = models.BigIntegerField(default=0, verbose_name='Значение')
+
+    class Meta:
+        verbose_name = 'Счетчик загрязнений'
+        verbose_name_plural = 'Счетчики загрязнений'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='unique_pollution_counter'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.key} = {self.value}'
+
+
+class CollectionVersion(models.Model):
+    name = models.CharField(max_length=60, unique=True, verbose_name='Коллекция')
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Версия коллекции'
+        verbose_name_plural = 'Версии коллекций'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class Job(models.Model):
+    """Фоновая задача очереди jobs.py, выполняется командой run_jobs."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    queue = models.CharField(max_length=60, default='default', verbose_name='Очередь')
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Аргументы')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(verbose_name='Запустить не раньше')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='Воркер')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата завершения')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Выборка следующей задачи и подсчет занятых слотов очереди
+            models.Index(fields=['status', 'queue', 'run_at'], name='job_status_queue_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.queue}:{self.name} #{self.pk} ({self.status})'
+
 
 class AdminMessage(models.Model):
     from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_admin_messages', verbose_name='От пользователя')
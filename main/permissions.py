@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework.permissions import BasePermission
 
 
@@ -32,4 +34,14 @@ class CanAssignPollution(BasePermission):
                 self.message = 'У вас нет прав для взятия проблемы в работу. Требуется роль: Волонтер, Менеджер или Админ.'
             return has_access
         except:
-            return False
\ No newline at end of file
+            return False
+
+
+class IsMetricsScraper(BasePermission):
+    """Prometheus: токен METRICS_TOKEN в заголовке Authorization или адрес из METRICS_ALLOWED_IPS."""
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        if token:
+            return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+        return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
@@ -0,0 +1,85 @@
+"""
+Кеш ответов для часто читаемых GET-вьюх (типы загрязнений, карточка
+загрязнения, первые страницы списка).
+
+Ключ: вьюха, аргументы URL, нормализованные query-параметры, класс
+аутентификации и версии коллекций, от которых зависит ответ (versions.py).
+Запись в Pollutions, PollutionType или PollutionImage меняет версию, поэтому
+устаревший ответ не отдается ни одним процессом; сигналы дополнительно
+выбрасывают такие записи из локального LRU, чтобы они не занимали место.
+Размер и время жизни задаются RESPONSE_CACHE_MAX_ENTRIES и RESPONSE_CACHE_TIMEOUT.
+"""
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from . import versions
+from .lru import LRUCache
+
+
+class ResponseCache(LRUCache):
+    def __init__(self):
+        super().__init__('RESPONSE_CACHE_MAX_ENTRIES', 'RESPONSE_CACHE_TIMEOUT')
+
+    def set(self, key, data, status_code, collections):
+        super().set(key, {'data': data, 'status': status_code, 'collections': frozenset(collections)})
+
+    def invalidate(self, collection):
+        self.delete_where(lambda entry: collection in entry['collections'])
+
+
+response_cache = ResponseCache()
+
+
+def build_key(view_name, request, kwargs, params, authenticator, collection_versions, renderer_format):
+    """
+    Ключ записи. Асинхронные вьюхи (async_views.py) строят его с именем
+    синхронной вьюхи, поэтому оба пути делят одни записи.
+    """
+    return (
+        view_name,
+        # В ответах есть абсолютные ссылки next/previous
+        request.get_host(),
+        tuple(sorted(kwargs.items())),
+        tuple(sorted((name, tuple(sorted(values))) for name, values in params.lists())),
+        authenticator,
+        tuple((name, state[0] if state else None) for name, state in collection_versions),
+        renderer_format,
+    )
+
+
+class CachedResponseMixin:
+    """
+    Отдает ответ get() из response_cache. Коллекции, от которых зависит ответ,
+    перечисляются в response_cache_collections; should_cache_response()
+    позволяет кешировать только часть запросов.
+    """
+    response_cache_collections = (versions.POLLUTIONS,)
+
+    def should_cache_response(self, request):
+        return True
+
+    def get_response_cache_key(self, request):
+        authenticator = request.successful_authenticator
+        collection_versions = [
+            (name, versions.get_state(request, name)) for name in self.response_cache_collections
+        ]
+        return build_key(
+            type(self).__name__, request, self.kwargs, request.query_params,
+            type(authenticator).__name__ if authenticator else None,
+            collection_versions, request.accepted_renderer.format,
+        )
+
+    def get(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED or not self.should_cache_response(request):
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = response_cache.get(key)
+        if entry is not None:
+            return Response(entry['data'], status=entry['status'])
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data, response.status_code, self.response_cache_collections)
+        return response
@@ -0,0 +1,67 @@
+"""
+Получатели служебных уведомлений в Telegram по ролям.
+
+Списки telegram_id всех ролей строятся одним запросом и хранятся в кеше
+Django вместе с поколением (generations.py), при котором построены. Сигналы
+сохранения User и Position после коммита увеличивают поколение, и следующий
+запрос строит списки заново; списки, построенные до изменения и записанные после него,
+тоже перестраиваются. Кроме того, списки живут не дольше
+NOTIFICATION_ROSTER_CACHE_TIMEOUT секунд: с LocMemCache поколение у каждого
+процесса свое.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import generations
+from .models import User
+
+CACHE_KEY = 'notification_roster'
+GENERATION_KEY = f'{CACHE_KEY}:generation'
+
+ROLE_ADMINS = 'admins'
+ROLE_MANAGERS = 'managers'
+
+# Должности ролей; суперпользователи всегда считаются администраторами.
+# position_faking создает «Администратор», в старых данных встречается «Админ»
+ROLE_POSITIONS = {
+    ROLE_ADMINS: ('Админ', 'Администратор'),
+    ROLE_MANAGERS: ('Менеджер',),
+}
+
+
+def _build():
+    positions = [name for names in ROLE_POSITIONS.values() for name in names]
+    rows = (
+        User.objects.filter(Q(is_superuser=True) | Q(position__name__in=positions), telegram_id__isnull=False)
+        .order_by('id')
+        .values_list('telegram_id', 'is_superuser', 'position__name')
+    )
+    roster = {role: [] for role in ROLE_POSITIONS}
+    for telegram_id, is_superuser, position in rows:
+        for role, names in ROLE_POSITIONS.items():
+            if position in names or (is_superuser and role == ROLE_ADMINS):
+                roster[role].append(telegram_id)
+    return roster
+
+
+def get_roster():
+    # Поколение читается до построения, чтобы изменение во время построения
+    # сделало запись устаревшей
+    generation = generations.get(GENERATION_KEY)
+    entry = cache.get(CACHE_KEY)
+    if entry is None or entry['generation'] != generation:
+        entry = {'generation': generation, 'roster': _build()}
+        cache.set(CACHE_KEY, entry, settings.NOTIFICATION_ROSTER_CACHE_TIMEOUT)
+    return entry['roster']
+
+
+def recipients(*roles):
+    """telegram_id получателей указанных ролей без повторов, в стабильном порядке."""
+    roster = get_roster()
+    return list(dict.fromkeys(telegram_id for role in roles for telegram_id in roster[role]))
+
+
+def invalidate():
+    generations.bump(GENERATION_KEY)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import PollutionType, PollutionImage, Pollutions
+from . import images
+from .filters import render_headline
 
 User = get_user_model()
 
@@ -44,11 +46,14 @@ class PollutionSerializer(serializers.ModelSerializer):
     )
     image = serializers.ImageField(write_only=True, required=True)
     image_url = serializers.SerializerMethodField(read_only=True)
+    image_variants = serializers.SerializerMethodField(read_only=True)
+    completion_photo_variants = serializers.SerializerMethodField(read_only=True)
+    search_headline = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Pollutions
-        fields = ['id', 'latitude', 'longitude', 'description', 'pollution_type', 'pollution_type_name', 'created_at', 'reported_by', 'is_approved', 'image', 'image_url', 'phone_number']
-        read_only_fields = ['id', 'created_at', 'reported_by', 'is_approved', 'image_url', 'pollution_type']
+        fields = ['id', 'latitude', 'longitude', 'description', 'pollution_type', 'pollution_type_name', 'created_at', 'reported_by', 'is_approved', 'image', 'image_url', 'image_variants', 'completion_photo_variants', 'phone_number', 'region_type', 'search_headline']
+        read_only_fields = ['id', 'created_at', 'reported_by', 'is_approved', 'image_url', 'image_variants', 'completion_photo_variants', 'pollution_type']
 
     def get_image_url(self, obj):
         if obj.images and obj.images.image:
@@ -58,6 +63,26 @@ class PollutionSerializer(serializers.ModelSerializer):
             return obj.images.image.url
         return None
 
+    def _variant_urls(self, variants, field_file):
+        # Пока копии не построены (см. images.py), клиенты используют оригинал
+        urls = images.variant_urls(variants, field_file)
+        request = self.context.get('request')
+        if urls and request:
+            urls = {name: request.build_absolute_uri(url) for name, url in urls.items()}
+        return urls
+
+    def get_image_variants(self, obj):
+        if obj.images:
+            return self._variant_urls(obj.images.variants, obj.images.image)
+        return None
+
+    def get_completion_photo_variants(self, obj):
+        return self._variant_urls(obj.completion_photo_variants, obj.completion_photo)
+
+    def get_search_headline(self, obj):
+        # Есть только в выдаче ?search=
+        return render_headline(getattr(obj, 'search_headline', None))
+
     def create(self, validated_data):
         image_data = validated_data.pop('image')
         user = self.context['request'].user
@@ -67,4 +92,32 @@ class PollutionSerializer(serializers.ModelSerializer):
         validated_data['images'] = pollution_image
         
         pollution = Pollutions.objects.create(**validated_data)
-        return pollution
\ No newline at end of file
+        return pollution
+
+
+class NearbyPollutionSerializer(PollutionSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(PollutionSerializer.Meta):
+        fields = PollutionSerializer.Meta.fields + ['distance_km']
+
+
+class BulkPollutionItemSerializer(serializers.Serializer):
+    """
+    Одно сообщение пакетной загрузки. Типы загрязнений передаются в контексте
+    (pollution_types: название -> PollutionType), чтобы не искать их для
+    каждого сообщения отдельно.
+    """
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    description = serializers.CharField()
+    pollution_type_name = serializers.CharField(max_length=60)
+    phone_number = serializers.CharField(max_length=20, required=False, allow_null=True, allow_blank=True)
+    region_type = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    image = serializers.ImageField()
+
+    def validate_pollution_type_name(self, value):
+        pollution_type = self.context['pollution_types'].get(value)
+        if pollution_type is None:
+            raise serializers.ValidationError(f'Неизвестный тип загрязнения: {value}')
+        return pollution_type
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import clusters, images, jobs, metrics, roster, tasks, versions
+from .authentication import telegram_user_cache
+from .response_cache import response_cache
+from .models import Pollutions, PollutionImage, PollutionType, Position, User
+
+
+@receiver(connection_created)
+def install_sql_metrics(sender, connection, **kwargs):
+    metrics.install_sql_wrapper(connection)
+
+
+@receiver(post_save, sender=Pollutions)
+def update_clusters_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cells = {instance.grid_cell, getattr(instance, '_previous_grid_cell', None)}
+    transaction.on_commit(lambda: clusters.mark_cells(cells))
+
+
+@receiver(post_delete, sender=Pollutions)
+def update_clusters_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: clusters.mark_cells([instance.grid_cell]))
+
+
+@receiver(m2m_changed, sender=Pollutions.assigned_to.through)
+def update_clusters_on_assign(sender, instance, action, reverse, pk_set, **kwargs):
+    # Назначение исполнителя меняет статус «новая» <-> «в работе»
+    if not reverse:
+        if action.startswith('post_'):
+            transaction.on_commit(lambda: clusters.mark_cells([instance.grid_cell]))
+        return
+    if action == 'pre_clear':
+        instance._cleared_pollution_ids = list(instance.assigned_pollutions.values_list('pk', flat=True))
+    elif action.startswith('post_'):
+        pollution_ids = list(pk_set) if pk_set is not None else getattr(instance, '_cleared_pollution_ids', [])
+        transaction.on_commit(lambda: clusters.mark_pollutions(pollution_ids))
+
+
+@receiver(post_save, sender=PollutionImage)
+def build_pollution_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and not images.variants_are_current(instance.variants, instance.image):
+        jobs.enqueue(tasks.build_pollution_image_variants, pk=instance.pk)
+
+
+@receiver(post_save, sender=Pollutions)
+def build_completion_photo_variants(sender, instance, raw=False, **kwargs):
+    photo = instance.completion_photo
+    if not raw and photo and not images.variants_are_current(instance.completion_photo_variants, photo):
+        jobs.enqueue(tasks.build_completion_photo_variants, pk=instance.pk)
+
+
+@receiver(post_save, sender=Pollutions)
+@receiver(post_save, sender=PollutionType)
+@receiver(post_save, sender=PollutionImage)
+@receiver(post_delete, sender=Pollutions)
+@receiver(post_delete, sender=PollutionType)
+@receiver(post_delete, sender=PollutionImage)
+@receiver(m2m_changed, sender=Pollutions.assigned_to.through)
+def bump_pollutions_version(sender, raw=False, **kwargs):
+    if raw or kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    # Тип загрязнения входит в ответы по загрязнениям, поэтому меняет обе версии
+    names = [versions.POLLUTIONS]
+    if sender is PollutionType:
+        names.append(versions.POLLUTION_TYPES)
+    for name in names:
+        versions.bump(name)
+        response_cache.invalidate(name)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_telegram_user(sender, instance, **kwargs):
+    # После коммита, чтобы параллельный запрос не закешировал старые данные.
+    # Запись по прежнему telegram_id тоже указывает на этого пользователя
+    telegram_ids = [instance.telegram_id, getattr(instance, '_loaded_telegram_id', None)]
+    instance._loaded_telegram_id = instance.telegram_id
+    transaction.on_commit(lambda: telegram_user_cache.invalidate(telegram_ids))
+
+
+@receiver(post_save, sender=Position)
+@receiver(pre_delete, sender=Position)
+def invalidate_position_users(sender, instance, created=False, **kwargs):
+    # Перед удалением: после него должность у пользователей уже сброшена
+    if created:
+        return
+    telegram_ids = list(instance.users.filter(telegram_id__isnull=False).values_list('telegram_id', flat=True))
+    transaction.on_commit(lambda: telegram_user_cache.invalidate(telegram_ids))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Position)
+@receiver(post_delete, sender=Position)
+def invalidate_notification_roster(sender, **kwargs):
+    # После коммита, чтобы параллельный запрос не закешировал старые данные
+    transaction.on_commit(roster.invalidate)
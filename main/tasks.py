@@ -0,0 +1,19 @@
+"""Фоновые задачи очереди jobs.py. Модуль импортируется в MainConfig.ready()."""
+
+from . import counters, images
+from .jobs import task
+
+
+@task(queue='images')
+def build_pollution_image_variants(pk):
+    images.process_pollution_image(pk)
+
+
+@task(queue='images')
+def build_completion_photo_variants(pk):
+    images.process_completion_photo(pk)
+
+
+@task(queue='default', max_attempts=3)
+def rebuild_pollution_counters():
+    counters.rebuild()
@@ -1,3 +1,965 @@
-from django.test import TestCase
+import asyncio
+import base64
+import importlib
+import json
+import random
+import tempfile
+import threading
+import time
+from array import array
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from PIL import Image
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import async_views, authentication, clusters, counters, dataset, generations, geo, idempotency, jobs, metrics, roster
+from .authentication import telegram_user_cache
+from .filters import search_pollutions
+from .management.commands import bench_api
+from .models import AdminMessage, Job, Pollutions, PollutionImage, PollutionStatus, PollutionType, Position, User
+from .response_cache import response_cache
+from .views import PollutionCursorPagination, PollutionDetailView, PollutionListCreateView
+
+
+def create_pollution(pollution_type, **kwargs):
+    image = PollutionImage.objects.create(image='pollution_images/test.jpg')
+    fields = {'latitude': 42.98, 'longitude': 47.5, 'description': 'Мусор на пляже'}
+    fields.update(kwargs)
+    return Pollutions.objects.create(pollution_type=pollution_type, images=image, **fields)
+
+
+class PollutionFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trash = PollutionType.objects.create(name='Мусор')
+        cls.oil = PollutionType.objects.create(name='Нефтяные отходы')
+        cls.volunteer = User.objects.create_user(username='volunteer', password='password')
+
+        cls.new = create_pollution(cls.trash, region_type='Дагестан')
+        cls.in_progress = create_pollution(cls.oil, description='Пятно нефти у берега')
+        cls.in_progress.assigned_to.add(cls.volunteer)
+        cls.pending = create_pollution(cls.trash, is_completed=True)
+        cls.approved = create_pollution(cls.oil, is_completed=True, is_approved=True)
+
+    def setUp(self):
+        response_cache.clear()
+
+    def get_ids(self, **params):
+        response = APIClient().get('/api/pollutions/', params)
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.json()['results']}
+
+    def test_filter_by_type_id_and_name(self):
+        expected = {self.new.id, self.pending.id}
+        self.assertEqual(self.get_ids(pollution_type=self.trash.id), expected)
+        self.assertEqual(self.get_ids(type='Мусор'), expected)
+        # Не-ASCII цифры ищутся как название, а не падают в int()
+        self.assertEqual(self.get_ids(pollution_type='²'), set())
+
+    def test_filter_by_status(self):
+        self.assertEqual(self.get_ids(status=PollutionStatus.NEW), {self.new.id})
+        self.assertEqual(self.get_ids(status=PollutionStatus.IN_PROGRESS), {self.in_progress.id})
+        self.assertEqual(self.get_ids(status='CLEANED'), {self.pending.id})
+        self.assertEqual(self.get_ids(status='VERIFIED'), {self.approved.id})
+
+    def test_unknown_status(self):
+        response = APIClient().get('/api/pollutions/', {'status': 'lost'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filter_by_region_and_search(self):
+        self.assertEqual(self.get_ids(region_type='Дагестан'), {self.new.id})
+        self.assertEqual(self.get_ids(search='нефти'), {self.in_progress.id})
+
+    def test_combined_filters(self):
+        self.assertEqual(self.get_ids(pollution_type=self.oil.id, status='approved'), {self.approved.id})
+
+    def test_search_headline_escapes_description(self):
+        create_pollution(self.oil, description='<img src=x onerror=alert(1)> Пятно мазута')
+        results = APIClient().get('/api/pollutions/', {'search': 'мазута'}).json()['results']
+        self.assertEqual(results[0]['search_headline'], '&lt;img src=x onerror=alert(1)&gt; Пятно <b>мазута</b>')
+
+    def test_map_feed_columns(self):
+        columns = APIClient().get('/api/pollutions/map-feed/', {'type': 'Мусор'}).json()['columns']
+        self.assertEqual(columns['id'], sorted([self.new.id, self.pending.id]))
+        self.assertEqual(columns['type'], [self.trash.id, self.trash.id])
+
+        body = APIClient().get('/api/pollutions/map-feed/', {'encoding': 'base64', 'status': 'approved'}).json()
+        ids = array('I', base64.b64decode(body['columns']['id']))
+        statuses = array('B', base64.b64decode(body['columns']['status']))
+        self.assertEqual((list(ids), body['statuses'][statuses[0]]), ([self.approved.id], 'approved'))
+
+    def test_streaming_export(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='analyst', password='password'))
+
+        response = client.get('/api/pollutions/export/csv/', {'type': 'Мусор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'created_at'])
+        self.assertEqual(len(lines), 3)
+
+        response = client.get('/api/pollutions/export/geojson/', {'status': 'VERIFIED', 'date_from': '2000-01-01'})
+        features = json.loads(b''.join(response.streaming_content))['features']
+        self.assertEqual([feature['properties']['id'] for feature in features], [self.approved.id])
+        self.assertEqual(features[0]['geometry']['coordinates'], [47.5, 42.98])
+
+        self.assertEqual(APIClient().get('/api/pollutions/export/ndjson/').status_code, 401)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trash = PollutionType.objects.create(name='Мусор')
+        cls.pollution = create_pollution(cls.trash)
+
+    def setUp(self):
+        response_cache.clear()
+
+    def test_repeated_requests_hit_cache(self):
+        client = APIClient()
+        first = client.get('/api/pollutions/', {'page_size': 5, 'status': 'new'})
+        with self.assertNumQueries(1):
+            # Остается только чтение версии коллекции
+            second = client.get('/api/pollutions/', {'status': 'new', 'page_size': 5})
+        self.assertEqual(first.json(), second.json())
+        stats = response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_writes_invalidate_cache(self):
+        client = APIClient()
+        url = f'/api/pollutions/{self.pollution.id}/'
+        self.assertEqual(client.get(url).json()['description'], 'Мусор на пляже')
+        self.assertEqual(len(client.get('/api/pollution-types/').json()), 1)
+
+        self.pollution.description = 'Разлив нефти'
+        self.pollution.save()
+        PollutionType.objects.create(name='Нефть')
+
+        self.assertEqual(client.get(url).json()['description'], 'Разлив нефти')
+        self.assertEqual(len(client.get('/api/pollution-types/').json()), 2)
+        self.assertEqual(response_cache.stats()['hits'], 0)
+
+
+class PollutionCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pollution_type = PollutionType.objects.create(name='Мусор')
+        pollutions = [create_pollution(pollution_type) for _ in range(5)]
+        # Три записи с одинаковой датой: порядок между ними задает id
+        moment = timezone.now()
+        Pollutions.objects.filter(pk__in=[p.pk for p in pollutions[1:4]]).update(created_at=moment)
+        Pollutions.objects.filter(pk=pollutions[0].pk).update(created_at=moment - timedelta(days=1))
+        Pollutions.objects.filter(pk=pollutions[4].pk).update(created_at=moment + timedelta(days=1))
+        cls.expected = list(Pollutions.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        response_cache.clear()
+
+    def get(self, **params):
+        response = self.client.get('/api/pollutions/', {'pagination': 'cursor', 'page_size': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_walk_forward_and_back(self):
+        pages, data = [], self.get()
+        self.assertIsNone(data['previous'])
+        while True:
+            pages.append([item['id'] for item in data['results']])
+            if not data['next_cursor']:
+                break
+            self.assertEqual(parse_qs(urlsplit(data['next']).query)['cursor'], [data['next_cursor']])
+            data = self.get(cursor=data['next_cursor'])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # С последней страницы назад до первой
+        while data['previous_cursor']:
+            data = self.get(cursor=data['previous_cursor'])
+            pages.pop()
+            self.assertEqual([item['id'] for item in data['results']], pages[-1])
+        self.assertEqual(len(pages), 1)
+
+    def test_cursor_round_trip(self):
+        paginator = PollutionCursorPagination()
+        row = Pollutions.objects.get(pk=self.expected[2])
+        created_at, pk, reverse = paginator.decode_cursor(paginator.encode_cursor(row, True))
+        self.assertEqual((created_at, pk, reverse), (row.created_at, row.pk, True))
+
+    def test_tampered_cursor_is_404(self):
+        for cursor in ('garbage', base64.urlsafe_b64encode(b'[1]').decode(), base64.urlsafe_b64encode(b'5').decode()):
+            response = self.client.get('/api/pollutions/', {'pagination': 'cursor', 'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class PollutionBboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pollution_type = PollutionType.objects.create(name='Мусор')
+        cls.inside = [create_pollution(pollution_type, latitude=42.9 + i * 0.01, longitude=47.4 + i * 0.01) for i in range(5)]
+        create_pollution(pollution_type, latitude=41.0, longitude=47.45)
+        create_pollution(pollution_type, latitude=42.95, longitude=49.0)
+
+    def get(self, bbox='47.3,42.8,47.6,43.0', **params):
+        return self.client.get('/api/pollutions/', {'bbox': bbox, **params})
+
+    def test_cover_covers_every_point_of_bbox(self):
+        bbox = (47.3, 42.8, 47.6, 43.0)
+        level = geo.cover_level(bbox)
+        ranges = geo.cell_ranges(bbox, level)
+        self.assertLessEqual(len(ranges), geo.MAX_COVER_CELLS)
+        self.assertTrue(all(start < end for start, end in ranges))
+        self.assertTrue(all(a[1] < b[0] for a, b in zip(ranges, ranges[1:])))
+        for lat, lon in ((42.8, 47.3), (43.0, 47.6), (42.9, 47.45)):
+            cell = geo.grid_cell(lat, lon)
+            self.assertTrue(any(start <= cell < end for start, end in ranges))
+        # zoom ограничивает уровень сверху
+        self.assertLessEqual(geo.cover_level(bbox, zoom=5), 5)
+
+    def test_migration_keeps_its_own_copy_of_grid_cell(self):
+        migration = importlib.import_module('main.migrations.0010_pollutions_grid_cell')
+        for lat, lon in ((42.98, 47.5), (-90, -180), (90, 180), (0, 0)):
+            self.assertEqual(migration.grid_cell(lat, lon), geo.grid_cell(lat, lon))
+
+    def test_returns_only_points_inside(self):
+        data = self.get().json()
+        self.assertEqual(data['count'], 5)
+        self.assertFalse(data['truncated'])
+        self.assertEqual({item['id'] for item in data['results']}, {p.id for p in self.inside})
+        self.assertEqual(self.get(zoom=3).json()['count'], 5)
+
+    def test_truncated_at_limit(self):
+        with self.settings(POLLUTION_BBOX_LIMIT=3):
+            data = self.get().json()
+        self.assertEqual((data['count'], data['truncated']), (3, True))
+
+    def test_malformed_or_inverted_bbox(self):
+        for bbox in ('47.3,42.8,47.6', 'a,b,c,d', '47.6,42.8,47.3,43.0', '47.3,43.0,47.6,42.8', '47.3,42.8,47.6,95'):
+            self.assertEqual(self.get(bbox).status_code, 400, bbox)
+        self.assertEqual(self.get(zoom='x').status_code, 400)
+
+
+class PollutionNearbyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pollution_type = PollutionType.objects.create(name='Мусор')
+        for i in range(15):
+            create_pollution(pollution_type, latitude=42.98 + i * 0.001, longitude=47.5)
+        create_pollution(pollution_type, latitude=43.5, longitude=47.5)
+
+    def get(self, **params):
+        return self.client.get('/api/pollutions/nearby/', {'lat': 42.98, 'lon': 47.5, **params}).json()
+
+    def test_radius_without_k_returns_everything_inside(self):
+        data = self.get(radius=5)
+        self.assertEqual(data['count'], 15)
+        self.assertFalse(data['truncated'])
+        distances = [item['distance_km'] for item in data['results']]
+        self.assertEqual(distances, sorted(distances))
+
+        self.assertEqual(self.get(radius=5, k=3)['count'], 3)
+        self.assertEqual(self.get()['count'], 10)
+        with self.settings(POLLUTION_NEARBY_RADIUS_MAX_RESULTS=12):
+            data = self.get(radius=5)
+        self.assertEqual((data['count'], data['truncated']), (12, True))
+
+    def test_non_finite_parameters_rejected(self):
+        for params in ({'radius': 'nan'}, {'radius': 'inf'}, {'lat': 'nan'}, {'lon': '-inf'}):
+            response = self.client.get('/api/pollutions/nearby/', {'lat': 42.98, 'lon': 47.5, **params})
+            self.assertEqual(response.status_code, 400, params)
+
+
+class PollutionClusterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pollution_type = PollutionType.objects.create(name='Мусор')
+        self.pollution = create_pollution(self.pollution_type)
+
+    def counts(self):
+        return [cell['count'] for cell in clusters.get_clusters(5).values()]
+
+    def test_changes_invalidate_cached_levels(self):
+        self.assertEqual(self.counts(), [1])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_pollution(self.pollution_type)
+        self.assertEqual(self.counts(), [2])
+
+    def test_change_rebuilds_only_marked_cells(self):
+        far = create_pollution(self.pollution_type, latitude=-30.0, longitude=-60.0)
+        self.assertEqual(sorted(self.counts()), [1, 1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pollution.is_completed = True
+            self.pollution.save()
+        level = clusters.level_for_zoom(5)
+        self.assertEqual(set(cache.get(clusters._dirty_key(level))), {self.pollution.grid_cell >> geo.level_shift(level)})
+
+        cells = clusters.get_clusters(5)
+        self.assertEqual(cache.get(clusters._dirty_key(level)), {})
+        cell = cells[self.pollution.grid_cell >> geo.level_shift(level)]
+        self.assertEqual(cell['by_status'], {PollutionStatus.PENDING_REVIEW: 1})
+        self.assertEqual(cells[far.grid_cell >> geo.level_shift(level)]['by_status'], {PollutionStatus.NEW: 1})
+
+        # Перенос в другую ячейку помечает и старую, и новую
+        with self.captureOnCommitCallbacks(execute=True):
+            far.latitude, far.longitude = self.pollution.latitude, self.pollution.longitude
+            far.save()
+        self.assertEqual(self.counts(), [2])
+
+    def test_cell_marked_during_rebuild_stays_marked(self):
+        self.counts()
+        level = clusters.level_for_zoom(5)
+        build = clusters._build
+
+        def build_and_mark(*args):
+            cells = build(*args)
+            # Параллельное изменение закоммичено, пока ячейка пересчитывалась
+            clusters.mark_cells([self.pollution.grid_cell])
+            return cells
+
+        clusters.mark_cells([self.pollution.grid_cell])
+        with mock.patch.object(clusters, '_build', build_and_mark):
+            clusters.get_clusters(5)
+        self.assertEqual(len(cache.get(clusters._dirty_key(level))), 1)
+        clusters.get_clusters(5)
+        self.assertEqual(cache.get(clusters._dirty_key(level)), {})
+
+
+class AsyncReadViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trash = PollutionType.objects.create(name='Мусор')
+        cls.pollutions = [create_pollution(cls.trash) for _ in range(3)]
+        cls.pollutions[0].assigned_to.add(User.objects.create_user(username='volunteer', password='password'))
+
+    def setUp(self):
+        response_cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    async def get(self, view, path, params=None, **kwargs):
+        response = await view(self.factory.get(path, params or {}), **kwargs)
+        if hasattr(response, 'render'):
+            # Ответ синхронной вьюхи рендерит обработчик Django
+            response.render()
+        return response.status_code, json.loads(response.content)
+
+    async def test_matches_sync_views(self):
+        self.assertTrue(asyncio.iscoroutinefunction(async_views.pollution_list))
+        cases = [
+            (async_views.pollution_list, '/api/pollutions/', {'page_size': 2, 'page': 2}, {}),
+            (async_views.pollution_list, '/api/pollutions/', {'status': 'IN_PROGRESS'}, {}),
+            (async_views.pollution_list, '/api/pollutions/', {'page': 5}, {}),
+            (async_views.pollution_detail, f'/api/pollutions/{self.pollutions[1].id}/', {}, {'pk': self.pollutions[1].id}),
+            (async_views.pollution_detail, '/api/pollutions/0/', {}, {'pk': 0}),
+            (async_views.pollution_type_list, '/api/pollution-types/', {}, {}),
+            (async_views.status_stats, '/api/markers/status-stats/', {}, {}),
+        ]
+        for view, path, params, kwargs in cases:
+            with self.subTest(path=path, params=params):
+                response_cache.clear()
+                expected = await sync_to_async(APIClient().get)(path, params)
+                self.assertEqual(await self.get(view, path, params, **kwargs), (expected.status_code, expected.json()))
+
+    async def test_not_modified(self):
+        response = await async_views.pollution_list(self.factory.get('/api/pollutions/'))
+        request = self.factory.get('/api/pollutions/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual((await async_views.pollution_list(request)).status_code, 304)
+
+    async def test_search_falls_back_to_sync_view(self):
+        status, data = await self.get(async_views.pollution_list, '/api/pollutions/', {'search': 'мусор'})
+        self.assertEqual(status, 200)
+        self.assertEqual(data['count'], 3)
+        self.assertIn('search_headline', data['results'][0])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trash = PollutionType.objects.create(name='Мусор')
+        cls.pollutions = [create_pollution(cls.trash) for _ in range(2)]
+
+    def setUp(self):
+        response_cache.clear()
+        self.factory = RequestFactory()
+
+    def list(self, **headers):
+        return PollutionListCreateView.as_view()(self.factory.get('/api/pollutions/', headers=headers))
+
+    def detail(self, pk, **headers):
+        return PollutionDetailView.as_view()(self.factory.get(f'/api/pollutions/{pk}/', headers=headers), pk=pk)
+
+    def test_list_not_modified_until_write(self):
+        response = self.list()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.list(**{'If-None-Match': response['ETag']}).status_code, 304)
+        self.assertEqual(self.list(**{'If-Modified-Since': response['Last-Modified']}).status_code, 304)
+
+        create_pollution(self.trash)
+        changed = self.list(**{'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_detail_etag_is_per_object(self):
+        first, second = (self.detail(pollution.pk) for pollution in self.pollutions)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(self.detail(self.pollutions[0].pk, **{'If-None-Match': first['ETag']}).status_code, 304)
+        self.assertEqual(self.detail(self.pollutions[1].pk, **{'If-None-Match': first['ETag']}).status_code, 200)
+
+    def test_missing_object_is_never_not_modified(self):
+        response = self.detail(0)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+        pollution = self.pollutions[0]
+        etag = self.detail(pollution.pk)['ETag']
+        # В обход сигналов: версия коллекции остается прежней
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM main_pollutions WHERE id = %s', [pollution.pk])
+        response_cache.clear()
+        self.assertEqual(self.detail(pollution.pk, **{'If-None-Match': etag}).status_code, 404)
+
+        request = AsyncRequestFactory().get(f'/api/pollutions/{pollution.pk}/', headers={'If-None-Match': etag})
+        self.assertEqual(async_to_sync(async_views.pollution_detail)(request, pk=pollution.pk).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), JOBS_EAGER=True)
+class ImageVariantsTests(TestCase):
+    def test_variants_built_after_commit(self):
+        buffer = BytesIO()
+        Image.new('RGB', (2000, 1500), 'blue').save(buffer, 'JPEG')
+        upload = SimpleUploadedFile('beach.jpg', buffer.getvalue(), content_type='image/jpeg')
+        pollution_type = PollutionType.objects.create(name='Мусор')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pollution_image = PollutionImage.objects.create(image=upload)
+            pollution = Pollutions.objects.create(pollution_type=pollution_type, images=pollution_image, latitude=42.98, longitude=47.5, description='Мусор')
+
+        pollution_image.refresh_from_db()
+        with Image.open(pollution_image.image.storage.path(pollution_image.variants['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 240))
+        with Image.open(pollution_image.image.storage.path(pollution_image.variants['webp'])) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+
+        variants = APIClient().get(f'/api/pollutions/{pollution.id}/').json()['image_variants']
+        self.assertEqual(set(variants), {'thumbnail', 'medium', 'webp'})
+        self.assertTrue(variants['medium'].endswith('_medium.jpg'))
+
+
+class TelegramAuthenticationCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.volunteer = Position.objects.create(name='Волонтер')
+        cls.user = User.objects.create_user(username='sailor', password='password', telegram_id=1001, position=cls.volunteer)
+
+    def setUp(self):
+        telegram_user_cache.clear()
+
+    def get_profile(self, telegram_id=1001):
+        return APIClient().get('/api/user/profile/', {'telegram_id': telegram_id})
+
+    def test_user_and_position_resolved_once(self):
+        self.get_profile()
+        with self.assertNumQueries(0):
+            response = self.get_profile()
+        self.assertEqual(response.json()['position'], 'Волонтер')
+        stats = telegram_user_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_position_change_and_relink_invalidate(self):
+        self.get_profile()
+        self.volunteer.name = 'Менеджер'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.volunteer.save()
+        self.assertEqual(self.get_profile().json()['position'], 'Менеджер')
+
+        other = User.objects.create_user(username='captain', password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/auth/link-telegram/', {'username': 'captain', 'password': 'password', 'telegram_id': 1001})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_profile().json()['username'], other.username)
+
+    def test_invalidation_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Иван'
+            self.user.save()
+            # До коммита запись может закешироваться, но после коммита перечитывается
+            self.get_profile()
+        with self.assertNumQueries(1):
+            self.get_profile()
+
+    def test_change_invalidates_only_that_user(self):
+        User.objects.create_user(username='captain', password='password', telegram_id=1002)
+        self.get_profile()
+        self.get_profile(1002)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Иван'
+            self.user.save()
+        with self.assertNumQueries(0):
+            self.get_profile(1002)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_profile().json()['first_name'], 'Иван')
+
+    def test_other_process_change_seen_after_check_interval(self):
+        now = time.monotonic()
+        with mock.patch.object(authentication.time, 'monotonic', lambda: now):
+            self.get_profile()
+            # Изменение в другом процессе: поколение в общем кеше, локальная запись на месте
+            generations.bump(authentication._generation_key(1001))
+            with self.assertNumQueries(0), mock.patch.object(generations.cache, 'get') as shared_get:
+                self.get_profile()
+            shared_get.assert_not_called()
+
+            now += settings.TELEGRAM_AUTH_CACHE_CHECK_INTERVAL
+            with self.assertNumQueries(1):
+                self.get_profile()
+            with self.assertNumQueries(0):
+                self.get_profile()
+
+
+class NotificationRosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = Position.objects.create(name='Менеджер')
+        cls.admin = Position.objects.create(name='Администратор')
+        User.objects.create_superuser(username='root', password='password', telegram_id=1)
+        User.objects.create_user(username='manager', password='password', telegram_id=2, position=cls.manager)
+        cls.clerk = User.objects.create_user(username='clerk', password='password', telegram_id=3)
+
+    def setUp(self):
+        roster.invalidate()
+
+    def test_roles_are_cached_and_refreshed(self):
+        self.assertEqual(roster.recipients(roster.ROLE_MANAGERS, roster.ROLE_ADMINS), [2, 1])
+        with self.assertNumQueries(0):
+            response = APIClient().post('/api/notify-admins/', {'username': 'clerk'})
+        self.assertEqual(response.json()['admin_telegram_ids'], [2, 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clerk.position = self.admin
+            self.clerk.save()
+        self.assertEqual(roster.recipients(roster.ROLE_ADMINS), [1, 3])
+
+    def test_roster_built_before_change_is_rebuilt(self):
+        generation = generations.get(roster.GENERATION_KEY)
+        stale = roster._build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clerk.position = self.admin
+            self.clerk.save()
+        # Запрос, начавший построение до изменения, записывает старые списки
+        cache.set(roster.CACHE_KEY, {'generation': generation, 'roster': stale}, None)
+        self.assertEqual(roster.recipients(roster.ROLE_ADMINS), [1, 3])
+
+
+def jpeg_upload(name, size=(64, 48)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PollutionBulkCreateTests(TestCase):
+    def test_bulk_create_reports_per_item_results(self):
+        PollutionType.objects.create(name='Мусор')
+        user = User.objects.create_user(username='field', password='password')
+        client = APIClient()
+        client.force_authenticate(user)
+        reports = [
+            {'latitude': 42.98, 'longitude': 47.5, 'description': 'Пакеты', 'pollution_type_name': 'Мусор'},
+            {'latitude': 43.01, 'longitude': 47.45, 'description': 'Бутылки', 'pollution_type_name': 'Мусор', 'image': 'photo'},
+            {'latitude': 43.1, 'longitude': 47.4, 'description': 'Пятно', 'pollution_type_name': 'Нефть'},
+        ]
+
+        response = client.post('/api/pollutions/bulk/', {
+            'reports': json.dumps(reports),
+            'image_0': jpeg_upload('a.jpg'),
+            'photo': jpeg_upload('b.jpg'),
+            'image_2': jpeg_upload('c.jpg'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (2, 1))
+        self.assertEqual([item['status'] for item in body['results']], ['created', 'created', 'invalid'])
+        self.assertIn('pollution_type_name', body['results'][2]['errors'])
+
+        created = Pollutions.objects.get(pk=body['results'][1]['id'])
+        self.assertEqual(created.grid_cell, geo.grid_cell(43.01, 47.45))
+        self.assertEqual(created.reported_by, user)
+        self.assertEqual(counters.get_stats()['by_status'][PollutionStatus.NEW], 2)
+        self.assertEqual(Job.objects.filter(name='main.tasks.build_pollution_image_variants').count(), 2)
+
+
+flaky_calls = []
+
+
+@jobs.task()
+def flaky(value):
+    flaky_calls.append(value)
+    if len(flaky_calls) == 1:
+        raise RuntimeError('временная ошибка')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SyntheticDatasetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trash = PollutionType.objects.create(name='Мусор')
+        cls.oil = PollutionType.objects.create(name='Нефтяные отходы')
+
+    def test_generates_consistent_rows(self):
+        generator = dataset.Generator(seed=7, type_weights={'Мусор': 3, 'Нефтяные отходы': 1}, assignees=3, images=2)
+        self.assertEqual(generator.create_batch(150) + generator.create_batch(50), 200)
+        generator.finish()
+
+        pollutions = Pollutions.objects.all()
+        self.assertEqual(pollutions.values('images').distinct().count(), 2)
+        self.assertFalse(pollutions.filter(grid_cell__isnull=True).exists())
+        self.assertGreater(pollutions.filter(pollution_type=self.trash).count(), pollutions.filter(pollution_type=self.oil).count())
+        # Даты из генератора, а не auto_now_add
+        self.assertGreater(len(set(pollutions.values_list('created_at__date', flat=True))), 30)
+        for pollution in pollutions.filter(is_completed=True)[:10]:
+            self.assertEqual(pollution.assigned_to.get(), pollution.completed_by)
+
+        stats = counters.get_stats()
+        self.assertEqual(stats['total'], 200)
+        self.assertTrue(all(stats['by_status'].values()))
+        counters.rebuild()
+        self.assertEqual(stats, counters.get_stats())
+
+    def test_rejects_unknown_weights(self):
+        with self.assertRaises(ValueError):
+            dataset.parse_weights('Мусор')
+        with self.assertRaises(ValueError):
+            dataset.Generator(status_weights={'lost': 1})
+
+    def test_bench_requires_rows(self):
+        with self.assertRaises(CommandError):
+            bench_api._path_params()
+
+
+@override_settings(JOB_QUEUES={'default': 1})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        flaky_calls.clear()
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue(flaky, value=7)
+
+        with self.assertLogs('main.jobs', 'ERROR'):
+            self.assertFalse(jobs.execute(jobs.claim(['default'], 'test')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(jobs.claim(['default'], 'test'))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertTrue(jobs.execute(jobs.claim(['default'], 'test')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_DONE, 2))
+        self.assertEqual(flaky_calls, [7, 7])
+
+    def test_queue_concurrency_limit(self):
+        jobs.enqueue(flaky, value=1)
+        jobs.enqueue(flaky, value=2)
+
+        running = jobs.claim(['default'], 'test')
+        self.assertIsNotNone(running)
+        self.assertIsNone(jobs.claim(['default'], 'test'))
+
+        with self.assertLogs('main.jobs', 'ERROR'):
+            jobs.execute(running)
+        self.assertIsNotNone(jobs.claim(['default'], 'test'))
+
+    def test_stale_job_is_requeued_until_attempts_run_out(self):
+        job = jobs.enqueue(flaky, value=1)
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1)
+
+        jobs.claim(['default'], 'test')
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.STATUS_QUEUED, ''))
+
+        jobs.claim(['default'], 'test')
+        Job.objects.filter(pk=job.pk).update(locked_at=stale, max_attempts=2)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_heartbeat_keeps_running_job(self):
+        job = jobs.enqueue(flaky, value=1)
+        running = jobs.claim(['default'], 'test')
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1)
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+
+        self.assertEqual(jobs.heartbeat(running), 1)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+
+
+    def test_lost_lease_result_is_discarded(self):
+        job = jobs.enqueue(flaky, value=1)
+        first = jobs.claim(['default'], 'first')
+        stale = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1)
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        jobs.requeue_stale()
+        second = jobs.claim(['default'], 'second')
+
+        with self.assertLogs('main.jobs', 'WARNING'):
+            self.assertFalse(jobs.execute(first))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.STATUS_RUNNING, 'second'))
+
+        self.assertTrue(jobs.execute(second))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+
+    def test_worker_requeues_stale_once_per_interval(self):
+        worker = jobs.Worker(['default'], poll_interval=0)
+        # run() закрывает соединения и ставит обработчики сигналов, в тесте это лишнее
+        with mock.patch.object(jobs, 'requeue_stale') as requeue, \
+                mock.patch.object(jobs, 'close_old_connections'), mock.patch.object(jobs.signal, 'signal'):
+            worker.run(burst=True)
+            worker.run(burst=True)
+        self.assertEqual(requeue.call_count, 1)
+
+@skipUnless(connection.vendor == 'postgresql', 'Параллельные транзакции проверяются только на PostgreSQL')
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ConcurrentTransitionTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.type = PollutionType.objects.create(name='Мусор')
+        position = Position.objects.create(name='Волонтер')
+        self.volunteer = User.objects.create_user(username='volunteer', password='password', telegram_id=1001, position=position)
+        self.pollutions = []
+        for _ in range(10):
+            pollution = create_pollution(self.type, is_completed=True, completed_by=self.volunteer)
+            pollution.assigned_to.add(self.volunteer)
+            self.pollutions.append(pollution)
+        counters.rebuild()
+
+    def hammer(self, requests):
+        results = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(batch):
+            client = APIClient()
+            barrier.wait()
+            try:
+                for url, pollution_id in batch:
+                    response = self.send(client, url, pollution_id)
+                    with lock:
+                        results.append((url, response.status_code, response.json().get('changed')))
+            finally:
+                connections.close_all()
+
+        threads = []
+        for _ in range(self.THREADS):
+            batch = list(requests)
+            random.shuffle(batch)
+            threads.append(threading.Thread(target=worker, args=(batch,)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def send(self, client, url, pollution_id):
+        if url.startswith('/api/pollutions/'):
+            data = {'telegram_id': self.volunteer.telegram_id}
+            if url.endswith('/complete/'):
+                data['completion_photo'] = jpeg_upload('done.jpg')
+            return client.post(url, data)
+        return client.post(url, {'pollution_id': pollution_id, 'user_id': self.volunteer.id}, format='json')
+
+    def assertCountersConsistent(self):
+        stats = counters.get_stats()
+        counters.rebuild()
+        self.assertEqual(stats, counters.get_stats())
+
+    def test_concurrent_approvals_count_once(self):
+        results = self.hammer([('/api/approve-completion/', p.id) for p in self.pollutions])
+
+        self.assertTrue(all(code == 200 for _, code, _ in results))
+        self.assertEqual(sum(1 for *_, changed in results if changed), len(self.pollutions))
+        self.volunteer.refresh_from_db()
+        self.assertEqual(self.volunteer.completed_count, len(self.pollutions))
+        self.assertEqual(counters.get_stats()['by_status'][PollutionStatus.APPROVED], len(self.pollutions))
+        self.assertCountersConsistent()
+
+    def test_concurrent_approve_and_reject(self):
+        requests = [(url, p.id) for p in self.pollutions for url in ('/api/approve-completion/', '/api/reject-completion/')]
+        results = self.hammer(requests)
+
+        # Для каждой заявки срабатывает ровно одно решение
+        applied = [url for url, _, changed in results if changed]
+        self.assertEqual(len(applied), len(self.pollutions))
+        self.volunteer.refresh_from_db()
+        self.assertEqual(self.volunteer.completed_count, applied.count('/api/approve-completion/'))
+        self.assertFalse(Pollutions.objects.filter_status(PollutionStatus.PENDING_REVIEW).exists())
+        self.assertCountersConsistent()
+
+    def test_concurrent_assignments_and_transitions(self):
+        # Назначение и переходы берут блокировки в одном порядке и не
+        # блокируют друг друга взаимно
+        urls = (
+            '/api/pollutions/{}/assign/', '/api/pollutions/{}/unassign/', '/api/pollutions/{}/complete/',
+            '/api/approve-completion/', '/api/reject-completion/',
+        )
+        requests = [(url.format(p.id), p.id) for p in self.pollutions for url in urls]
+        results = self.hammer(requests)
+
+        self.assertEqual(len(results), len(requests) * self.THREADS)
+        self.assertTrue(all(code < 500 for _, code, _ in results))
+        self.volunteer.refresh_from_db()
+        approved = sum(1 for url, _, changed in results if changed and url == '/api/approve-completion/')
+        self.assertEqual(self.volunteer.completed_count, approved)
+        self.assertCountersConsistent()
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PollutionType.objects.create(name='Мусор')
+
+    def setUp(self):
+        response_cache.clear()
+        metrics.registry.clear()
+        cache.delete_many([metrics.PROCESSES_KEY, metrics.PROCESS_KEY])
+
+    def get_metrics(self, **headers):
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_latency_and_sql_per_url_name(self):
+        for _ in range(2):
+            self.client.get('/api/pollution-types/')
+        self.client.get('/api/pollutions/0/')
+        lines = self.get_metrics()
+
+        self.assertIn('caspianguard_http_requests_total{view="pollution_type_list",method="GET",status="200"} 2', lines)
+        self.assertIn('caspianguard_http_requests_total{view="pollution_detail",method="GET",status="404"} 1', lines)
+        self.assertIn('caspianguard_http_request_duration_seconds_count{view="pollution_type_list",method="GET"} 2', lines)
+        # Версия коллекции и список типов, затем только версия (ответ из кеша)
+        self.assertIn('caspianguard_http_request_sql_queries_sum{view="pollution_type_list"} 3', lines)
+        self.assertIn('caspianguard_http_request_sql_queries_bucket{view="pollution_type_list",le="1"} 1', lines)
+        self.assertIn('caspianguard_http_response_size_bytes_count{view="pollution_type_list"} 2', lines)
+
+    def test_merges_snapshots_of_other_processes(self):
+        self.client.get('/api/pollution-types/')
+        cache.set('metrics:process:other:1', metrics.registry.snapshot())
+        cache.set(metrics.PROCESSES_KEY, [metrics.PROCESS_KEY, 'metrics:process:other:1', 'metrics:process:gone:2'])
+
+        lines = self.get_metrics()
+        self.assertIn('caspianguard_http_requests_total{view="pollution_type_list",method="GET",status="200"} 2', lines)
+        self.assertEqual(cache.get(metrics.PROCESSES_KEY), [metrics.PROCESS_KEY, 'metrics:process:other:1'])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.get_metrics(Authorization='Bearer secret')
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='volunteer', telegram_id=1001)
+        self.payload = {'telegram_id': 1001, 'message': 'Нужна помощь'}
+
+    def post(self, key, payload=None):
+        return self.client.post(
+            '/api/send-admin-message/', payload or self.payload, content_type='application/json',
+            headers={'Idempotency-Key': key},
+        )
+
+    def test_repeat_with_same_key_replays_first_response(self):
+        first = self.post('key-1')
+        repeated = self.post('key-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((repeated.status_code, repeated.content), (first.status_code, first.content))
+        self.assertEqual(repeated['Idempotent-Replayed'], 'true')
+        self.assertEqual(AdminMessage.objects.count(), 1)
+        self.post('key-2')
+        self.assertEqual(AdminMessage.objects.count(), 2)
+
+    def test_request_in_progress_and_client_errors(self):
+        request = RequestFactory().post('/api/send-admin-message/', headers={'Idempotency-Key': 'key-1'})
+        cache.set(idempotency.cache_key(request), idempotency.IN_PROGRESS)
+        response = self.post('key-1')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        User.objects.all().delete()
+        self.assertEqual(self.post('key-3').status_code, 404)
+        self.assertEqual(self.post('key-3')['Idempotent-Replayed'], 'true')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'План запроса проверяется только на PostgreSQL')
+class PollutionFilterIndexTests(TestCase):
+    # Распределение как в рабочей базе: много типов и регионов, почти все
+    # одобрены, на проверке и с редкими словами в описании — единицы процентов
+    ROWS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        types = PollutionType.objects.bulk_create([PollutionType(name=f'Тип {i}') for i in range(20)])
+        cls.trash = types[0]
+        image = PollutionImage.objects.create(image='pollution_images/test.jpg')
+        Pollutions.objects.bulk_create([
+            Pollutions(
+                latitude=42.98, longitude=47.5, images=image,
+                pollution_type=types[i % len(types)],
+                region_type=f'Регион {i % 50}',
+                description='Пятно нефти у берега' if i % 100 == 0 else f'Мусор на пляже {i}',
+                is_approved=i % 10 != 0,
+                is_completed=i % 100 == 10,
+            )
+            for i in range(cls.ROWS)
+        ], batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE main_pollutions SET created_at = now() - id * interval '1 minute'")
+            # В рабочей базе список ожидания GIN разбирает autovacuum
+            cursor.execute("SELECT gin_clean_pending_list('pollution_search_vector_idx')")
+            cursor.execute('ANALYZE main_pollutions')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        # Срез как у страницы списка
+        plan = queryset[:20].explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        self.assertNotIn('Seq Scan on main_pollutions', plan)
+
+    def test_type_filter_uses_index(self):
+        queryset = Pollutions.objects.filter(pollution_type_id=self.trash.id).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'pollution_type_created_idx', 'pollution_type_status_idx')
+
+    def test_status_filter_uses_index(self):
+        queryset = Pollutions.objects.filter_status(PollutionStatus.PENDING_REVIEW).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'pollution_status_created_idx')
+
+    def test_type_and_status_filter_uses_index(self):
+        queryset = Pollutions.objects.filter(pollution_type_id=self.trash.id).filter_status(PollutionStatus.PENDING_REVIEW)
+        self.assertUsesIndex(queryset.order_by('-created_at'), 'pollution_type_status_idx')
+
+    def test_region_filter_uses_index(self):
+        queryset = Pollutions.objects.filter(region_type='Регион 1').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'pollution_region_created_idx')
+
+    def test_search_uses_index(self):
+        queryset = search_pollutions(Pollutions.objects.all(), 'нефть')
+        self.assertUsesIndex(queryset, 'pollution_search_vector_idx')
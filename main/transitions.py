@@ -0,0 +1,76 @@
+"""
+Переходы статусов загрязнения: «в работе» -> «на проверке» -> «одобрена»,
+или обратно в работу при отклонении.
+
+Каждый переход — один условный UPDATE: в WHERE стоит допустимое исходное
+состояние, а меняются только столбцы перехода. Повторное или параллельное
+нажатие не находит подходящую строку и ничего не меняет, функции в этом
+случае возвращают False. update() не вызывает сигналы, поэтому счетчики,
+версия коллекции, кеш ответов и кластеры обновляются здесь же.
+
+Блокировки берутся в том же порядке, что и во вьюхах назначения и создания:
+строка загрязнения, затем версия коллекции, затем счетчики. Иначе переход и
+параллельное назначение захватывают их навстречу друг другу и взаимно
+блокируются.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from . import clusters, counters, jobs, tasks, versions
+from .authentication import telegram_user_cache
+from .models import Pollutions, PollutionStatus, User
+from .response_cache import response_cache
+
+
+def _after_transition(pk, old_status):
+    versions.bump()
+    new_status, grid_cell = Pollutions.objects.filter(pk=pk).with_status().values_list('status', 'grid_cell').get()
+    counters.move_status(old_status, new_status)
+    transaction.on_commit(lambda: clusters.mark_cells([grid_cell]))
+    response_cache.invalidate(versions.POLLUTIONS)
+
+
+def complete(pk, user, photo):
+    """Исполнитель отправляет работу на проверку с фото завершения."""
+    field = Pollutions._meta.get_field('completion_photo')
+    name = field.storage.save(field.generate_filename(None, photo.name), photo)
+
+    with transaction.atomic():
+        # Назначение проверяется под блокировкой строки: подзапрос по assigned_to
+        # в UPDATE видит снимок до параллельного снятия исполнителя
+        locked = Pollutions.objects.select_for_update().filter(pk=pk, is_completed=False, is_approved=False).exists()
+        updated = locked and Pollutions.objects.filter(pk=pk, assigned_to=user).update(
+            is_completed=True, completed_by=user, completion_photo=name, completion_photo_variants={},
+        )
+        if updated:
+            _after_transition(pk, PollutionStatus.IN_PROGRESS)
+            jobs.enqueue(tasks.build_completion_photo_variants, pk=pk)
+
+    if not updated:
+        field.storage.delete(name)
+    return bool(updated)
+
+
+def approve(pk, user_id):
+    """Одобряет работу на проверке и начисляет исполнителю балл."""
+    with transaction.atomic():
+        updated = Pollutions.objects.filter(pk=pk, is_completed=True, is_approved=False).update(is_approved=True)
+        if updated:
+            User.objects.filter(pk=user_id).update(completed_count=F('completed_count') + 1)
+            # update() не вызывает post_save, кеш пользователя сбрасываем сами
+            telegram_ids = list(User.objects.filter(pk=user_id).values_list('telegram_id', flat=True))
+            transaction.on_commit(lambda: telegram_user_cache.invalidate(telegram_ids))
+            _after_transition(pk, PollutionStatus.PENDING_REVIEW)
+    return bool(updated)
+
+
+def reject(pk):
+    """Возвращает работу на проверке обратно в работу."""
+    with transaction.atomic():
+        updated = Pollutions.objects.filter(pk=pk, is_completed=True, is_approved=False).update(
+            is_completed=False, completion_photo=None, completion_photo_variants={},
+        )
+        if updated:
+            _after_transition(pk, PollutionStatus.PENDING_REVIEW)
+    return bool(updated)
@@ -1,6 +1,20 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, LinkTelegramView, PollutionListCreateView, PollutionTypeListView, PollutionDetailView, AssignPollutionView, UserProfileView, UserAssignedPollutionsView, UnassignPollutionView, CompletePollutionView, NotifyAdminsView, ApproveCompletionView, RejectCompletionView, SendAdminMessageView, ReplyToUserView, CreateFakePollutionsView
+from .views import RegisterView, LinkTelegramView, PollutionListCreateView, PollutionBulkCreateView, PollutionExportView, PollutionTypeListView, PollutionDetailView, PollutionNearbyView, PollutionMapFeedView, PollutionClusterView, StatusStatsView, CacheStatsView, AssignPollutionView, UserProfileView, UserAssignedPollutionsView, UnassignPollutionView, CompletePollutionView, NotifyAdminsView, ApproveCompletionView, RejectCompletionView, SendAdminMessageView, ReplyToUserView, CreateFakePollutionsView
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    pollution_list_create = async_views.pollution_list
+    pollution_detail = async_views.pollution_detail
+    pollution_type_list = async_views.pollution_type_list
+    status_stats = async_views.status_stats
+else:
+    pollution_list_create = PollutionListCreateView.as_view()
+    pollution_detail = PollutionDetailView.as_view()
+    pollution_type_list = PollutionTypeListView.as_view()
+    status_stats = StatusStatsView.as_view()
 
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
@@ -8,12 +22,19 @@ urlpatterns = [
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/link-telegram/', LinkTelegramView.as_view(), name='link_telegram'),
 
-    path('pollutions/', PollutionListCreateView.as_view(), name='pollution_list_create'),
-    path('pollutions/<int:pk>/', PollutionDetailView.as_view(), name='pollution_detail'),
+    path('pollutions/', pollution_list_create, name='pollution_list_create'),
+    path('pollutions/bulk/', PollutionBulkCreateView.as_view(), name='pollution_bulk_create'),
+    path('pollutions/export/<str:export_format>/', PollutionExportView.as_view(), name='pollution_export'),
+    path('pollutions/nearby/', PollutionNearbyView.as_view(), name='pollution_nearby'),
+    path('pollutions/map-feed/', PollutionMapFeedView.as_view(), name='pollution_map_feed'),
+    path('pollutions/clusters/', PollutionClusterView.as_view(), name='pollution_clusters'),
+    path('pollutions/<int:pk>/', pollution_detail, name='pollution_detail'),
     path('pollutions/<int:pk>/assign/', AssignPollutionView.as_view(), name='pollution_assign'),
     path('pollutions/<int:pk>/unassign/', UnassignPollutionView.as_view(), name='pollution_unassign'),
     path('pollutions/<int:pk>/complete/', CompletePollutionView.as_view(), name='pollution_complete'),
-    path('pollution-types/', PollutionTypeListView.as_view(), name='pollution_type_list'),
+    path('markers/status-stats/', status_stats, name='status_stats'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('pollution-types/', pollution_type_list, name='pollution_type_list'),
     path('user/profile/', UserProfileView.as_view(), name='user_profile'),
     path('user/assigned-pollutions/', UserAssignedPollutionsView.as_view(), name='user_assigned_pollutions'),
     path('notify-admins/', NotifyAdminsView.as_view(), name='notify_admins'),
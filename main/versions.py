@@ -0,0 +1,120 @@
+"""
+Версии коллекций для условных GET-запросов (ETag / Last-Modified) и ключей
+кеша ответов (response_cache.py).
+
+Версия загрязнений увеличивается при любой записи в Pollutions, PollutionType
+и PollutionImage, версия типов — при записи в PollutionType (см. signals.py).
+Проверка If-None-Match / If-Modified-Since стоит одного запроса по уникальному
+индексу (для одного объекта — еще одного по первичному ключу) и выполняется до
+выборки строк и сериализации.
+"""
+
+import datetime
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .models import CollectionVersion
+
+POLLUTIONS = 'pollutions'
+POLLUTION_TYPES = 'pollution_types'
+
+
+def bump(name=POLLUTIONS):
+    if CollectionVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            CollectionVersion.objects.create(name=name, version=1)
+    except IntegrityError:
+        CollectionVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def get_state(request, name):
+    # Кешируем на запросе, чтобы ETag и Last-Modified стоили одного запроса к базе
+    cache = request.__dict__.setdefault('_collection_versions', {})
+    if name not in cache:
+        cache[name] = CollectionVersion.objects.filter(name=name).values_list('version', 'updated_at').first()
+    return cache[name]
+
+
+async def aget_state(request, name):
+    cache = request.__dict__.setdefault('_collection_versions', {})
+    if name not in cache:
+        cache[name] = await CollectionVersion.objects.filter(name=name).values_list('version', 'updated_at').afirst()
+    return cache[name]
+
+
+def _exists(request, model, pk):
+    cache = request.__dict__.setdefault('_existing_objects', {})
+    if (model, pk) not in cache:
+        cache[model, pk] = model.objects.filter(pk=pk).exists()
+    return cache[model, pk]
+
+
+def _etag(name, state, pk=None):
+    return f'{name}-{state[0]}' if pk is None else f'{name}-{state[0]}-{pk}'
+
+
+def conditional(name=POLLUTIONS, model=None):
+    """
+    Декоратор для get(): отвечает 304, если коллекция не менялась. С model
+    вьюха отдает один объект по pk: он входит в ETag, а для несуществующего
+    объекта заголовков нет, и запрос доходит до 404 вьюхи.
+    """
+
+    def get_detail_state(request, pk=None, **kwargs):
+        if model is not None and not _exists(request, model, pk):
+            return None
+        return get_state(request, name)
+
+    def etag(request, *args, **kwargs):
+        state = get_detail_state(request, **kwargs)
+        return _etag(name, state, kwargs.get('pk') if model else None) if state else None
+
+    def last_modified(request, *args, **kwargs):
+        state = get_detail_state(request, **kwargs)
+        return state[1] if state else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def aconditional(name=POLLUTIONS, model=None):
+    """
+    conditional() для асинхронных вьюх (async_views.py): condition() из
+    Django 4.2 оборачивает только синхронные функции.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            pk = kwargs.get('pk') if model else None
+            state = None
+            if model is None or await model.objects.filter(pk=pk).aexists():
+                state = await aget_state(request, name)
+            etag = quote_etag(_etag(name, state, pk)) if state else None
+            last_modified = None
+            if state:
+                updated_at = state[1]
+                if not timezone.is_aware(updated_at):
+                    updated_at = timezone.make_aware(updated_at, datetime.timezone.utc)
+                last_modified = int(updated_at.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+            return response
+
+        return inner
+
+    return decorator
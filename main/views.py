@@ -2,17 +2,31 @@ from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
 from django.utils.decorators import method_decorator
-from .serializers import RegisterSerializer, PollutionSerializer, PollutionTypeSerializer
-from .models import Pollutions, PollutionType
+from .serializers import RegisterSerializer, PollutionSerializer, PollutionTypeSerializer, NearbyPollutionSerializer, BulkPollutionItemSerializer
+from .models import Pollutions, PollutionImage, PollutionType
 from .permissions import *
-from .authentication import TelegramAuthentication
+from .authentication import TelegramAuthentication, telegram_user_cache
+from .filters import PollutionFilterBackend, filter_pollutions
+from . import clusters, counters, exports, geo, images, jobs, mapfeed, metrics, roster, tasks, transitions, versions
+from .response_cache import CachedResponseMixin, response_cache
+import base64
+import json
 import logging
+import math
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +76,8 @@ class LinkTelegramView(APIView):
             
             # Удаляем telegram_id у других пользователей
             User.objects.filter(telegram_id=int(telegram_id)).update(telegram_id=None)
+            # update() не вызывает сигналы, поэтому старую привязку сбрасываем сами
+            transaction.on_commit(lambda: telegram_user_cache.invalidate([int(telegram_id)]))
             
             user.telegram_id = int(telegram_id)
             user.save()
@@ -99,30 +115,409 @@ class PollutionPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class PollutionCursorPagination(BasePagination):
+    """
+    Keyset-пагинация по (created_at, id) без COUNT(*) и OFFSET.
+    Курсор непрозрачный: base64 от позиции последней (или первой) строки страницы.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if encoded:
+            created_at, pk, reverse = self.decode_cursor(encoded)
+            if reverse:
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(id__gt=pk), created_at__gte=created_at)
+                queryset = queryset.order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at)
+                queryset = queryset.order_by('-created_at', '-id')
+        else:
+            reverse = False
+            queryset = queryset.order_by('-created_at', '-id')
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        has_next = has_more if not reverse else bool(encoded)
+        has_previous = has_more if reverse else bool(encoded)
+        self.next_cursor = self.encode_cursor(rows[-1], False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], True) if rows and has_previous else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, row, reverse):
+        payload = json.dumps([row.created_at.isoformat(), row.pk, int(reverse)])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            created_at, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return datetime.fromisoformat(created_at), int(pk), bool(reverse)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+            'results': data,
+        })
+
+
+class CursorPaginationMixin:
+    """Переключает вьюху на курсорную пагинацию по ?cursor=... или ?pagination=cursor."""
+    cursor_pagination_class = PollutionCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if 'cursor' in params or params.get('pagination') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-class PollutionListCreateView(generics.ListCreateAPIView):
-    queryset = Pollutions.objects.all().order_by('-created_at')
+@method_decorator(versions.conditional(), name='get')
+class PollutionListCreateView(CachedResponseMixin, CursorPaginationMixin, generics.ListCreateAPIView):
+    queryset = Pollutions.objects.select_related('pollution_type', 'images').order_by('-created_at')
     serializer_class = PollutionSerializer
     authentication_classes = [JWTAuthentication, TelegramAuthentication]
     pagination_class = PollutionPagination
+    filter_backends = [PollutionFilterBackend]
 
     def get_permissions(self):
         if self.request.method == 'POST':
             return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
+    def should_cache_response(self, request):
+        # Кешируем только первые страницы: дальше запросов мало, а вариантов много
+        params = request.query_params
+        if 'bbox' in params or 'cursor' in params:
+            return False
+        page = params.get('page', '1')
+        return page.isdigit() and int(page) <= settings.RESPONSE_CACHE_MAX_PAGE
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            pollution = serializer.save()
+            counters.record_created(pollution)
+
+    def list(self, request, *args, **kwargs):
+        if 'bbox' in request.query_params:
+            return self.bbox_list(request)
+        return super().list(request, *args, **kwargs)
+
+    def bbox_list(self, request):
+        # Все маркеры в видимой области карты, без пагинации, с ограничением сверху
+        try:
+            bbox = geo.parse_bbox(request.query_params.get('bbox'))
+            zoom = request.query_params.get('zoom')
+            zoom = int(zoom) if zoom else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = settings.POLLUTION_BBOX_LIMIT
+        queryset = self.filter_queryset(self.get_queryset()).in_bbox(bbox, zoom)
+        pollutions = list(queryset[:limit + 1])
+        truncated = len(pollutions) > limit
+        serializer = self.get_serializer(pollutions[:limit], many=True)
+
+        return Response({
+            'count': len(serializer.data),
+            'truncated': truncated,
+            'results': serializer.data,
+        }, status=status.HTTP_200_OK)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PollutionBulkCreateView(APIView):
+    """
+    Пакетная загрузка сообщений, собранных без связи. multipart-запрос:
+    поле reports — JSON-массив сообщений, фото каждого сообщения — файл с
+    именем из его поля image (по умолчанию image_<номер>). Корректные
+    сообщения сохраняются одной транзакцией, по остальным возвращаются ошибки.
+    """
+    authentication_classes = [JWTAuthentication, TelegramAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            reports = json.loads(request.data.get('reports') or '')
+        except (TypeError, ValueError):
+            return Response({'error': 'Поле reports должно содержать JSON-массив сообщений'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(reports, list) or not reports:
+            return Response({'error': 'Поле reports должно содержать JSON-массив сообщений'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(reports) > settings.POLLUTION_BULK_MAX_ITEMS:
+            return Response({'error': f'Не больше {settings.POLLUTION_BULK_MAX_ITEMS} сообщений за запрос'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Все типы одним запросом
+        names = {report.get('pollution_type_name') for report in reports if isinstance(report, dict)}
+        pollution_types = PollutionType.objects.in_bulk([name for name in names if isinstance(name, str)], field_name='name')
+
+        results = []
+        valid = []
+        for index, report in enumerate(reports):
+            if not isinstance(report, dict):
+                results.append({'index': index, 'status': 'invalid', 'errors': {'non_field_errors': ['Ожидался объект']}})
+                continue
+            data = {**report, 'image': request.FILES.get(report.get('image') or f'image_{index}')}
+            serializer = BulkPollutionItemSerializer(data=data, context={'pollution_types': pollution_types})
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+
+        if valid:
+            pollutions = self.create_many([data for _, data in valid])
+            for (index, _), pollution in zip(valid, pollutions):
+                results[index] = {'index': index, 'status': 'created', 'id': pollution.pk}
+
+        if len(valid) == len(reports):
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': len(valid),
+            'failed': len(reports) - len(valid),
+            'results': results,
+        }, status=response_status)
+
+    def create_many(self, items):
+        # bulk_create не вызывает save() и сигналы, поэтому сетка, счетчики,
+        # версия коллекции, кластеры и копии фото обновляются здесь
+        with transaction.atomic():
+            pollution_images = PollutionImage.objects.bulk_create([PollutionImage(image=item['image']) for item in items])
+            pollutions = Pollutions.objects.bulk_create([
+                Pollutions(
+                    latitude=item['latitude'],
+                    longitude=item['longitude'],
+                    description=item['description'],
+                    pollution_type=item['pollution_type_name'],
+                    phone_number=item.get('phone_number'),
+                    region_type=item.get('region_type'),
+                    reported_by=self.request.user,
+                    images=pollution_image,
+                    grid_cell=geo.grid_cell(item['latitude'], item['longitude']),
+                )
+                for item, pollution_image in zip(items, pollution_images)
+            ])
+
+            versions.bump()
+            counters.record_created_many(pollutions)
+            jobs.enqueue_many(tasks.build_pollution_image_variants, [{'pk': image.pk} for image in pollution_images])
+            grid_cells = [pollution.grid_cell for pollution in pollutions]
+            transaction.on_commit(lambda: clusters.mark_cells(grid_cells))
+
+        response_cache.invalidate(versions.POLLUTIONS)
+        return pollutions
+
 @method_decorator(csrf_exempt, name='dispatch')
-class PollutionTypeListView(generics.ListAPIView):
+class PollutionExportView(APIView):
+    """
+    Полная выгрузка сообщений: /api/pollutions/export/<csv|geojson|ndjson>/.
+    Поддерживает фильтры списка и date_from / date_to.
+    """
+    authentication_classes = [JWTAuthentication, TelegramAuthentication]
+    permission_classes = [IsManagerUser]
+
+    def get(self, request, export_format):
+        if export_format not in exports.CONTENT_TYPES:
+            return Response({'error': f'Неизвестный формат: {export_format}'}, status=status.HTTP_404_NOT_FOUND)
+
+        queryset = exports.export_queryset(request.query_params)
+        response = StreamingHttpResponse(exports.stream(queryset, export_format), content_type=exports.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="pollutions.{export_format}"'
+        return response
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PollutionTypeListView(CachedResponseMixin, generics.ListAPIView):
     queryset = PollutionType.objects.all().order_by('name')
     serializer_class = PollutionTypeSerializer
     permission_classes = [permissions.AllowAny]
+    response_cache_collections = (versions.POLLUTION_TYPES,)
 
 @method_decorator(csrf_exempt, name='dispatch')
-class PollutionDetailView(generics.RetrieveAPIView):
-    queryset = Pollutions.objects.all()
+@method_decorator(versions.conditional(model=Pollutions), name='get')
+class PollutionDetailView(CachedResponseMixin, generics.RetrieveAPIView):
+    queryset = Pollutions.objects.select_related('pollution_type', 'images')
     serializer_class = PollutionSerializer
     permission_classes = [permissions.AllowAny]
 
+@method_decorator(csrf_exempt, name='dispatch')
+class PollutionNearbyView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            radius = request.query_params.get('radius')
+            radius = float(radius) if radius else None
+            k = request.query_params.get('k')
+            k = int(k) if k else None
+        except (KeyError, ValueError):
+            return Response({'error': 'Необходимо указать lat и lon, а также числовые k и radius'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # float() принимает nan и inf: их сравнения ложны, поэтому проверяем явно
+        if (
+            not all(math.isfinite(value) for value in (latitude, longitude, radius or 1.0))
+            or not (-90 <= latitude <= 90 and -180 <= longitude <= 180)
+            or (k is not None and k < 1)
+            or (radius is not None and radius <= 0)
+        ):
+            return Response({'error': 'Некорректные параметры поиска'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if radius is not None:
+            radius = min(radius, settings.POLLUTION_NEARBY_MAX_RADIUS_KM)
+
+        queryset = Pollutions.objects.select_related('pollution_type', 'images')
+        truncated = False
+
+        if k is None and radius is not None:
+            # Все загрязнения в радиусе, не больше POLLUTION_NEARBY_RADIUS_MAX_RESULTS ближайших
+            limit = settings.POLLUTION_NEARBY_RADIUS_MAX_RESULTS
+            search_radius = radius
+            pollutions = list(queryset.nearby(latitude, longitude, radius)[:limit + 1])
+            truncated = len(pollutions) > limit
+            pollutions = pollutions[:limit]
+        else:
+            # k ближайших (в пределах radius, если он задан). Расширяем радиус,
+            # пока не наберем k: все точки ближе k-й гарантированно попали в
+            # круг, значит порядок точный
+            k = min(k or settings.POLLUTION_NEARBY_DEFAULT_K, settings.POLLUTION_NEARBY_MAX_K)
+            max_radius = radius or settings.POLLUTION_NEARBY_MAX_RADIUS_KM
+            search_radius = min(settings.POLLUTION_NEARBY_START_RADIUS_KM, max_radius)
+            while True:
+                pollutions = list(queryset.nearby(latitude, longitude, search_radius)[:k])
+                if len(pollutions) >= k or search_radius >= max_radius:
+                    break
+                search_radius = min(search_radius * 4, max_radius)
+
+        serializer = NearbyPollutionSerializer(pollutions, many=True, context={'request': request})
+        return Response({
+            'count': len(serializer.data),
+            'radius_km': search_radius,
+            'truncated': truncated,
+            'results': serializer.data,
+        }, status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(gzip_page, name='dispatch')
+@method_decorator(versions.conditional(), name='get')
+class PollutionMapFeedView(APIView):
+    """
+    Все маркеры карты столбцами: id, lat, lon, type, status (индекс в statuses).
+    Поддерживает фильтры списка и bbox; ?encoding=base64 отдает столбцы
+    упакованными бинарными буферами (см. mapfeed.py).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        encoding = params.get('encoding', 'json')
+        if encoding not in ('json', 'base64'):
+            return Response({'error': 'encoding должен быть json или base64'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = filter_pollutions(Pollutions.objects.all(), params)
+        if params.get('bbox'):
+            try:
+                bbox = geo.parse_bbox(params['bbox'])
+                zoom = int(params['zoom']) if params.get('zoom') else None
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.in_bbox(bbox, zoom)
+
+        columns = mapfeed.build_columns(queryset)
+        return Response({
+            'count': len(columns['id']),
+            'encoding': encoding,
+            'statuses': mapfeed.STATUSES,
+            'columns': mapfeed.pack(columns) if encoding == 'base64' else columns,
+        }, status=status.HTTP_200_OK)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PollutionClusterView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            zoom = int(request.query_params['zoom'])
+            bbox = request.query_params.get('bbox')
+            bbox = geo.parse_bbox(bbox) if bbox else None
+        except KeyError:
+            return Response({'error': 'Необходимо указать zoom'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = clusters.serialize(clusters.get_clusters(zoom), bbox)
+        return Response({
+            'zoom': zoom,
+            'count': len(results),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StatusStatsView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(counters.get_stats(), status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # Счетчики своего процесса: при нескольких воркерах у каждого свои
+        return Response({
+            'responses': response_cache.stats(),
+            'telegram_users': telegram_user_cache.stats(),
+        }, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """Метрики запросов для Prometheus (см. metrics.py)."""
+    authentication_classes = []
+    permission_classes = [IsMetricsScraper]
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise NotFound()
+        return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @method_decorator(csrf_exempt, name='dispatch')
 class AssignPollutionView(APIView):
     authentication_classes = [JWTAuthentication, TelegramAuthentication]
@@ -130,8 +525,11 @@ class AssignPollutionView(APIView):
 
     def post(self, request, pk):
         try:
-            pollution = Pollutions.objects.get(pk=pk)
-            pollution.assigned_to.add(request.user)
+            with transaction.atomic():
+                pollution = Pollutions.objects.select_for_update().get(pk=pk)
+                old_status = pollution.get_status()
+                pollution.assigned_to.add(request.user)
+                counters.move_status(old_status, pollution.get_status())
             return Response({'success': 'Вы взяли проблему в работу'}, status=status.HTTP_200_OK)
         except Pollutions.DoesNotExist:
             return Response({'error': 'Проблема не найдена'}, status=status.HTTP_404_NOT_FOUND)
@@ -162,12 +560,18 @@ class UserPollutionsPagination(PageNumberPagination):
     max_page_size = 10
 
 
+class UserPollutionsCursorPagination(PollutionCursorPagination):
+    page_size = 3
+    max_page_size = 10
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-class UserAssignedPollutionsView(generics.ListAPIView):
+class UserAssignedPollutionsView(CursorPaginationMixin, generics.ListAPIView):
     serializer_class = PollutionSerializer
     authentication_classes = [JWTAuthentication, TelegramAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = UserPollutionsPagination
+    cursor_pagination_class = UserPollutionsCursorPagination
 
     def get_queryset(self):
         return Pollutions.objects.filter(assigned_to=self.request.user, is_completed=False).order_by('-created_at')
@@ -180,10 +584,13 @@ class UnassignPollutionView(APIView):
 
     def post(self, request, pk):
         try:
-            pollution = Pollutions.objects.get(pk=pk)
-            if request.user in pollution.assigned_to.all():
-                pollution.assigned_to.remove(request.user)
-                return Response({'success': 'Вы отменили взятие проблемы'}, status=status.HTTP_200_OK)
+            with transaction.atomic():
+                pollution = Pollutions.objects.select_for_update().get(pk=pk)
+                if request.user in pollution.assigned_to.all():
+                    old_status = pollution.get_status()
+                    pollution.assigned_to.remove(request.user)
+                    counters.move_status(old_status, pollution.get_status())
+                    return Response({'success': 'Вы отменили взятие проблемы'}, status=status.HTTP_200_OK)
             return Response({'error': 'Вы не брали эту проблему'}, status=status.HTTP_400_BAD_REQUEST)
         except Pollutions.DoesNotExist:
             return Response({'error': 'Проблема не найдена'}, status=status.HTTP_404_NOT_FOUND)
@@ -195,29 +602,25 @@ class CompletePollutionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            pollution = Pollutions.objects.get(pk=pk)
-            if request.user not in pollution.assigned_to.all():
-                return Response({'error': 'Вы не брали эту проблему'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            completion_photo = request.FILES.get('completion_photo')
-            if not completion_photo:
-                return Response({'error': 'Обязательно приложите фото завершенной работы'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            pollution.completion_photo = completion_photo
-            pollution.is_completed = True
-            pollution.completed_by = request.user
-            pollution.save()
-            
-            return Response({
-                'success': 'Заявка на завершение отправлена',
-                'has_photo': True,
-                'pollution_id': pollution.id,
-                'user_id': request.user.id,
-                'username': request.user.username
-            }, status=status.HTTP_200_OK)
-        except Pollutions.DoesNotExist:
+        completion_photo = request.FILES.get('completion_photo')
+        pollution = Pollutions.objects.filter(pk=pk).first()
+        if pollution is None:
             return Response({'error': 'Проблема не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        if not pollution.assigned_to.filter(pk=request.user.pk).exists():
+            return Response({'error': 'Вы не брали эту проблему'}, status=status.HTTP_400_BAD_REQUEST)
+        if not completion_photo:
+            return Response({'error': 'Обязательно приложите фото завершенной работы'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not transitions.complete(pk, request.user, completion_photo):
+            return Response({'error': 'Работа уже отправлена на проверку'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': 'Заявка на завершение отправлена',
+            'has_photo': True,
+            'pollution_id': pollution.id,
+            'user_id': request.user.id,
+            'username': request.user.username
+        }, status=status.HTTP_200_OK)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -230,24 +633,17 @@ class NotifyAdminsView(APIView):
         username = request.data.get('username')
         has_photo = request.data.get('has_photo', False)
         
-        from django.contrib.auth import get_user_model
-        from django.db import models
-        User = get_user_model()
-        
-        admin_users = User.objects.filter(
-            models.Q(is_superuser=True) |
-            models.Q(position__name__in=['Менеджер', 'Админ'])
-        ).exclude(telegram_id__isnull=True)
-        
-        telegram_ids = [user.telegram_id for user in admin_users if user.telegram_id]
-        
+        # Заявку на проверку получают менеджеры и администраторы
+        telegram_ids = roster.recipients(roster.ROLE_MANAGERS, roster.ROLE_ADMINS)
+
         # Получаем фото завершения
         completion_photo_url = None
         if pollution_id:
             try:
                 pollution = Pollutions.objects.get(id=pollution_id)
                 if pollution.completion_photo:
-                    completion_photo_url = pollution.completion_photo.url
+                    variants = images.variant_urls(pollution.completion_photo_variants, pollution.completion_photo)
+                    completion_photo_url = variants['medium'] if variants else pollution.completion_photo.url
             except Pollutions.DoesNotExist:
                 pass
         
@@ -275,19 +671,15 @@ class ApproveCompletionView(APIView):
             from django.contrib.auth import get_user_model
             User = get_user_model()
             
-            pollution = Pollutions.objects.get(id=pollution_id)
+            pollution = Pollutions.objects.select_related('pollution_type').get(id=pollution_id)
             user = User.objects.get(id=user_id)
-            
-            # Одобряем работу
-            pollution.is_approved = True
-            pollution.save()
-            
-            # Увеличиваем счетчик завершенных работ
-            user.completed_count += 1
-            user.save()
-            
+
+            # Повторное одобрение ничего не меняет и не начисляет второй балл
+            changed = transitions.approve(pollution.pk, user.pk)
+
             return Response({
-                'success': 'Работа одобрена',
+                'success': 'Работа одобрена' if changed else 'Работа уже проверена',
+                'changed': changed,
                 'user_telegram_id': user.telegram_id,
                 'pollution_type': pollution.pollution_type.name
             }, status=status.HTTP_200_OK)
@@ -315,17 +707,15 @@ class RejectCompletionView(APIView):
             from django.contrib.auth import get_user_model
             User = get_user_model()
             
-            pollution = Pollutions.objects.get(id=pollution_id)
+            pollution = Pollutions.objects.select_related('pollution_type').get(id=pollution_id)
             user = User.objects.get(id=user_id)
-            
-            # Отклоняем работу - возвращаем в работу
-            pollution.is_completed = False
-            pollution.is_approved = False
-            pollution.completion_photo = None
-            pollution.save()
-            
+
+            # Отклонить можно только работу на проверке, повтор ничего не меняет
+            changed = transitions.reject(pollution.pk)
+
             return Response({
-                'success': 'Работа отклонена',
+                'success': 'Работа отклонена' if changed else 'Работа уже проверена',
+                'changed': changed,
                 'user_telegram_id': user.telegram_id,
                 'pollution_type': pollution.pollution_type.name
             }, status=status.HTTP_200_OK)
@@ -350,7 +740,6 @@ class SendAdminMessageView(APIView):
         
         try:
             from django.contrib.auth import get_user_model
-            from django.db import models
             from .models import AdminMessage
             User = get_user_model()
             
@@ -361,12 +750,7 @@ class SendAdminMessageView(APIView):
                 message=message
             )
             
-            admin_users = User.objects.filter(
-                models.Q(is_superuser=True) |
-                models.Q(position__name='Админ')
-            ).exclude(telegram_id__isnull=True)
-            
-            admin_telegram_ids = [admin.telegram_id for admin in admin_users if admin.telegram_id]
+            admin_telegram_ids = roster.recipients(roster.ROLE_ADMINS)
             
             return Response({
                 'success': 'Сообщение отправлено',